@@ -1,6 +1,7 @@
 # Tenant-aware CV analysis pipeline
 from services.data_manager import db
-from services.tenant_data_manager import get_session_data_tenant, save_stage_output_tenant, get_single_position_data_tenant
+from services.tenant_data_manager import get_session_data_tenant, save_stage_output_tenant
+from services.position_cache import get_position_context
 from .cv_analyzer import analyze_cv
 
 def run_cv_analysis_pipeline_tenant(session_id: str, tenant_id: str) -> bool:
@@ -33,7 +34,8 @@ def run_cv_analysis_pipeline_tenant(session_id: str, tenant_id: str) -> bool:
         if db is None:
             raise ConnectionError("Connessione a MongoDB non disponibile.")
 
-        position_document = get_single_position_data_tenant(position_id, collections["positions"])
+        position_context = get_position_context(position_id, collections["positions"])
+        position_document = position_context.document if position_context else None
         
         if not position_document or "job_description" not in position_document:
             print(f"  - ERRORE: Documento o campo 'job_description' non trovato per la posizione {position_id} nel DB.")
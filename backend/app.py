@@ -3,8 +3,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
 import os
+import secrets
+import tempfile
 import uuid
-import fitz  # PyMuPDF
+import threading
 from datetime import datetime
 
 # Reuse existing services and pipelines
@@ -19,10 +21,11 @@ from services.data_manager import (
     db,
 )
 from data_preparation.analyzer.run_production_pipeline import run_full_generation_pipeline
+from data_preparation.analyzer.run_batch_pipeline import run_batch_generation_pipeline
 from analyzer.run_analyzer import run_cv_analysis_pipeline
 from analyzer.run_analyzer_tenant import run_cv_analysis_pipeline_tenant
-from corrector.run_final_evaluation import execute_case_evaluation
-from corrector.skill_relevance_scorer import compute_and_save_skill_relevance
+from corrector.run_post_interview import run_post_interview_evaluation
+from corrector.run_bulk_reevaluation import run_bulk_reevaluation
 from feedback_generator.run_feedback_generator import run_feedback_pipeline
 
 from interviewer.chat_session_service import (
@@ -61,7 +64,22 @@ from services.interview_config_service import (
     get_interview_config_or_default,
     InterviewConfig,
 )
-from services.email_service import send_interview_link
+from services.security_service import (
+    validate_events,
+    record_security_events,
+    get_recent_security_events,
+    get_security_summary,
+    position_security_analytics,
+    risk_level as security_risk_level,
+)
+from feedback_generator.course_retriever.rag_service import warmup_rag_service, start_rag_reload, rag_service_status
+from interviewer.embeddings import warmup_embedding_model
+from services.artifact_store import save_artifact, open_artifact, parse_range
+from services.email_service import enqueue_interview_link, get_session_email_status, start_email_sender
+from services.job_service import create_job, get_job
+from services.position_cache import invalidate_position
+from services.cv_extraction_service import CVExtractionUnavailable, extract_cv_text_async, extraction_metrics
+from services.bulk_session_service import BULK_CSV_MAX_BYTES, BULK_UPLOAD_MAX_BYTES, parse_candidates_csv, match_cv_files, run_bulk_session_creation
 
 
 def hr_auth(authorization: str | None = Header(default=None)):
@@ -76,6 +94,19 @@ def hr_auth(authorization: str | None = Header(default=None)):
     return data
 
 
+# Operator credential for instance-wide operations (e.g. course index reload); unset = disabled
+OPERATOR_TOKEN = os.getenv("OPERATOR_TOKEN")
+
+
+def operator_auth(x_operator_token: str | None = Header(default=None)):
+    """Operators of the deployment, not tenant users: shared secret in X-Operator-Token"""
+    if not OPERATOR_TOKEN:
+        raise HTTPException(status_code=403, detail="Operator endpoints are disabled")
+    if not x_operator_token or not secrets.compare_digest(x_operator_token, OPERATOR_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid operator token")
+    return True
+
+
 def get_tenant_collections_from_auth(auth_data: dict):
     """Get tenant collections from auth data"""
     tenant_id = auth_data.get("tenant_id")
@@ -93,12 +124,33 @@ class PositionPayload(BaseModel):
     knowledge_base: list[dict] | None = None
 
 
+class BatchDataPrepPayload(BaseModel):
+    position_ids: list[str]
+
+
+class BulkReevaluationPayload(BaseModel):
+    session_ids: list[str] | None = None
+    dry_run: bool = False
+    include_skills: bool = True
+
+
 class MessagePayload(BaseModel):
     text: str
 
 
+class SecurityEventsPayload(BaseModel):
+    events: list[dict]
+
+
 app = FastAPI(title="Vertigo AI Backend", version="0.1.0")
 
+# Deliver invitation emails left in the outbox (e.g. queued before a restart)
+start_email_sender()
+# Build the course retrieval model and index in background (disable with RAG_WARMUP=false)
+warmup_rag_service()
+# Load the interviewer embedding model (input classifier, embedding step selector) in background
+warmup_embedding_model()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Configure per environment
@@ -112,6 +164,27 @@ app.add_middleware(
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics/cv-extraction")
+def cv_extraction_metrics(auth_data=Depends(hr_auth)):
+    """CV text extraction timing metrics of this backend instance"""
+    return extraction_metrics()
+
+@app.get("/rag/status")
+def get_rag_status(auth_data=Depends(hr_auth)):
+    """Course retrieval index of this backend instance"""
+    return rag_service_status()
+
+@app.post("/rag/reload", status_code=202)
+def reload_rag(operator=Depends(operator_auth)):
+    """
+    Reload the course catalog and rebuild the retrieval index (shared by all tenants) in
+    background; poll /rag/status. Operators only, at most once per RAG_RELOAD_MIN_INTERVAL_SECONDS.
+    """
+    started, reason = start_rag_reload()
+    if not started:
+        raise HTTPException(status_code=429, detail=reason)
+    return rag_service_status()
+
 @app.get("/debug/db")
 def debug_db():
     """Debug endpoint to check database connection"""
@@ -386,12 +459,46 @@ def run_data_prep(position_id: str, auth_data=Depends(hr_auth)):
     return {"ok": True}
 
 
+@app.post("/positions/data-prep/batch")
+def run_batch_data_prep(payload: BatchDataPrepPayload, auth_data=Depends(hr_auth)):
+    """Start data preparation for many positions in background; poll the returned batch_id for status"""
+    collections = get_tenant_collections_from_auth(auth_data)
+    position_ids = list(dict.fromkeys(pid for pid in payload.position_ids if pid))
+    if not position_ids:
+        raise HTTPException(status_code=400, detail="No position ids provided")
+
+    tenant_id = auth_data["tenant_id"]
+    config = get_interview_config_or_default(tenant_id)
+
+    batch_id = create_job("data_prep_batch", tenant_id, position_ids, {"reasoning_steps": config.reasoning_steps})
+    if not batch_id:
+        raise HTTPException(status_code=500, detail="Failed to create batch job")
+
+    threading.Thread(
+        target=run_batch_generation_pipeline,
+        args=(position_ids, config.reasoning_steps, collections["positions"]),
+        kwargs={"job_id": batch_id},
+        daemon=True,
+    ).start()
+    return {"ok": True, "batch_id": batch_id, "total": len(position_ids)}
+
+
+@app.get("/positions/data-prep/batch/{batch_id}")
+def get_batch_data_prep_status(batch_id: str, auth_data=Depends(hr_auth)):
+    get_tenant_collections_from_auth(auth_data)
+    job = get_job(batch_id, auth_data["tenant_id"])
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return job
+
+
 @app.delete("/positions/{position_id}")
 def delete_position(position_id: str, auth_data=Depends(hr_auth)):
     collections = get_tenant_collections_from_auth(auth_data)
     try:
         collection = db[collections["positions"]]
         result = collection.delete_one({"_id": position_id})
+        invalidate_position(position_id, collections["positions"])
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Position not found")
         return {"ok": True, "message": "Position deleted successfully"}
@@ -419,7 +526,6 @@ def mark_token_sent(session_id: str, auth_data=Depends(hr_auth)):
 # Tenant-aware feedback pipeline function
 def run_feedback_pipeline_tenant(session_id: str, collection_name: str) -> str | None:
     """Tenant-aware version of the feedback generation pipeline"""
-    import os
     import json
     from bson import ObjectId
     
@@ -480,13 +586,15 @@ def run_feedback_pipeline_tenant(session_id: str, collection_name: str) -> str |
     from feedback_generator.course_retriever.rag_service import get_rag_service
     rag_service = get_rag_service()
     
+    refined_queries = [
+        create_query_refinement_prompt(family.skill_family_gap, [gap.skill_gap for gap in family.skill_gaps])
+        for family in gap_analysis.skill_families
+    ]
+    # One batched encode + search for all families, each course suggested at most once
+    courses_by_family = rag_service.search_many(refined_queries, k=3)
+    
     enriched_skill_families = []
-    for family in gap_analysis.skill_families:
-        # Extract skill gaps as list of strings
-        skill_gaps = [gap.skill_gap for gap in family.skill_gaps]
-        refined_query = create_query_refinement_prompt(family.skill_family_gap, skill_gaps)
-        courses = rag_service.search(refined_query, k=3)
-        
+    for family, courses in zip(gap_analysis.skill_families, courses_by_family):
         enriched_family = {
             "skill_family_gap": family.skill_family_gap,
             "skill_gaps": [gap.model_dump() for gap in family.skill_gaps],
@@ -550,50 +658,49 @@ def run_feedback_pipeline_tenant(session_id: str, collection_name: str) -> str |
     
     # STEP 6: Generazione PDF
     print("\n[STEP 6/6] Generazione del file PDF...")
-    temp_dir = "temp_pdf"
-    os.makedirs(temp_dir, exist_ok=True)
-    temp_pdf_path = os.path.join(temp_dir, f"{session_id}.pdf")
-    
-    create_feedback_pdf(
+    pdf_bytes = create_feedback_pdf(
         report_content=final_report_content,
-        output_path=temp_pdf_path,
         market_benchmark_text=qualitative_text,
         market_chart_categories_base64=chart_cat_b64,
         market_skills_list=market_skills_list 
     )
     
-    pdf_path = ""
-    if os.path.exists(temp_pdf_path):
-        with open(temp_pdf_path, "rb") as f:
-            pdf_bytes = f.read()
-        # Save PDF using tenant-aware function
-        pdf_path = save_pdf_report_tenant(pdf_bytes, session_id, collection_name)
-        os.remove(temp_pdf_path)
+    # Rendered in memory, written once by the artifact store
+    pdf_path = save_pdf_report_tenant(pdf_bytes, session_id, collection_name) if pdf_bytes else ""
         
     print("--- [PIPELINE] Generazione Feedback completata (tenant-aware). ---")
     return pdf_path
 
+def artifact_download_response(artifact, request: Request, filename: str) -> Response:
+    """Streamed download of a stored artifact, with ETag (304) and single Range (206) support"""
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "ETag": artifact.etag,
+        "Accept-Ranges": "bytes",
+    }
+    if request.headers.get("if-none-match") == artifact.etag:
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if not if_range or if_range == artifact.etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), artifact.length)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{artifact.length}"})
+
+    if byte_range is None:
+        headers["Content-Length"] = str(artifact.length)
+        return StreamingResponse(artifact.iter_bytes(), media_type=artifact.content_type, headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{artifact.length}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(artifact.iter_bytes(start, end), status_code=206, media_type=artifact.content_type, headers=headers)
+
+
 def save_pdf_report_tenant(pdf_bytes: bytes, session_id: str, collection_name: str) -> str:
     """Tenant-aware version of save_pdf_report"""
-    import os
-    from services.data_manager import db
-    
-    if db is None:
-        return ""
-    
-    try:
-        output_dir = os.path.join("data", "sessions", session_id)
-        os.makedirs(output_dir, exist_ok=True)
-        pdf_path = os.path.join(output_dir, "feedback_report.pdf")
-        
-        with open(pdf_path, "wb") as f:
-            f.write(pdf_bytes)
-        
-        print(f"💾 PDF salvato in: {pdf_path}")
-        return pdf_path
-    except Exception as e:
-        print(f"Errore durante il salvataggio del PDF: {e}")
-        return ""
+    return save_artifact(session_id, "feedback_report.pdf", pdf_bytes, "application/pdf")
 
 # Sessions (HR)
 @app.post("/sessions")
@@ -604,20 +711,14 @@ async def create_session(position_id: str = Form(...), candidate_name: str = For
     if not created:
         raise HTTPException(status_code=500, detail="Failed to create session")
 
-    # Extract CV text
+    # Extract CV text (on the extraction pool, off the event loop)
     content = await cv_file.read()
-    cv_text = ""
-    if cv_file.content_type == "application/pdf" or cv_file.filename.endswith(".pdf"):
-        try:
-            with fitz.open(stream=content, filetype="pdf") as doc:
-                cv_text = "".join(page.get_text() for page in doc)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid PDF: {e}")
-    else:
-        try:
-            cv_text = content.decode("utf-8")
-        except Exception:
-            raise HTTPException(status_code=400, detail="Unsupported CV format; provide PDF or UTF-8 text")
+    try:
+        cv_text = await extract_cv_text_async(content, cv_file.filename, cv_file.content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CVExtractionUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     save_stage_output_tenant(session_id, "uploaded_cv_text", cv_text, collections["sessions"])
 
@@ -627,10 +728,117 @@ async def create_session(position_id: str = Form(...), candidate_name: str = For
     # Save the interview token to the session document for easy access
     save_stage_output_tenant(session_id, "interview_token", token, collections["sessions"])
     
-    # Optionally send invite email
+    # Optionally queue the invite email (delivered in background by the outbox sender)
+    invite_email_id = None
     if candidate_email and frontend_base_url:
-        send_interview_link(candidate_email, token, frontend_base_url)
-    return {"session_id": session_id, "interview_token": token}
+        invite_email_id = enqueue_interview_link(candidate_email, token, frontend_base_url, session_id, auth_data.get("tenant_id"))
+    return {"session_id": session_id, "interview_token": token, "invite_email_id": invite_email_id}
+
+
+def _position_exists(position_id: str, positions_collection: str) -> bool:
+    """Existence check on the tenant positions collection, without loading the position document"""
+    return db[positions_collection].find_one({"_id": position_id}, {"_id": 1}) is not None
+
+
+async def _read_upload_limited(upload: UploadFile, max_bytes: int, label: str) -> bytes:
+    """Read an upload in chunks, 413 as soon as it exceeds max_bytes (never buffered beyond the limit)"""
+    chunks, size = [], 0
+    while True:
+        chunk = await upload.read(1024 * 1024)
+        if not chunk:
+            return b"".join(chunks)
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"{label} too large (max {max_bytes // (1024 * 1024)} MB)")
+        chunks.append(chunk)
+
+
+async def _spool_upload_limited(upload: UploadFile, max_bytes: int, label: str, suffix: str = "") -> str:
+    """As _read_upload_limited, but writes the upload to a temporary file; returns its path (the caller deletes it)"""
+    size = 0
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+        try:
+            while True:
+                chunk = await upload.read(1024 * 1024)
+                if not chunk:
+                    return f.name
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"{label} too large (max {max_bytes // (1024 * 1024)} MB)")
+                f.write(chunk)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+
+
+@app.post("/sessions/bulk")
+async def create_sessions_bulk(
+    position_id: str = Form(...),
+    cv_archive: UploadFile = File(...),
+    candidates_csv: UploadFile = File(...),
+    frontend_base_url: str = Form(""),
+    prepare: bool = Form(True),
+    auth_data=Depends(hr_auth),
+):
+    """
+    Create many sessions from a ZIP of CVs and a CSV of candidates (name, email, CV file name).
+    Sessions are created, invited and (optionally) prepared in background; poll the batch_id.
+    """
+    collections = get_tenant_collections_from_auth(auth_data)
+    tenant_id = auth_data["tenant_id"]
+    if not _position_exists(position_id, collections["positions"]):
+        raise HTTPException(status_code=404, detail="Position not found")
+    csv_bytes = await _read_upload_limited(candidates_csv, BULK_CSV_MAX_BYTES, "Candidates CSV")
+    # The archive is kept on disk, not in memory, until the background job deletes it
+    zip_path = await _spool_upload_limited(cv_archive, BULK_UPLOAD_MAX_BYTES, "CV archive", suffix=".zip")
+    try:
+        try:
+            candidates = match_cv_files(parse_candidates_csv(csv_bytes), zip_path)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        batch_id = create_job(
+            "session_bulk_create", tenant_id, [c["session_id"] for c in candidates],
+            {"position_id": position_id, "prepare": prepare},
+        )
+        if not batch_id:
+            raise HTTPException(status_code=500, detail="Failed to create batch job")
+
+        threading.Thread(
+            target=run_bulk_session_creation,
+            args=(batch_id, tenant_id, position_id, candidates, zip_path, frontend_base_url, prepare),
+            daemon=True,
+        ).start()
+    except BaseException:
+        os.remove(zip_path)
+        raise
+    return {
+        "ok": True,
+        "batch_id": batch_id,
+        "total": len(candidates),
+        "candidates": [
+            {"session_id": c["session_id"], "candidate_name": c["candidate_name"], "cv_filename": c["cv_filename"], "error": c.get("error")}
+            for c in candidates
+        ],
+    }
+
+
+@app.get("/sessions/bulk/{batch_id}")
+def get_sessions_bulk_status(batch_id: str, auth_data=Depends(hr_auth)):
+    get_tenant_collections_from_auth(auth_data)
+    job = get_job(batch_id, auth_data["tenant_id"])
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return job
+
+
+@app.get("/sessions/{session_id}/invite-status")
+def get_invite_status(session_id: str, auth_data=Depends(hr_auth)):
+    """Delivery status of the invitation emails of a session"""
+    get_tenant_collections_from_auth(auth_data)
+    emails = get_session_email_status(session_id, auth_data.get("tenant_id"))
+    return {"session_id": session_id, "status": emails[0]["status"] if emails else None, "emails": emails}
 
 
 @app.post("/sessions/{session_id}/prepare")
@@ -643,8 +851,8 @@ def prepare_session(session_id: str, auth_data=Depends(hr_auth)):
     if not ok:
         raise HTTPException(status_code=500, detail="CV analysis failed")
 
-    # Initialize chatbot with random case and persist chatbot state
-    meta = initialize_chatbot_for_session(session_id, tenant_id)
+    # Initialize chatbot with random case, generate the opening message and persist chatbot state
+    meta = initialize_chatbot_for_session(session_id, tenant_id, prewarm=True)
     if not meta:
         raise HTTPException(status_code=500, detail="Chatbot initialization failed")
     return meta
@@ -692,7 +900,7 @@ def generate_feedback(session_id: str, auth_data=Depends(hr_auth)):
 
 
 @app.get("/sessions/{session_id}/feedback-pdf")
-def download_feedback_pdf(session_id: str, auth_data=Depends(hr_auth)):
+def download_feedback_pdf(session_id: str, request: Request, auth_data=Depends(hr_auth)):
     """Download the feedback PDF for a completed session"""
     collections = get_tenant_collections_from_auth(auth_data)
     
@@ -708,32 +916,28 @@ def download_feedback_pdf(session_id: str, auth_data=Depends(hr_auth)):
         raise HTTPException(status_code=404, detail="Feedback PDF not found")
     
     try:
-        import os
-        if not os.path.exists(pdf_path):
-            raise HTTPException(status_code=404, detail="PDF file not found on disk")
-        
-        with open(pdf_path, "rb") as pdf_file:
-            pdf_content = pdf_file.read()
-        
-        # Track download information
-        download_info = {
-            "downloaded_at": datetime.utcnow().isoformat(),
-            "downloaded_by": auth_data.get("sub"),  # User email
-            "downloaded_by_name": auth_data.get("name", auth_data.get("sub", "Unknown"))
-        }
-        
-        # Update session with download tracking
-        save_stage_output_tenant(session_id, "feedback_download", download_info, collections["sessions"])
+        artifact = open_artifact(pdf_path, "application/pdf")
+        if artifact is None:
+            raise HTTPException(status_code=404, detail="PDF file not found in storage")
         
         candidate_name = session_data.get("candidate_name", "Candidate")
         position_id = session_data.get("position_id", "Position")
         filename = f"Report_Feedback_{candidate_name}_{position_id}.pdf"
         
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
+        response = artifact_download_response(artifact, request, filename)
+        
+        # Track download information (once per download, not per resumed range)
+        if response.status_code == 200 or request.headers.get("range", "").startswith("bytes=0-"):
+            download_info = {
+                "downloaded_at": datetime.utcnow().isoformat(),
+                "downloaded_by": auth_data.get("sub"),  # User email
+                "downloaded_by_name": auth_data.get("name", auth_data.get("sub", "Unknown"))
+            }
+            save_stage_output_tenant(session_id, "feedback_download", download_info, collections["sessions"])
+        
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error downloading feedback PDF for session {session_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Error downloading PDF: {str(e)}")
@@ -1007,93 +1211,49 @@ def interview_state(token: str):
             raise HTTPException(status_code=500, detail=f"Interview state error: {str(e)}")
 
 
-# Security event reporting endpoint
+# Security event reporting endpoints
 @app.post("/interviews/{token}/security-event")
 def report_security_event(token: str, event_data: dict):
+    """Single event (kept for older clients); prefer the batched /security-events endpoint"""
     result = resolve_token_global(token)
     if not result:
         raise HTTPException(status_code=404, detail="Invalid or expired link")
     session_id, tenant_id = result
     
-    # Validate event data
-    required_fields = ['type', 'timestamp', 'severity']
-    for field in required_fields:
-        if field not in event_data:
-            raise HTTPException(status_code=400, detail=f"Missing required field: {field}")
+    try:
+        validate_events([event_data])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Store security event
     try:
-        # Create security event record
-        security_event = {
-            "session_id": session_id,
-            "tenant_id": tenant_id,
-            "event_type": event_data.get("type"),
-            "timestamp": event_data.get("timestamp"),
-            "severity": event_data.get("severity"),
-            "details": event_data.get("details", ""),
-            "created_at": datetime.utcnow().isoformat()
-        }       
-        # Generate unique event ID
-        event_id = f"{session_id}_{int(datetime.utcnow().timestamp() * 1000)}"
-        security_event["_id"] = event_id
-        
-        # Save security event to database
-        if db is not None:
-            security_events_collection = db[f"security_events_{tenant_id}"]
-            security_events_collection.insert_one(security_event)
-            print(f"🔒 Security event saved: {event_id}")
-        
-        # Update session with security summary
-        collections = get_tenant_collections(tenant_id)
-        sess = get_session_data_tenant(session_id, collections["sessions"]) or {}
-        
-        if "security_summary" not in sess:
-            sess["security_summary"] = {
-                "total_events": 0,
-                "high_severity_events": 0,
-                "medium_severity_events": 0,
-                "low_severity_events": 0,
-                "cheating_score": 0,
-                "events_by_type": {},
-                "last_updated": datetime.utcnow().isoformat()
-            }
-        
-        # Update security summary
-        summary = sess["security_summary"]
-        summary["total_events"] += 1
-        summary["last_updated"] = datetime.utcnow().isoformat()
-        
-        severity = event_data.get("severity", "low")
-        if severity == "high":
-            summary["high_severity_events"] += 1
-            summary["cheating_score"] += 10
-        elif severity == "medium":
-            summary["medium_severity_events"] += 1
-            summary["cheating_score"] += 5
-        else:
-            summary["low_severity_events"] += 1
-            summary["cheating_score"] += 1
-        
-        event_type = event_data.get("type", "unknown")
-        summary["events_by_type"][event_type] = summary["events_by_type"].get(event_type, 0) + 1
-        
-        # Save updated session to database
-        if db is not None:
-            sessions_collection = db[f"sessions_{tenant_id}"]
-            sessions_collection.update_one(
-                {"_id": session_id}, 
-                {"$set": {"security_summary": summary}}, 
-                upsert=False
-            )
-            print(f"📊 Security summary updated for session: {session_id}")
-        
-        return {"status": "success", "event_id": event_id}
-        
+        event_ids = record_security_events(session_id, tenant_id, [event_data])
+        return {"status": "success", "event_id": event_ids[0] if event_ids else None}
     except Exception as e:
         print(f"Error storing security event: {e}")
         raise HTTPException(status_code=500, detail="Failed to store security event")
 
 
+@app.post("/interviews/{token}/security-events")
+def report_security_events(token: str, payload: SecurityEventsPayload):
+    """Batch of buffered events (see services.security_service for the client flush contract)"""
+    result = resolve_token_global(token)
+    if not result:
+        raise HTTPException(status_code=404, detail="Invalid or expired link")
+    session_id, tenant_id = result
+    
+    try:
+        validate_events(payload.events)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        event_ids = record_security_events(session_id, tenant_id, payload.events)
+        return {"status": "success", "stored": len(event_ids)}
+    except Exception as e:
+        print(f"Error storing security events: {e}")
+        raise HTTPException(status_code=500, detail="Failed to store security events")
+
+
 # Get security report for a session (HR only)
 @app.get("/sessions/{session_id}/security-report")
 def get_security_report(session_id: str, auth_data=Depends(hr_auth)):
@@ -1110,77 +1270,24 @@ def get_security_report(session_id: str, auth_data=Depends(hr_auth)):
         if not sess:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        # Get detailed security events from database first
+        # Most recent events (indexed, sorted and limited in the query)
         security_events = []
-        if db is not None:
-            try:
-                security_events_collection = db[f"security_events_{tenant_id}"]
-                events_cursor = security_events_collection.find({"session_id": session_id})
-                security_events = list(events_cursor)
-                print(f"🔍 Found {len(security_events)} security events for session {session_id}")
-            except Exception as e:
-                print(f"Error retrieving security events: {e}")
-        
-        # Get security summary from session
-        security_summary = sess.get("security_summary", {
-            "total_events": 0,
-            "high_severity_events": 0,
-            "medium_severity_events": 0,
-            "low_severity_events": 0,
-            "cheating_score": 0,
-            "events_by_type": {},
-            "last_updated": None
-        })
-        
-        # If we have events but no summary, calculate it from events
-        if security_events and security_summary.get("total_events", 0) == 0:
-            print(f"🔧 Recalculating security summary from {len(security_events)} events")
-            security_summary = {
-                "total_events": len(security_events),
-                "high_severity_events": sum(1 for e in security_events if e.get("severity") == "high"),
-                "medium_severity_events": sum(1 for e in security_events if e.get("severity") == "medium"),
-                "low_severity_events": sum(1 for e in security_events if e.get("severity") == "low"),
-                "cheating_score": 0,
-                "events_by_type": {},
-                "last_updated": None
-            }
-            
-            # Calculate cheating score
-            for event in security_events:
-                severity = event.get("severity", "low")
-                if severity == "high":
-                    security_summary["cheating_score"] += 10
-                elif severity == "medium":
-                    security_summary["cheating_score"] += 5
-                else:
-                    security_summary["cheating_score"] += 1
-                
-                # Count by type
-                event_type = event.get("event_type", "unknown")
-                security_summary["events_by_type"][event_type] = security_summary["events_by_type"].get(event_type, 0) + 1
+        try:
+            security_events = get_recent_security_events(session_id, tenant_id)
+        except Exception as e:
+            print(f"Error retrieving security events: {e}")
         
-        # Sort events by timestamp
-        security_events.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
+        # Stored summary, or $group aggregation of the events if missing
+        security_summary = get_security_summary(sess, tenant_id)
         
         # Generate risk assessment
         cheating_score = security_summary.get("cheating_score", 0)
-        if cheating_score >= 50:
-            risk_level = "HIGH"
-            risk_color = "#dc3545"
-        elif cheating_score >= 20:
-            risk_level = "MEDIUM"
-            risk_color = "#ffc107"
-        elif cheating_score >= 5:
-            risk_level = "LOW"
-            risk_color = "#28a745"
-        else:
-            risk_level = "MINIMAL"
-            risk_color = "#6c757d"
+        risk_level, risk_color = security_risk_level(cheating_score)
         
         return {
             "session_id": session_id,
             "security_summary": security_summary,
-            "security_events": security_events[:50],  # Limit to last 50 events
+            "security_events": security_events,  # Last SECURITY_REPORT_MAX_EVENTS events
             "risk_assessment": {
                 "level": risk_level,
                 "color": risk_color,
@@ -1189,11 +1296,24 @@ def get_security_report(session_id: str, auth_data=Depends(hr_auth)):
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error retrieving security report: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve security report")
 
 
+# Cross-session security analytics for a position (HR only)
+@app.get("/positions/{position_id}/security-analytics")
+def get_position_security_analytics(position_id: str, top: int = 10, auth_data=Depends(hr_auth)):
+    get_tenant_collections_from_auth(auth_data)
+    try:
+        return position_security_analytics(position_id, auth_data["tenant_id"], top_sessions=top)
+    except Exception as e:
+        print(f"Error computing security analytics for position {position_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to compute security analytics")
+
+
 def get_security_recommendation(cheating_score: int) -> str:
     """Generate security recommendation based on cheating score"""
     if cheating_score >= 50:
@@ -1209,13 +1329,46 @@ def get_security_recommendation(cheating_score: int) -> str:
 # Evaluation and feedback (HR)
 @app.post("/sessions/{session_id}/evaluate")
 def evaluate_session(session_id: str, _=Depends(hr_auth)):
-    ok = execute_case_evaluation(session_id=session_id)
+    # Case evaluation and skill relevance run concurrently; skill relevance is saved only on success
+    ok = run_post_interview_evaluation(session_id=session_id)
     if not ok:
         raise HTTPException(status_code=500, detail="Evaluation failed")
-    # Skill relevance
-    _ = compute_and_save_skill_relevance(session_id=session_id)
     return {"ok": True}
 
+@app.post("/positions/{position_id}/reevaluate")
+def bulk_reevaluate_position(position_id: str, payload: BulkReevaluationPayload, auth_data=Depends(hr_auth)):
+    """Re-evaluate all completed sessions of a position in background; dry_run only reports the differences"""
+    collections = get_tenant_collections_from_auth(auth_data)
+    tenant_id = auth_data["tenant_id"]
+    if not _position_exists(position_id, collections["positions"]):
+        raise HTTPException(status_code=404, detail="Position not found")
+    job_id = create_job("bulk_reevaluation", tenant_id, payload.session_ids or [], {"position_id": position_id, **payload.model_dump()})
+    if not job_id:
+        raise HTTPException(status_code=500, detail="Failed to create re-evaluation job")
+
+    threading.Thread(
+        target=run_bulk_reevaluation,
+        args=(position_id, tenant_id),
+        kwargs={
+            "session_ids": payload.session_ids,
+            "dry_run": payload.dry_run,
+            "include_skills": payload.include_skills,
+            "job_id": job_id,
+        },
+        daemon=True,
+    ).start()
+    return {"ok": True, "job_id": job_id}
+
+
+@app.get("/positions/{position_id}/reevaluate/{job_id}")
+def get_bulk_reevaluation_status(position_id: str, job_id: str, auth_data=Depends(hr_auth)):
+    get_tenant_collections_from_auth(auth_data)
+    job = get_job(job_id, auth_data["tenant_id"])
+    if not job or job.get("params", {}).get("position_id") != position_id:
+        raise HTTPException(status_code=404, detail="Re-evaluation job not found")
+    return job
+
+
 #GENERAZIONE FEEDBACK DISABILITATA
 @app.post("/sessions/{session_id}/feedback")
 def generate_feedback(session_id: str, _=Depends(hr_auth)):
@@ -1226,20 +1379,17 @@ def generate_feedback(session_id: str, _=Depends(hr_auth)):
 
 
 @app.get("/sessions/{session_id}/feedback")
-def download_feedback(session_id: str, auth_data=Depends(hr_auth)):
+def download_feedback(session_id: str, request: Request, auth_data=Depends(hr_auth)):
     collections = get_tenant_collections_from_auth(auth_data)
     sess = get_session_data_tenant(session_id, collections["sessions"])
     if not sess:
         raise HTTPException(status_code=404, detail="Session not found")
-    # The pipeline stores the path; fetch persisted file
-    base_dir = os.path.join("data", "sessions", session_id)
-    file_path = os.path.join(base_dir, "Report_Feedback_Candidato.pdf")
-    if not os.path.exists(file_path):
+    # The pipeline stores the artifact reference; older sessions only have the file on disk
+    ref = sess.get("stages", {}).get("feedback_pdf_path") or os.path.join("data", "sessions", session_id, "Report_Feedback_Candidato.pdf")
+    artifact = open_artifact(ref, "application/pdf")
+    if artifact is None:
         raise HTTPException(status_code=404, detail="PDF not found")
-    def iterfile():
-        with open(file_path, "rb") as f:
-            yield from f
-    return StreamingResponse(iterfile(), media_type="application/pdf")
+    return artifact_download_response(artifact, request, "Report_Feedback_Candidato.pdf")
 
 
 def _scale_to_0_4(pct_val):
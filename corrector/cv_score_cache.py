@@ -0,0 +1,96 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from services.data_manager import db
+
+CV_SCORE_CACHE_COLLECTION = "cv_score_cache"
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def evaluation_criteria_fingerprint(evaluation_criteria: Optional[dict]) -> str:
+    """Impronta stabile della rubrica 'evaluation_criteria' di una posizione."""
+    return _sha256(json.dumps(evaluation_criteria or {}, sort_keys=True, ensure_ascii=False))
+
+
+def build_cv_score_cache_key(cv_text: str, position_id: str, canonical_skills: List[dict], criteria_fingerprint: str) -> str:
+    """
+    Chiave della cache: hash del testo del CV, posizione, lista canonica delle skill
+    (id, nome e criteri, in ordine) e impronta della rubrica di valutazione.
+    """
+    skills_payload = [
+        [s.get("skill_id"), s.get("skill_name"), s.get("criteria_texts", [])]
+        for s in canonical_skills
+    ]
+    skills_hash = _sha256(json.dumps(skills_payload, ensure_ascii=False))
+    return _sha256("|".join([_sha256(cv_text), position_id or "", skills_hash, criteria_fingerprint]))
+
+
+def cv_score_cache_collection_for(positions_collection: str) -> str:
+    """
+    Collection della cache associata a una collection di posizioni: le collection tenant
+    condividono il prefisso ('<tenant>_positions_data' -> '<tenant>_cv_score_cache').
+    """
+    if positions_collection.endswith("positions_data"):
+        return positions_collection[: -len("positions_data")] + CV_SCORE_CACHE_COLLECTION
+    return CV_SCORE_CACHE_COLLECTION
+
+
+def get_cached_cv_scores(cache_key: str, collection_name: str = CV_SCORE_CACHE_COLLECTION) -> Optional[Dict[str, dict]]:
+    """Restituisce i punteggi CV in cache ({skill_id: {"score", "notes"}}) o None."""
+    if db is None:
+        return None
+    try:
+        entry = db[collection_name].find_one({"_id": cache_key}, {"scores": 1})
+        return entry.get("scores") if entry else None
+    except Exception as e:
+        print(f"  - [CV Score Cache] Errore in lettura: {e}")
+        return None
+
+
+def save_cached_cv_scores(
+    cache_key: str,
+    position_id: str,
+    criteria_fingerprint: str,
+    scores: Dict[str, dict],
+    collection_name: str = CV_SCORE_CACHE_COLLECTION,
+):
+    if db is None or not scores:
+        return
+    try:
+        db[collection_name].update_one(
+            {"_id": cache_key},
+            {"$set": {
+                "position_id": position_id,
+                "criteria_fingerprint": criteria_fingerprint,
+                "scores": scores,
+                "created_at": datetime.utcnow().isoformat(),
+            }},
+            upsert=True,
+        )
+    except Exception as e:
+        print(f"  - [CV Score Cache] Errore in scrittura: {e}")
+
+
+def invalidate_cv_score_cache(position_id: str, collection_name: str = CV_SCORE_CACHE_COLLECTION, keep_fingerprint: Optional[str] = None) -> int:
+    """
+    Elimina le voci in cache di una posizione, ad esempio dopo la rigenerazione di
+    'evaluation_criteria'. Se 'keep_fingerprint' è indicato, conserva le voci ancora valide.
+    """
+    if db is None:
+        return 0
+    query = {"position_id": position_id}
+    if keep_fingerprint:
+        query["criteria_fingerprint"] = {"$ne": keep_fingerprint}
+    try:
+        deleted = db[collection_name].delete_many(query).deleted_count
+        if deleted:
+            print(f"  - [CV Score Cache] Invalidate {deleted} voci per la posizione '{position_id}'.")
+        return deleted
+    except Exception as e:
+        print(f"  - [CV Score Cache] Errore nell'invalidazione: {e}")
+        return 0
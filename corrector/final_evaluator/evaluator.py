@@ -1,17 +1,10 @@
 from interviewer.llm_service import get_llm_response
 from . import prompts_final_eval
+from .prompt_budget import fit_conversation_to_budget, log_prompt_sections
 from interviewer.llm_service import AZURE_DEPLOYMENT_NAME
 
 EVALUATION_MODEL = AZURE_DEPLOYMENT_NAME
 
-def _format_conversation(conversation_history: list) -> str:
-    """Converte la cronologia della conversazione da JSON a un formato testuale leggibile."""
-    formatted_lines = []
-    for message in conversation_history:
-        role = "Candidato" if message["role"] == "user" else "Intervistatore (Vertigo)"
-        formatted_lines.append(f"[{role}]: {message['content']}")
-    return "\n\n".join(formatted_lines)
-
 def evaluate_candidate_performance(
     icp_text: str, 
     conversation_json_data: list,
@@ -22,9 +15,27 @@ def evaluate_candidate_performance(
 ) -> str:
     """
     Genera un report di valutazione completo sulla performance del candidato.
+
+    'all_cases_text' e 'evaluation_criteria_text' possono essere già ridotti al solo caso
+    svolto e alle skill che testa (vedi prompt_budget.build_case_scoped_inputs); la
+    conversazione viene compattata per rientrare nel budget di token del prompt, senza mai
+    tagliare le risposte del candidato (vedi prompt_budget.fit_conversation_to_budget).
     """
-    # Ora formattiamo i dati passati direttamente
-    conversation_text = _format_conversation(conversation_json_data)
+    fixed_sections = {
+        "template": prompts_final_eval.create_final_evaluation_prompt("", "", "", "", "", ""),
+        "icp": icp_text,
+        "case_map": case_map_text,
+        "cases": all_cases_text,
+        "criteria": evaluation_criteria_text,
+        "seniority": seniority_level,
+    }
+    conversation_text, fixed_sections, stats = fit_conversation_to_budget(conversation_json_data, fixed_sections)
+    all_cases_text = fixed_sections["cases"]
+    if stats["truncated"] or stats["omitted"]:
+        print(f"  - [Prompt Budget] Conversazione compattata: ~{stats['original_tokens']} -> ~{stats['tokens']} token "
+              f"({stats['truncated']} messaggi dell'intervistatore accorciati, {stats['omitted']} omessi"
+              f"{', testo del caso omesso' if stats.get('case_text_omitted') else ''})")
+    log_prompt_sections({**fixed_sections, "conversation": conversation_text})
 
     print("1. Creazione del prompt per la valutazione finale...")
     prompt = prompts_final_eval.create_final_evaluation_prompt(
@@ -42,4 +53,4 @@ def evaluate_candidate_performance(
     )
     
     print("3. Report di valutazione generato.")
-    return evaluation_report  
\ No newline at end of file
+    return evaluation_report
@@ -0,0 +1,140 @@
+# corrector/final_evaluator/prompt_budget.py
+
+import os
+import json
+from typing import List, Optional, Tuple
+
+from interviewer.llm_service import estimate_tokens
+from ..skill_index import SkillIndex
+
+# Budget complessivo (token stimati) del prompt di valutazione finale
+EVAL_PROMPT_TOKEN_BUDGET = int(os.getenv("EVAL_PROMPT_TOKEN_BUDGET", "16000"))
+# Spazio minimo sempre riservato alla conversazione, anche se le altre sezioni sono grandi
+EVAL_MIN_CONVERSATION_TOKENS = int(os.getenv("EVAL_MIN_CONVERSATION_TOKENS", "3000"))
+# Lunghezza massima dei messaggi dell'intervistatore quando la conversazione va compattata
+EVAL_COMPACT_ASSISTANT_CHARS = int(os.getenv("EVAL_COMPACT_ASSISTANT_CHARS", "600"))
+# Sezione del caso usata quando serve spazio per le risposte del candidato
+CASE_TEXT_OMITTED = "[Testo del caso omesso per limiti di lunghezza: vedi la mappa di valutazione e la presentazione del caso nella conversazione]"
+
+
+def _format_message(message: dict) -> str:
+    role = "Candidato" if message.get("role") == "user" else "Intervistatore (Vertigo)"
+    return f"[{role}]: {message.get('content', '')}"
+
+
+def _tested_skill_names(case_data: dict) -> List[str]:
+    names = []
+    for step in case_data.get("reasoning_steps", []):
+        for skill_test in step.get("skills_to_test", []):
+            name = (skill_test.get("skill_name") or "").strip()
+            if name and name not in names:
+                names.append(name)
+    return names
+
+
+def build_case_scoped_inputs(case_data: dict, evaluation_criteria_data: dict, skill_index: Optional[SkillIndex] = None) -> Tuple[str, str]:
+    """
+    Restituisce (testo del caso svolto, criteri di valutazione delle sole skill testate nel caso).
+    Se nessuna skill del caso trova corrispondenza nella rubrica, restituisce la rubrica completa.
+    """
+    played_case_text = json.dumps({"cases": [case_data]})
+
+    if skill_index is None:
+        skill_index = SkillIndex.for_position({"evaluation_criteria": evaluation_criteria_data})
+    tested_requirements = set()
+    for skill_name in _tested_skill_names(case_data):
+        requirement, _ = skill_index.match(skill_name)
+        if requirement:
+            tested_requirements.add(requirement)
+
+    schema = evaluation_criteria_data.get("evaluation_schema", [])
+    scoped_schema = [item for item in schema if (item.get("requirement") or "").strip() in tested_requirements]
+    if not scoped_schema:
+        return played_case_text, json.dumps(evaluation_criteria_data)
+    return played_case_text, json.dumps({**evaluation_criteria_data, "evaluation_schema": scoped_schema})
+
+
+def compact_conversation(conversation: list, budget_tokens: int) -> Tuple[str, dict]:
+    """
+    Formatta la conversazione rispettando il budget di token. Le risposte del candidato sono
+    l'evidenza da valutare: non vengono mai accorciate né omesse. Si riduce solo il testo
+    dell'intervistatore, tranne il primo messaggio (presentazione del caso):
+    1. accorciando i suoi messaggi;
+    2. se non basta, omettendoli a partire dal più vecchio, segnalandolo.
+    Se le sole risposte del candidato superano il budget, il testo resta fuori budget
+    (stats["over_budget"]): le altre sezioni del prompt vanno ridotte dal chiamante.
+    Restituisce il testo e le statistiche della compattazione.
+    """
+    lines = [_format_message(m) for m in conversation]
+    stats = {"messages": len(lines), "original_tokens": estimate_tokens("\n\n".join(lines)), "truncated": 0, "omitted": 0, "over_budget": False}
+    if stats["original_tokens"] <= budget_tokens:
+        stats["tokens"] = stats["original_tokens"]
+        return "\n\n".join(lines), stats
+
+    # 1. Accorcia i messaggi dell'intervistatore, tranne il primo (presentazione del caso)
+    interviewer_indexes = [i for i, message in enumerate(conversation) if i > 0 and message.get("role") != "user"]
+    for i in interviewer_indexes:
+        message = conversation[i]
+        content = message.get("content", "")
+        if len(content) > EVAL_COMPACT_ASSISTANT_CHARS:
+            lines[i] = _format_message({**message, "content": content[:EVAL_COMPACT_ASSISTANT_CHARS].rstrip() + " […]"})
+            stats["truncated"] += 1
+
+    # 2. Omette i messaggi dell'intervistatore dal più vecchio finché non si rientra nel budget
+    #    (la stima è fatta sul testo finale, separatori e avviso di omissione inclusi)
+    omitted = set()
+    text = _join_compacted(lines, omitted)
+    for i in interviewer_indexes:
+        if estimate_tokens(text) <= budget_tokens:
+            break
+        omitted.add(i)
+        text = _join_compacted(lines, omitted)
+    stats["omitted"] = len(omitted)
+    stats["tokens"] = estimate_tokens(text)
+    stats["over_budget"] = stats["tokens"] > budget_tokens
+    return text, stats
+
+
+def _omitted_marker(omitted: int) -> str:
+    return f"[... {omitted} messaggi dell'intervistatore omessi per limiti di lunghezza ...]"
+
+
+def _join_compacted(lines: list, omitted: set) -> str:
+    kept = [line for i, line in enumerate(lines) if i not in omitted]
+    if omitted:
+        kept.insert(1, _omitted_marker(len(omitted)))
+    return "\n\n".join(kept)
+
+
+def fit_conversation_to_budget(conversation: list, fixed_sections: dict) -> Tuple[str, dict, dict]:
+    """
+    Compatta la conversazione nello spazio lasciato dalle sezioni fisse del prompt.
+    Se le risposte del candidato non ci stanno nemmeno senza il testo dell'intervistatore,
+    omette la sezione 'cases' (il caso resta descritto dalla mappa di valutazione e dalla
+    presentazione in apertura) e, se ancora non basta, supera il budget segnalandolo:
+    le risposte del candidato non vengono mai tagliate.
+    Restituisce (conversazione, sezioni fisse eventualmente ridotte, statistiche).
+    """
+    conversation_text, stats = compact_conversation(conversation, conversation_token_budget(fixed_sections))
+    if stats["over_budget"] and fixed_sections.get("cases") and fixed_sections["cases"] != CASE_TEXT_OMITTED:
+        fixed_sections = {**fixed_sections, "cases": CASE_TEXT_OMITTED}
+        conversation_text, stats = compact_conversation(conversation, conversation_token_budget(fixed_sections))
+        stats["case_text_omitted"] = True
+    if stats["over_budget"]:
+        print(f"  - [Prompt Budget] ATTENZIONE: le risposte del candidato (~{stats['tokens']} token di conversazione) "
+              f"non rientrano nel budget di {EVAL_PROMPT_TOKEN_BUDGET} token: il prompt lo supera per non tagliarle.")
+    return conversation_text, fixed_sections, stats
+
+
+def conversation_token_budget(fixed_sections: dict) -> int:
+    """Token disponibili per la conversazione dopo le sezioni fisse (template incluso)."""
+    used = sum(estimate_tokens(text) for text in fixed_sections.values())
+    return max(EVAL_PROMPT_TOKEN_BUDGET - used, EVAL_MIN_CONVERSATION_TOKENS)
+
+
+def log_prompt_sections(sections: dict, label: str = "Valutazione finale"):
+    """Stampa l'uso stimato di token per sezione del prompt."""
+    counts = {name: estimate_tokens(text) for name, text in sections.items()}
+    total = sum(counts.values())
+    details = ", ".join(f"{name}={count}" for name, count in counts.items())
+    print(f"  - [Prompt Budget] {label}: ~{total} token (budget {EVAL_PROMPT_TOKEN_BUDGET}) -> {details}")
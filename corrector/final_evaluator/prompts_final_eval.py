@@ -42,10 +42,10 @@ o	Valutazione dei requisiti: inserisci in questa sezione come hai valutato (e su
 [MAPPA DI VALUTAZIONE DEL CASO SVOLTO]
 {case_map_text}
 
-[DATABASE COMPLETO DEI CASI (per contesto generale)]
+[CASO SVOLTO (testo e reasoning steps)]
 {all_cases_text}
 
-[SCHEMA DEI CRITERI DI VALUTAZIONE GENERALI]
+[SCHEMA DEI CRITERI DI VALUTAZIONE (requisiti testati nel caso)]
 {evaluation_criteria_text}
 
 [LIVELLO DI SENIORITY]
@@ -0,0 +1,242 @@
+import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from interviewer.llm_service import batch_llm_budget, bind_llm_budget
+from services.data_manager import db, SESSIONS_COLLECTION_NAME
+from services.tenant_service import get_tenant_collections
+from services.job_service import set_job_items, update_job_item, finish_job
+from .run_final_evaluation import load_evaluation_context, compute_case_evaluation
+from .skill_relevance_scorer import compute_skill_relevance_from_data
+from .cv_score_cache import CV_SCORE_CACHE_COLLECTION
+from .run_post_interview import evaluate_and_score_concurrently
+
+# Sessioni ri-valutate in parallelo (le chiamate LLM restano sotto il budget dei job batch di llm_service)
+BULK_REEVAL_MAX_WORKERS = int(os.getenv("BULK_REEVAL_MAX_WORKERS", "8"))
+# Numero di aggiornamenti accumulati prima di una bulk_write
+BULK_REEVAL_WRITE_BATCH = int(os.getenv("BULK_REEVAL_WRITE_BATCH", "50"))
+
+SESSION_PROJECTION = {
+    "position_id": 1,
+    "candidate_name": 1,
+    "stages.conversation": 1,
+    "stages.case_id": 1,
+    "stages.seniority_level": 1,
+    "stages.uploaded_cv_text": 1,
+    "stages.case_evaluation_report": 1,
+    "stages.skill_relevance": 1,
+}
+
+
+def _find_completed_sessions(sessions_collection, position_id: str, session_ids: Optional[List[str]] = None) -> list:
+    """Sessioni della posizione con colloquio svolto (conversazione e caso presenti)."""
+    query = {
+        "position_id": position_id,
+        "stages.conversation.0": {"$exists": True},
+        "stages.case_id": {"$exists": True},
+    }
+    if session_ids:
+        query["_id"] = {"$in": session_ids}
+    return list(sessions_collection.find(query, SESSION_PROJECTION))
+
+
+def _diff_skill_relevance(old: Optional[dict], new: Optional[dict]) -> list:
+    """Differenze di punteggio per skill tra il risultato salvato e quello ricalcolato."""
+    old_scores = {s.get("skill_id"): s for s in (old or {}).get("scores", [])}
+    new_scores = {s.get("skill_id"): s for s in (new or {}).get("scores", [])}
+    changes = []
+    for skill_id in list(old_scores) + [sid for sid in new_scores if sid not in old_scores]:
+        before = old_scores.get(skill_id, {})
+        after = new_scores.get(skill_id, {})
+        delta = {}
+        for field in ("cv_relevance_score", "interview_relevance_score"):
+            if before.get(field) != after.get(field):
+                delta[field] = {"old": before.get(field), "new": after.get(field)}
+        if delta:
+            changes.append({"skill_id": skill_id, "skill_name": after.get("skill_name") or before.get("skill_name"), **delta})
+    return changes
+
+
+def _reevaluate_session(session: dict, position_context, evaluation_context: dict, cv_cache_collection: str, include_skills: bool) -> dict:
+    session_id = session["_id"]
+    # Valutazione del caso e scoring delle skill in parallelo, come a fine colloquio
+    report, skill_obj = evaluate_and_score_concurrently(
+        lambda: compute_case_evaluation(session, evaluation_context),
+        (lambda: compute_skill_relevance_from_data(session, position_context.document, cv_cache_collection, position_context))
+        if include_skills else None,
+        label="BULK RE-EVALUATION",
+    )
+    if not report:
+        return {"session_id": session_id, "ok": False, "error": "case evaluation failed"}
+    skill_relevance = skill_obj.model_dump() if skill_obj else None
+
+    # Il report del caso è testo libero rigenerato dall'LLM, quindi diverso a ogni esecuzione:
+    # le differenze si misurano sui punteggi delle skill (None se non ricalcolati)
+    stages = session.get("stages", {})
+    skill_changes = _diff_skill_relevance(stages.get("skill_relevance"), skill_relevance) if skill_relevance else []
+    return {
+        "session_id": session_id,
+        "ok": True,
+        "case_evaluation_report": report,
+        "skill_relevance": skill_relevance,
+        "diff": {
+            "candidate_name": session.get("candidate_name"),
+            "scores_changed": bool(skill_changes) if skill_relevance else None,
+            "skill_changes": skill_changes,
+        },
+    }
+
+
+def _to_update(result: dict) -> UpdateOne:
+    update = {
+        "stages.case_evaluation_report": result["case_evaluation_report"],
+        "stages.reevaluated_at": datetime.utcnow().isoformat(),
+    }
+    if result.get("skill_relevance") is not None:
+        update["stages.skill_relevance"] = result["skill_relevance"]
+    return UpdateOne({"_id": result["session_id"]}, {"$set": update})
+
+
+def run_bulk_reevaluation(
+    position_id: str,
+    tenant_id: str = None,
+    session_ids: Optional[List[str]] = None,
+    dry_run: bool = False,
+    include_skills: bool = True,
+    max_workers: Optional[int] = None,
+    job_id: Optional[str] = None,
+) -> dict:
+    """
+    Ri-valuta tutte le sessioni completate di una posizione (o solo 'session_ids').
+
+    Il documento della posizione e il contesto di valutazione vengono caricati una sola
+    volta e condivisi tra le sessioni, elaborate su un pool di worker limitato. I risultati
+    vengono scritti con bulk_write; in 'dry_run' non si scrive nulla e si restituisce solo
+    il report delle differenze rispetto ai risultati salvati.
+    """
+    print(f"--- [BULK RE-EVALUATION] Avvio per la posizione: {position_id} (dry_run={dry_run}) ---")
+    report = {"position_id": position_id, "dry_run": dry_run, "total": 0, "succeeded": 0, "failed": 0, "written": 0, "sessions": []}
+
+    if db is None:
+        print("  - ERRORE: DB non disponibile.")
+        finish_job(job_id, "failed", report)
+        return report
+
+    if tenant_id:
+        collections = get_tenant_collections(tenant_id)
+        sessions_collection = db[collections["sessions"]]
+        positions_collection_name = collections["positions"]
+        cv_cache_collection = collections["cv_score_cache"]
+    else:
+        sessions_collection = db[SESSIONS_COLLECTION_NAME]
+        positions_collection_name = "positions_data"
+        cv_cache_collection = CV_SCORE_CACHE_COLLECTION
+
+    position_context, evaluation_context = load_evaluation_context(position_id, positions_collection_name)
+    if not position_context:
+        print(f"  - ERRORE: posizione '{position_id}' non trovata.")
+        finish_job(job_id, "failed", report)
+        return report
+    if not evaluation_context:
+        finish_job(job_id, "failed", report)
+        return report
+
+    sessions = _find_completed_sessions(sessions_collection, position_id, session_ids)
+    report["total"] = len(sessions)
+    set_job_items(job_id, [session["_id"] for session in sessions])
+    print(f"  - Sessioni da ri-valutare: {len(sessions)}")
+
+    # Risultati in attesa della bulk_write: una sessione è completata solo quando è stata scritta
+    pending = []
+
+    def record(result: dict, error: Optional[str] = None):
+        session_id = result["session_id"]
+        if error:
+            report["failed"] += 1
+            report["sessions"].append({"session_id": session_id, "ok": False, "error": error})
+            update_job_item(job_id, session_id, "failed", error)
+        else:
+            report["succeeded"] += 1
+            report["sessions"].append({"session_id": session_id, "ok": True, **result["diff"]})
+            update_job_item(job_id, session_id, "completed", result["diff"])
+
+    def flush():
+        if not pending:
+            return
+        failed_writes = {}
+        if not dry_run:
+            try:
+                write_result = sessions_collection.bulk_write([_to_update(result) for result in pending], ordered=False)
+                report["written"] += write_result.modified_count
+            except BulkWriteError as e:
+                # ordered=False: le altre scritture del batch sono andate a buon fine
+                report["written"] += e.details.get("nModified", 0)
+                failed_writes = {err["index"]: err.get("errmsg", "write failed") for err in e.details.get("writeErrors", [])}
+                print(f"  - ERRORE durante la bulk_write: {len(failed_writes)} sessioni non salvate")
+            except Exception as e:
+                print(f"  - ERRORE durante la bulk_write: {e}")
+                failed_writes = {index: f"write failed: {e}" for index in range(len(pending))}
+        for index, result in enumerate(pending):
+            record(result, failed_writes.get(index))
+        pending.clear()
+
+    with batch_llm_budget(), ThreadPoolExecutor(max_workers=max_workers or BULK_REEVAL_MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(bind_llm_budget(_reevaluate_session), session, position_context, evaluation_context, cv_cache_collection, include_skills): session["_id"]
+            for session in sessions
+        }
+        for future in as_completed(futures):
+            session_id = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"session_id": session_id, "ok": False, "error": str(e)}
+
+            if not result["ok"]:
+                record(result, result.get("error") or "re-evaluation failed")
+                continue
+
+            pending.append(result)
+            if len(pending) >= BULK_REEVAL_WRITE_BATCH:
+                flush()
+    flush()
+
+    changed = sum(1 for s in report["sessions"] if s.get("scores_changed"))
+    print(f"--- [BULK RE-EVALUATION] Completate {report['succeeded']}/{report['total']}, fallite {report['failed']}, con differenze {changed}, scritte {report['written']} ---")
+    status = "completed" if report["succeeded"] or not report["total"] else "failed"
+    finish_job(job_id, status, {k: v for k, v in report.items() if k != "sessions"})
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ri-valuta in blocco le sessioni completate di una posizione.")
+    parser.add_argument("position_id")
+    parser.add_argument("--tenant-id", default=None)
+    parser.add_argument("--sessions", nargs="*", default=None, help="Limita la ri-valutazione a questi ID di sessione")
+    parser.add_argument("--dry-run", action="store_true", help="Calcola e mostra le differenze senza scrivere")
+    parser.add_argument("--no-skills", action="store_true", help="Ri-valuta solo il caso, senza lo scoring delle skill")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    bulk_report = run_bulk_reevaluation(
+        args.position_id,
+        tenant_id=args.tenant_id,
+        session_ids=args.sessions,
+        dry_run=args.dry_run,
+        include_skills=not args.no_skills,
+        max_workers=args.workers,
+    )
+    for entry in bulk_report["sessions"]:
+        if not entry["ok"]:
+            print(f"  ✗ {entry['session_id']}: {entry.get('error')}")
+            continue
+        scores = {True: "modificati", False: "invariati", None: "non ricalcolati"}[entry["scores_changed"]]
+        print(f"  ✓ {entry['session_id']} ({entry.get('candidate_name')}): punteggi {scores}")
+        for change in entry["skill_changes"]:
+            deltas = ", ".join(f"{k} {v['old']} -> {v['new']}" for k, v in change.items() if isinstance(v, dict))
+            print(f"      * {change['skill_name']}: {deltas}")
@@ -1,9 +1,100 @@
-import json
 from .final_evaluator.evaluator import evaluate_candidate_performance
+from .final_evaluator.prompt_budget import build_case_scoped_inputs
+from .skill_index import SkillIndex
 # Importiamo 'db' per interrogare la collection delle posizioni
 from services.data_manager import db, get_session_data, save_stage_output
 from services.tenant_data_manager import get_session_data_tenant, save_stage_output_tenant
 from services.tenant_service import get_tenant_collections
+from services.position_cache import get_position_context, PositionContext
+
+def build_case_map_text(caso_svolto_data: dict) -> str:
+    map_lines = ["[MAPPA DI VALUTAZIONE DEL CASO SVOLTO]"]
+    for step in caso_svolto_data.get("reasoning_steps", []):
+        skills = ", ".join([s.get("skill_name", "N/A") for s in step.get("skills_to_test", [])])
+        map_lines.append(f"- Step {step.get('id', 'N/A')} ({step.get('title', 'N/A')}): Progettato per testare '{skills}'.")
+    return "\n".join(map_lines)
+
+def prepare_evaluation_context(position_data: dict, position_context: PositionContext | None = None) -> dict | None:
+    """
+    Estrae dal documento della posizione i dati statici usati dalla valutazione
+    (ICP, casi e criteri), così da poterli condividere tra più sessioni.
+    Con un 'position_context' riusa mappe dei casi, indice skill e input per caso già in cache.
+    """
+    icp_text = position_data.get("icp")
+    all_cases_data = position_data.get("all_cases")
+    evaluation_criteria_data = position_data.get("evaluation_criteria")
+
+    if not all([icp_text, all_cases_data, evaluation_criteria_data]):
+        print("  - ERRORE: Dati di contesto (ICP, casi, criteri) mancanti nel documento della posizione su MongoDB.")
+        return None
+
+    return {
+        "icp_text": icp_text,
+        "all_cases_data": all_cases_data,
+        "evaluation_criteria_data": evaluation_criteria_data,
+        "position_context": position_context,
+    }
+
+def load_evaluation_context(position_id: str, positions_collection_name: str) -> tuple:
+    """
+    Restituisce (position_context, evaluation_context) dalla cache delle posizioni;
+    il contesto di valutazione viene calcolato una sola volta per versione della posizione.
+    """
+    position_context = get_position_context(position_id, positions_collection_name)
+    if not position_context:
+        return None, None
+    evaluation_context = position_context.derived(
+        "evaluation_context", lambda: prepare_evaluation_context(position_context.document, position_context)
+    )
+    return position_context, evaluation_context
+
+def compute_case_evaluation(session_data: dict, evaluation_context: dict) -> str | None:
+    """
+    Valuta una sessione dato il contesto della posizione, senza leggere né scrivere sul DB.
+    Restituisce il report oppure None se la valutazione non è possibile o fallisce.
+    """
+    stages = session_data.get("stages", {})
+    conversation_json = stages.get("conversation")
+    case_id_svolto = stages.get("case_id")
+    seniority_level = stages.get("seniority_level")
+
+    if not all([conversation_json, case_id_svolto, seniority_level]):
+        print("  - ERRORE: Dati fondamentali mancanti nella sessione.")
+        print(f"    - Dati trovati: conversation={bool(conversation_json)}, case_id={bool(case_id_svolto)}, seniority_level={bool(seniority_level)}")
+        return None
+
+    # Costruisci la Mappa del Caso
+    print("  - Costruzione della mappa di valutazione del caso...")
+    caso_svolto_data = next((case for case in evaluation_context["all_cases_data"].get("cases", []) if case.get("question_id") == case_id_svolto), None)
+    if not caso_svolto_data:
+        print(f"  - ERRORE: Dettagli non trovati per il caso svolto con ID '{case_id_svolto}'.")
+        return None
+    position_context = evaluation_context.get("position_context")
+    case_map_text = position_context.case_map_text(case_id_svolto) if position_context else build_case_map_text(caso_svolto_data)
+
+    # Nel prompt entrano solo il caso svolto e i criteri delle skill che testa
+    if position_context:
+        skill_index = position_context.derived("skill_index", lambda: SkillIndex.for_position(position_context.document))
+        case_text, criteria_text = position_context.derived(
+            f"eval_inputs:{case_id_svolto}",
+            lambda: build_case_scoped_inputs(caso_svolto_data, evaluation_context["evaluation_criteria_data"], skill_index),
+        )
+    else:
+        case_text, criteria_text = build_case_scoped_inputs(caso_svolto_data, evaluation_context["evaluation_criteria_data"])
+
+    # Esegui la valutazione
+    print("  - Avvio della valutazione con l'LLM...")
+    final_report = evaluate_candidate_performance(
+        icp_text=evaluation_context["icp_text"],
+        conversation_json_data=conversation_json,
+        all_cases_text=case_text,
+        evaluation_criteria_text=criteria_text,
+        seniority_level=seniority_level,
+        case_map_text=case_map_text
+    )
+    if final_report and "Errore" not in final_report:
+        return final_report
+    return None
 
 def execute_case_evaluation(session_id: str, tenant_id: str = None) -> bool:
     """
@@ -48,57 +139,25 @@ def execute_case_evaluation(session_id: str, tenant_id: str = None) -> bool:
         if db is None:
             raise ConnectionError("Connessione a MongoDB non disponibile.")
         
-        if tenant_id and collections:
-            positions_collection = db[collections["positions"]]
-        else:
-            positions_collection = db["positions_data"]
-        position_data = positions_collection.find_one({"_id": position_id})
+        positions_collection_name = collections["positions"] if tenant_id and collections else "positions_data"
+        position_context, evaluation_context = load_evaluation_context(position_id, positions_collection_name)
         
-        if not position_data:
+        if not position_context:
             print(f"  - ERRORE CRITICO: Nessun documento trovato su MongoDB per la position_id '{position_id}'.")
             return False
 
-        icp_text = position_data.get("icp")
-        all_cases_data = position_data.get("all_cases")
-        evaluation_criteria_data = position_data.get("evaluation_criteria")
-
-        if not all([icp_text, all_cases_data, evaluation_criteria_data]):
-            print("  - ERRORE: Dati di contesto (ICP, casi, criteri) mancanti nel documento della posizione su MongoDB.")
+        if not evaluation_context:
             return False
             
-        all_cases_text = json.dumps(all_cases_data)
-        evaluation_criteria_text = json.dumps(evaluation_criteria_data)
-            
     except Exception as e:
         print(f"  - ERRORE: Impossibile caricare i dati di contesto per la posizione '{position_id}' da MongoDB. Dettagli: {e}")
         return False
 
-    # 3. Costruisci la Mappa del Caso (logica invariata)
-    print("  - Costruzione della mappa di valutazione del caso...")
-    caso_svolto_data = next((case for case in all_cases_data.get("cases", []) if case.get("question_id") == case_id_svolto), None)
-    if not caso_svolto_data:
-        print(f"  - ERRORE: Dettagli non trovati per il caso svolto con ID '{case_id_svolto}'.")
-        return False
-    
-    map_lines = ["[MAPPA DI VALUTAZIONE DEL CASO SVOLTO]"]
-    for step in caso_svolto_data.get("reasoning_steps", []):
-        skills = ", ".join([s.get("skill_name", "N/A") for s in step.get("skills_to_test", [])])
-        map_lines.append(f"- Step {step.get('id', 'N/A')} ({step.get('title', 'N/A')}): Progettato per testare '{skills}'.")
-    case_map_text = "\n".join(map_lines)
-
-    # 4. Esegui la valutazione (logica invariata)
-    print("  - Avvio della valutazione con l'LLM...")
-    final_report = evaluate_candidate_performance(
-        icp_text=icp_text,
-        conversation_json_data=conversation_json,
-        all_cases_text=all_cases_text,
-        evaluation_criteria_text=evaluation_criteria_text,
-        seniority_level=seniority_level,
-        case_map_text=case_map_text
-    )
+    # 3-4. Costruisci la mappa del caso ed esegui la valutazione
+    final_report = compute_case_evaluation(session_data, evaluation_context)
     
     # 5. Salva l'output nel DB (logica invariata)
-    if final_report and "Errore" not in final_report:
+    if final_report:
         if tenant_id and collections:
             save_stage_output_tenant(session_id, "case_evaluation_report", final_report, collections["sessions"])
         else:
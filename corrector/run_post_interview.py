@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from interviewer.llm_service import bind_llm_budget
+
+from .run_final_evaluation import execute_case_evaluation
+from .skill_relevance_scorer import compute_skill_relevance, save_skill_relevance
+
+
+def evaluate_and_score_concurrently(evaluate, score, label: str = "POST-INTERVIEW"):
+    """
+    Esegue insieme la valutazione del caso ('evaluate') e lo scoring delle skill ('score'),
+    due callable senza argomenti. Restituisce (esito valutazione, scoring); un'eccezione in
+    uno dei due viene registrata e trattata come fallimento (False / None).
+    """
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        eval_future = executor.submit(bind_llm_budget(evaluate))
+        skill_future = executor.submit(bind_llm_budget(score)) if score else None
+
+        try:
+            eval_result = eval_future.result()
+        except Exception as e:
+            print(f"  - [{label}] Errore durante la valutazione del caso: {e}")
+            eval_result = False
+
+        skill_result = None
+        if skill_future is not None:
+            try:
+                skill_result = skill_future.result()
+            except Exception as e:
+                print(f"  - [{label}] Errore durante lo scoring delle skill: {e}")
+    return eval_result, skill_result
+
+
+def run_post_interview_evaluation(session_id: str, tenant_id: str = None) -> bool:
+    """
+    Esegue in parallelo la valutazione del caso e lo scoring delle skill a fine colloquio.
+
+    Entrambi leggono soltanto sessione e posizione, quindi possono procedere insieme; lo
+    scoring delle skill viene però salvato solo se la valutazione del caso è riuscita,
+    come nel flusso sequenziale. Restituisce l'esito della valutazione del caso.
+    """
+    print(f"--- [POST-INTERVIEW] Avvio valutazione e scoring skill per sessione: {session_id} ---")
+    eval_success, skill_relevance = evaluate_and_score_concurrently(
+        lambda: execute_case_evaluation(session_id, tenant_id),
+        lambda: compute_skill_relevance(session_id, tenant_id),
+    )
+
+    if not eval_success:
+        print(f"  - [POST-INTERVIEW] Valutazione del caso fallita per sessione {session_id}; scoring skill non salvato.")
+        return False
+
+    if skill_relevance is not None:
+        save_skill_relevance(session_id, skill_relevance, tenant_id)
+    else:
+        print(f"  - [POST-INTERVIEW] Scoring skill non disponibile per sessione {session_id}.")
+    return True
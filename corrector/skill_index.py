@@ -0,0 +1,164 @@
+import re
+from difflib import SequenceMatcher
+from typing import List, Optional
+
+from .cv_score_cache import evaluation_criteria_fingerprint
+
+FUZZY_MATCH_THRESHOLD = 0.9
+
+
+def _slugify(text: str) -> str:
+    text = text.lower().strip()
+    text = re.sub(r"[^a-z0-9\s\-_/]", "", text)
+    text = re.sub(r"[\s/_]+", "-", text)
+    text = re.sub(r"-{2,}", "-", text)
+    return text.strip("-")
+
+def _normalize_skill_name(skill_name: str) -> str:
+    """
+    Normalizza il nome di una skill per il matching:
+    - Rimuove spazi extra
+    - Converte in lowercase
+    - Rimuove punteggiatura comune
+    - Standardizza caratteri speciali
+    """
+    if not skill_name:
+        return ""
+
+    # Normalizza spazi e converte in lowercase
+    normalized = re.sub(r'\s+', ' ', skill_name.strip().lower())
+
+    # Rimuove punteggiatura comune che può variare
+    normalized = re.sub(r'[,;:\.]+', '', normalized)
+
+    # Standardizza parentesi e caratteri speciali
+    normalized = re.sub(r'[()\[\]{}]', '', normalized)
+
+    return normalized.strip()
+
+def _find_best_skill_match(skill_name: str, requirements: List[str], threshold: float = FUZZY_MATCH_THRESHOLD) -> Optional[str]:
+    """
+    Trova il miglior match per una skill tra i requirements usando similarity ratio.
+    Restituisce il requirement che ha la similarity più alta >= threshold, o None se nessuno supera la soglia.
+    """
+    if not skill_name or not requirements:
+        return None
+
+    normalized_skill = _normalize_skill_name(skill_name)
+    best_match = None
+    best_ratio = 0.0
+
+    for req in requirements:
+        if not req:
+            continue
+
+        normalized_req = _normalize_skill_name(req)
+
+        # Calcola similarity ratio
+        ratio = SequenceMatcher(None, normalized_skill, normalized_req).ratio()
+
+        if ratio > best_ratio and ratio >= threshold:
+            best_ratio = ratio
+            best_match = req
+
+    return best_match
+
+
+def build_skill_index(evaluation_criteria: dict, all_cases: Optional[dict] = None) -> dict:
+    """
+    Costruisce l'indice skill -> requirement di una posizione, da salvare sul documento
+    ('skill_index') quando viene generata la rubrica 'evaluation_criteria'.
+
+    Contiene per ogni requirement nome normalizzato, slug e criteri, e la mappatura già
+    risolta (exact o fuzzy) di tutte le skill citate nei casi. Le voci sono liste di oggetti,
+    non dizionari, perché i nomi delle skill possono contenere caratteri non ammessi nelle
+    chiavi MongoDB (es. 'Node.js').
+    """
+    schema = (evaluation_criteria or {}).get("evaluation_schema", [])
+    requirements = []
+    for item in schema:
+        req = (item.get("requirement") or "").strip()
+        if not req:
+            continue
+        crit = item.get("criteria", {})
+        requirements.append({
+            "requirement": req,
+            "normalized": _normalize_skill_name(req),
+            "slug": _slugify(req),
+            "criteria_texts": [crit.get("evaluation_criteria_1") or "", crit.get("evaluation_criteria_2") or ""],
+        })
+
+    available_requirements = [r["requirement"] for r in requirements]
+    exact = set(available_requirements)
+    case_skill_map = []
+    seen = set()
+    for case in (all_cases or {}).get("cases", []):
+        for step in case.get("reasoning_steps", []):
+            for skill_test in step.get("skills_to_test", []):
+                skill_name = (skill_test.get("skill_name") or "").strip()
+                if not skill_name or skill_name in seen:
+                    continue
+                seen.add(skill_name)
+                if skill_name in exact:
+                    case_skill_map.append({"skill_name": skill_name, "requirement": skill_name, "match": "exact"})
+                    continue
+                best = _find_best_skill_match(skill_name, available_requirements)
+                case_skill_map.append({"skill_name": skill_name, "requirement": best, "match": "fuzzy" if best else "none"})
+
+    return {
+        "criteria_fingerprint": evaluation_criteria_fingerprint(evaluation_criteria),
+        "requirements": requirements,
+        "case_skill_map": case_skill_map,
+    }
+
+
+class SkillIndex:
+    """Vista in memoria di 'skill_index' con lookup O(1) e fallback fuzzy per i nomi nuovi."""
+
+    def __init__(self, index_doc: dict):
+        self.fingerprint = index_doc.get("criteria_fingerprint")
+        self._requirements = [r["requirement"] for r in index_doc.get("requirements", [])]
+        self._criteria = {}
+        self._by_normalized = {}
+        self._by_slug = {}
+        for r in index_doc.get("requirements", []):
+            # In caso di duplicati vince il primo, come nella scansione lineare
+            self._criteria.setdefault(r["requirement"], r.get("criteria_texts", ["", ""]))
+            self._by_normalized.setdefault(r.get("normalized") or _normalize_skill_name(r["requirement"]), r["requirement"])
+            self._by_slug.setdefault(r.get("slug") or _slugify(r["requirement"]), r["requirement"])
+        self._case_skill_map = {e["skill_name"]: (e.get("requirement"), e.get("match")) for e in index_doc.get("case_skill_map", [])}
+
+    @classmethod
+    def for_position(cls, position_data: dict) -> "SkillIndex":
+        """Usa l'indice salvato se allineato alla rubrica corrente, altrimenti lo ricostruisce."""
+        eval_criteria = position_data.get("evaluation_criteria", {})
+        stored = position_data.get("skill_index")
+        if stored and stored.get("criteria_fingerprint") == evaluation_criteria_fingerprint(eval_criteria):
+            return cls(stored)
+        return cls(build_skill_index(eval_criteria, position_data.get("all_cases")))
+
+    @property
+    def requirement_count(self) -> int:
+        return len(self._requirements)
+
+    def criteria_for(self, requirement: str) -> List[str]:
+        return self._criteria.get(requirement, ["", ""])
+
+    def requirement_for_slug(self, skill_id: str) -> Optional[str]:
+        return self._by_slug.get(skill_id)
+
+    def match(self, skill_name: str) -> tuple:
+        """
+        Restituisce (requirement, tipo_match) con tipo_match in 'exact', 'fuzzy', 'none'.
+        """
+        if skill_name in self._criteria:
+            return skill_name, "exact"
+        if skill_name in self._case_skill_map:
+            return self._case_skill_map[skill_name]
+        normalized = _normalize_skill_name(skill_name)
+        if normalized in self._by_normalized:
+            return self._by_normalized[normalized], "fuzzy"
+        best = _find_best_skill_match(skill_name, self._requirements)
+        result = (best, "fuzzy") if best else (None, "none")
+        self._case_skill_map[skill_name] = result
+        return result
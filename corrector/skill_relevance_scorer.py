@@ -1,15 +1,23 @@
 # corrector/skill_relevance_scorer.py
 
 import json
-import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
 from pydantic import BaseModel, Field
-from difflib import SequenceMatcher
-from interviewer.llm_service import get_structured_llm_response
+from interviewer.llm_service import get_structured_llm_response, bind_llm_budget
 from services.data_manager import db, get_session_data, save_stage_output
 from services.tenant_data_manager import get_session_data_tenant, save_stage_output_tenant
 from services.tenant_service import get_tenant_collections
+from services.position_cache import get_position_context, PositionContext
 from .prompts_skill_scorer import create_cv_scoring_prompt, create_interview_scoring_prompt
+from .skill_index import SkillIndex, _slugify
+from .cv_score_cache import (
+    CV_SCORE_CACHE_COLLECTION,
+    evaluation_criteria_fingerprint,
+    build_cv_score_cache_key,
+    get_cached_cv_scores,
+    save_cached_cv_scores,
+)
 from interviewer.llm_service import AZURE_DEPLOYMENT_NAME
 
 SKILL_SCORER_MODEL = AZURE_DEPLOYMENT_NAME
@@ -50,62 +58,6 @@ class SkillScoreCollection(BaseModel):
 
 # ----- Utils -----
 
-def _slugify(text: str) -> str:
-    text = text.lower().strip()
-    text = re.sub(r"[^a-z0-9\s\-_/]", "", text)
-    text = re.sub(r"[\s/_]+", "-", text)
-    text = re.sub(r"-{2,}", "-", text)
-    return text.strip("-")
-
-def _normalize_skill_name(skill_name: str) -> str:
-    """
-    Normalizza il nome di una skill per il matching:
-    - Rimuove spazi extra
-    - Converte in lowercase
-    - Rimuove punteggiatura comune
-    - Standardizza caratteri speciali
-    """
-    if not skill_name:
-        return ""
-    
-    # Normalizza spazi e converte in lowercase
-    normalized = re.sub(r'\s+', ' ', skill_name.strip().lower())
-    
-    # Rimuove punteggiatura comune che può variare
-    normalized = re.sub(r'[,;:\.]+', '', normalized)
-    
-    # Standardizza parentesi e caratteri speciali
-    normalized = re.sub(r'[()\[\]{}]', '', normalized)
-    
-    return normalized.strip()
-
-def _find_best_skill_match(skill_name: str, requirements: List[str], threshold: float = 0.9) -> Optional[str]:
-    """
-    Trova il miglior match per una skill tra i requirements usando similarity ratio.
-    Restituisce il requirement che ha la similarity più alta >= threshold, o None se nessuno supera la soglia.
-    """
-    if not skill_name or not requirements:
-        return None
-    
-    normalized_skill = _normalize_skill_name(skill_name)
-    best_match = None
-    best_ratio = 0.0
-    
-    for req in requirements:
-        if not req:
-            continue
-            
-        normalized_req = _normalize_skill_name(req)
-        
-        # Calcola similarity ratio
-        ratio = SequenceMatcher(None, normalized_skill, normalized_req).ratio()
-        
-        if ratio > best_ratio and ratio >= threshold:
-            best_ratio = ratio
-            best_match = req
-    
-    return best_match
-
 def _format_conversation(conversation_history: List[dict]) -> str:
     lines = []
     for m in conversation_history:
@@ -120,11 +72,11 @@ def _build_case_map_text(caso_svolto_data: dict) -> str:
         map_lines.append(f"- Step {step.get('id','N/A')} ({step.get('title','N/A')}): Progettato per testare '{skills}'.")
     return "\n".join(map_lines)
 
-def _extract_skills_from_case(caso_svolto_data: dict, position_data: dict) -> List[dict]:
+def _extract_skills_from_case(caso_svolto_data: dict, position_data: dict, skill_index: Optional[SkillIndex] = None) -> List[dict]:
     """
     Estrae le skill effettivamente testate nel caso selezionato dai reasoning steps.
     Ogni item contiene: skill_id, skill_name, criteria_texts (lista con 2 stringhe).
-    Usa matching fuzzy per gestire piccole differenze nei nomi delle skill.
+    Usa l'indice skill della posizione; il matching fuzzy serve solo per i nomi non ancora indicizzati.
     """
     # Estrai tutte le skill uniche testate nel caso
     tested_skills = set()
@@ -138,66 +90,35 @@ def _extract_skills_from_case(caso_svolto_data: dict, position_data: dict) -> Li
     for skill in tested_skills:
         print(f"    * {skill}")
     
-    # Trova i criteri di valutazione per le skill testate
-    eval_criteria = position_data.get("evaluation_criteria", {})
-    schema = eval_criteria.get("evaluation_schema", [])
-    
-    # Estrai tutti i requirements disponibili per il matching
-    available_requirements = [item.get("requirement", "").strip() for item in schema if item.get("requirement")]
-    print(f"  - [SKILL EXTRACTOR] Trovati {len(available_requirements)} requirements nell'ICP")
+    # Indice skill -> requirement precalcolato sulla posizione (ricostruito se non allineato alla rubrica)
+    if skill_index is None:
+        skill_index = SkillIndex.for_position(position_data)
+    print(f"  - [SKILL EXTRACTOR] Trovati {skill_index.requirement_count} requirements nell'ICP")
     
     canonical = []
     matched_skills = set()
     unmatched_skills = []
     
     for skill_name in tested_skills:
-        # Prima prova matching esatto
-        exact_match = None
-        for item in schema:
-            req = item.get("requirement", "").strip()
-            if req == skill_name:
-                exact_match = item
-                break
-        
-        if exact_match:
-            # Match esatto trovato
-            crit = exact_match.get("criteria", {})
-            c1 = crit.get("evaluation_criteria_1") or ""
-            c2 = crit.get("evaluation_criteria_2") or ""
+        requirement, match_type = skill_index.match(skill_name)
+        if requirement:
             canonical.append({
                 "skill_id": _slugify(skill_name),
                 "skill_name": skill_name,
-                "criteria_texts": [c1, c2]
+                "criteria_texts": list(skill_index.criteria_for(requirement))
             })
             matched_skills.add(skill_name)
-            print(f"    ✓ Match esatto: '{skill_name}' -> '{exact_match.get('requirement')}'")
+            label = "Match esatto" if match_type == "exact" else "Match fuzzy"
+            print(f"    ✓ {label}: '{skill_name}' -> '{requirement}'")
         else:
-            # Prova matching fuzzy
-            best_match_req = _find_best_skill_match(skill_name, available_requirements, threshold=0.9)
-            if best_match_req:
-                # Trova l'item corrispondente
-                for item in schema:
-                    if item.get("requirement", "").strip() == best_match_req:
-                        crit = item.get("criteria", {})
-                        c1 = crit.get("evaluation_criteria_1") or ""
-                        c2 = crit.get("evaluation_criteria_2") or ""
-                        canonical.append({
-                            "skill_id": _slugify(skill_name),
-                            "skill_name": skill_name,
-                            "criteria_texts": [c1, c2]
-                        })
-                        matched_skills.add(skill_name)
-                        print(f"    ✓ Match fuzzy: '{skill_name}' -> '{best_match_req}'")
-                        break
-            else:
-                # Nessun match trovato - includi comunque con criteri vuoti
-                canonical.append({
-                    "skill_id": _slugify(skill_name),
-                    "skill_name": skill_name,
-                    "criteria_texts": ["", ""]
-                })
-                unmatched_skills.append(skill_name)
-                print(f"    ⚠ Nessun match: '{skill_name}' (inclusa con criteri vuoti)")
+            # Nessun match trovato - includi comunque con criteri vuoti
+            canonical.append({
+                "skill_id": _slugify(skill_name),
+                "skill_name": skill_name,
+                "criteria_texts": ["", ""]
+            })
+            unmatched_skills.append(skill_name)
+            print(f"    ⚠ Nessun match: '{skill_name}' (inclusa con criteri vuoti)")
     
     print(f"  - [SKILL EXTRACTOR] Risultato: {len(matched_skills)} skill matchate, {len(unmatched_skills)} senza match")
     if unmatched_skills:
@@ -308,16 +229,17 @@ def _score_interview_relevance(conversation_json: List[dict], canonical_skills:
 
 # ----- Orchestratore -----
 
-def compute_and_save_skill_relevance(session_id: str, tenant_id: str = None) -> bool:
+def compute_skill_relevance(session_id: str, tenant_id: str = None) -> Optional[SkillScoreCollection]:
     """
-    Orchestrazione:
+    Calcola (senza salvare) la rilevanza delle skill:
     - legge sessione e dati posizione
     - costruisce skill canoniche (stabili per posizione) dalla rubrica evaluation_criteria
-    - calcola punteggi CV e colloquio
-    - salva in stages.skill_relevance
+    - calcola in parallelo i punteggi CV e colloquio (le due chiamate LLM sono indipendenti)
+    Restituisce None in caso di errore.
     """
     print(f"--- [SKILL SCORER] Avvio calcolo rilevanza skill per sessione: {session_id} ---")
     print(f"  - [SKILL SCORER] Tenant ID: {tenant_id}")
+    collections = None
     if tenant_id:
         collections = get_tenant_collections(tenant_id)
         session = get_session_data_tenant(session_id, collections["sessions"])
@@ -325,9 +247,36 @@ def compute_and_save_skill_relevance(session_id: str, tenant_id: str = None) ->
         session = get_session_data(session_id)
     if not session:
         print("  - ERRORE: sessione non trovata.")
-        return False
+        return None
 
     position_id = session.get("position_id")
+
+    if db is None:
+        print("  - ERRORE: DB non disponibile.")
+        return None
+
+    # Carica posizione completa (dalla cache delle posizioni)
+    positions_collection_name = collections["positions"] if tenant_id and collections else "positions_data"
+    position_context = get_position_context(position_id, positions_collection_name)
+    if not position_context:
+        print(f"  - ERRORE: posizione '{position_id}' non trovata.")
+        return None
+
+    cv_cache_collection = collections["cv_score_cache"] if tenant_id and collections else CV_SCORE_CACHE_COLLECTION
+    return compute_skill_relevance_from_data(session, position_context.document, cv_cache_collection, position_context)
+
+def compute_skill_relevance_from_data(
+    session: dict,
+    position_data: dict,
+    cv_cache_collection: str = CV_SCORE_CACHE_COLLECTION,
+    position_context: Optional[PositionContext] = None,
+) -> Optional[SkillScoreCollection]:
+    """
+    Come compute_skill_relevance, ma su documenti di sessione e posizione già caricati
+    (usato anche dalla ri-valutazione massiva, che carica la posizione una sola volta).
+    Con un 'position_context' riusa mappa del caso, indice skill e impronta della rubrica in cache.
+    """
+    position_id = session.get("position_id")
     stages = session.get("stages", {})
     cv_text = stages.get("uploaded_cv_text", "")
     conversation_json = stages.get("conversation", [])
@@ -336,20 +285,6 @@ def compute_and_save_skill_relevance(session_id: str, tenant_id: str = None) ->
     print(f"  - [SKILL SCORER] CV text length: {len(cv_text)}")
     print(f"  - [SKILL SCORER] Conversation length: {len(conversation_json)}")
 
-    if db is None:
-        print("  - ERRORE: DB non disponibile.")
-        return False
-
-    # Carica posizione completa
-    if tenant_id and collections:
-        positions_collection = db[collections["positions"]]
-    else:
-        positions_collection = db["positions_data"]
-    position_data = positions_collection.find_one({"_id": position_id})
-    if not position_data:
-        print(f"  - ERRORE: posizione '{position_id}' non trovata.")
-        return False
-    
     print(f"  - [SKILL SCORER] Position data trovata: {position_data.get('_id', 'N/A')}")
     eval_criteria = position_data.get("evaluation_criteria", {})
     print(f"  - [SKILL SCORER] Evaluation criteria presente: {bool(eval_criteria)}")
@@ -370,7 +305,7 @@ def compute_and_save_skill_relevance(session_id: str, tenant_id: str = None) ->
             print(f"  - [SKILL SCORER] Numero di casi disponibili: {len(cases)}")
         caso_svolto_data = next((case for case in all_cases_data.get("cases", []) if case.get("question_id") == selected_case_id), None)
         if caso_svolto_data:
-            case_map_text = _build_case_map_text(caso_svolto_data)
+            case_map_text = position_context.case_map_text(selected_case_id) if position_context else _build_case_map_text(caso_svolto_data)
             print(f"  - [SKILL SCORER] Caso selezionato trovato: {caso_svolto_data.get('question_id', 'N/A')}")
         else:
             print(f"  - [SKILL SCORER] Caso selezionato NON trovato")
@@ -380,7 +315,8 @@ def compute_and_save_skill_relevance(session_id: str, tenant_id: str = None) ->
 
     # Skill canoniche: usa le skill effettivamente testate nel caso selezionato
     if caso_svolto_data:
-        canonical_skills = _extract_skills_from_case(caso_svolto_data, position_data)
+        skill_index = position_context.derived("skill_index", lambda: SkillIndex.for_position(position_data)) if position_context else None
+        canonical_skills = _extract_skills_from_case(caso_svolto_data, position_data, skill_index)
         print(f"  - [SKILL SCORER] Estratte {len(canonical_skills)} skill testate nel caso selezionato.")
         if not canonical_skills:
             print("  - WARNING: Nessuna skill testata trovata nel caso. Usando tutte le skill dell'ICP come fallback.")
@@ -391,12 +327,27 @@ def compute_and_save_skill_relevance(session_id: str, tenant_id: str = None) ->
     
     if not canonical_skills:
         print("  - ERRORE: 'evaluation_criteria.evaluation_schema' non trovato o vuoto. Impossibile stabilire le skill canoniche.")
-        return False
+        return None
 
-    # Scoring CV
-    cv_scores_map = _score_cv_relevance(cv_text, canonical_skills) if cv_text else {}
-    # Scoring colloquio
-    interview_scores_map = _score_interview_relevance(conversation_json, canonical_skills, case_map_text) if conversation_json else {}
+    # Il punteggio CV dipende solo da CV, posizione e skill: riusa la cache se disponibile
+    if position_context:
+        criteria_fp = position_context.derived("criteria_fingerprint", lambda: evaluation_criteria_fingerprint(eval_criteria))
+    else:
+        criteria_fp = evaluation_criteria_fingerprint(eval_criteria)
+    cv_cache_key = build_cv_score_cache_key(cv_text, position_id, canonical_skills, criteria_fp) if cv_text else None
+    cached_cv_scores = get_cached_cv_scores(cv_cache_key, cv_cache_collection) if cv_cache_key else None
+    if cached_cv_scores is not None:
+        print("  - [SKILL SCORER] Punteggi CV recuperati dalla cache.")
+
+    # Scoring CV e colloquio in parallelo
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        cv_future = executor.submit(bind_llm_budget(_score_cv_relevance), cv_text, canonical_skills) if cv_text and cached_cv_scores is None else None
+        interview_future = executor.submit(bind_llm_budget(_score_interview_relevance), conversation_json, canonical_skills, case_map_text) if conversation_json else None
+        cv_scores_map = cv_future.result() if cv_future else (cached_cv_scores or {})
+        interview_scores_map = interview_future.result() if interview_future else {}
+
+    if cv_future and cv_scores_map:
+        save_cached_cv_scores(cv_cache_key, position_id, criteria_fp, cv_scores_map, cv_cache_collection)
 
     # Merge risultati in ordine canonico
     final_scores: List[SkillScore] = []
@@ -420,8 +371,14 @@ def compute_and_save_skill_relevance(session_id: str, tenant_id: str = None) ->
     print(f"  - [SKILL SCORER] Final scores creati: {len(final_scores)} skill")
     for score in final_scores:
         print(f"    * {score.skill_name}: CV={score.cv_relevance_score}/4, Interview={score.interview_relevance_score}/4")
-    
-    if tenant_id and collections:
+    return collection_obj
+
+def save_skill_relevance(session_id: str, collection_obj: SkillScoreCollection, tenant_id: str = None) -> bool:
+    """
+    Salva il risultato di compute_skill_relevance in stages.skill_relevance.
+    """
+    if tenant_id:
+        collections = get_tenant_collections(tenant_id)
         save_stage_output_tenant(session_id, "skill_relevance", collection_obj.model_dump(), collections["sessions"])
         print(f"  - [SKILL SCORER] Salvato in tenant collection: {collections['sessions']}")
     else:
@@ -432,4 +389,13 @@ def compute_and_save_skill_relevance(session_id: str, tenant_id: str = None) ->
     # GENERAZIONE FEEDBACK TEMPORANEAMENTE DISABILITATA PER TEST
     print(f"  - [SKILL SCORER] Pipeline di feedback DISABILITATA per test")
     
-    return True
\ No newline at end of file
+    return True
+
+def compute_and_save_skill_relevance(session_id: str, tenant_id: str = None) -> bool:
+    """
+    Orchestrazione: calcola la rilevanza delle skill e la salva in stages.skill_relevance.
+    """
+    collection_obj = compute_skill_relevance(session_id, tenant_id)
+    if collection_obj is None:
+        return False
+    return save_skill_relevance(session_id, collection_obj, tenant_id)
\ No newline at end of file
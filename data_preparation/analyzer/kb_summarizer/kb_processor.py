@@ -1,12 +1,25 @@
 # analyzer/kb_summarizer/kb_processor.py
 from interviewer.llm_service import AZURE_DEPLOYMENT_NAME
 import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 # Assicuriamoci che l'import del servizio LLM sia corretto per la nuova struttura
-from interviewer.llm_service import get_llm_response
+from interviewer.llm_service import get_llm_response, estimate_tokens, bind_llm_budget
+from services.data_manager import db
 from . import prompts_kb
 
 KB_MODEL = AZURE_DEPLOYMENT_NAME
 
+# Modalità di sintesi: "single" (un unico prompt), "map_reduce" (chunk + fusione) o "auto"
+# (map-reduce solo quando la KB supera il budget del passaggio singolo).
+KB_SUMMARY_MODE = os.getenv("KB_SUMMARY_MODE", "auto")
+KB_SINGLE_PASS_MAX_TOKENS = int(os.getenv("KB_SINGLE_PASS_MAX_TOKENS", "12000"))
+KB_CHUNK_MAX_TOKENS = int(os.getenv("KB_CHUNK_MAX_TOKENS", "4000"))
+KB_MAP_CONCURRENCY = int(os.getenv("KB_MAP_CONCURRENCY", "4"))
+# Nome base: ogni tenant ha la propria collection '<tenant>_kb_summary_cache' (vedi kb_cache_collection_for)
+KB_CACHE_COLLECTION = "kb_summary_cache"
+NO_INSIGHT_MARKER = "NESSUN INSIGHT RILEVANTE"
+
 def _extract_kb_insight_from_response(full_response: str) -> str:
     """
     Estrae solo la sezione 'Knowledge Base Insight' dall'output completo dell'LLM,
@@ -42,13 +55,168 @@ def _extract_kb_insight_from_response(full_response: str) -> str:
         # la pipeline e permettere un debug manuale.
         return full_response
 
-def summarize_knowledge_base(icp_text: str, kb_documents: list) -> str | None:
+def _format_kb_document(doc: dict) -> str:
+    return f"--- INIZIO DOCUMENTO: {doc.get('title', 'Senza Titolo')} ---\n{doc.get('content', '')}\n--- FINE DOCUMENTO ---"
+
+def _split_into_chunks(text: str, max_tokens: int) -> list[str]:
+    """
+    Divide un testo in porzioni entro il budget di token, rispettando quando possibile i paragrafi.
+    Un testo vuoto (o di soli spazi) non produce alcuna porzione.
+    """
+    if not text.strip():
+        return []
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    max_chars = max_tokens * 4
+    chunks, current = [], ""
+    for paragraph in text.split("\n\n"):
+        # Paragrafi più lunghi del budget vengono spezzati a lunghezza fissa
+        pieces = [paragraph[i:i + max_chars] for i in range(0, len(paragraph), max_chars)] or [""]
+        for piece in pieces:
+            if current and len(current) + len(piece) + 2 > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _document_cache_key(icp_text: str, doc: dict) -> str:
+    """Chiave content-addressed: stesso modello, stessa ICP e stesso documento => stessa sintesi."""
+    hasher = hashlib.sha256()
+    for part in (KB_MODEL or "", str(KB_CHUNK_MAX_TOKENS), icp_text, doc.get("title", ""), doc.get("content", "")):
+        hasher.update(part.encode("utf-8"))
+        hasher.update(b"\x00")
+    return hasher.hexdigest()
+
+def kb_cache_collection_for(positions_collection: str) -> str:
+    """
+    Collection della cache delle sintesi associata a una collection di posizioni: le sintesi
+    dei documenti di un tenant restano nel suo prefisso ('<tenant>_positions_data' ->
+    '<tenant>_kb_summary_cache').
+    """
+    if positions_collection.endswith("positions_data"):
+        return positions_collection[: -len("positions_data")] + KB_CACHE_COLLECTION
+    return KB_CACHE_COLLECTION
+
+def _load_cached_document_summaries(cache_keys: list[str], cache_collection: str = KB_CACHE_COLLECTION) -> dict[str, str]:
+    if db is None or not cache_keys:
+        return {}
+    try:
+        cursor = db[cache_collection].find({"_id": {"$in": cache_keys}}, {"summary": 1})
+        return {item["_id"]: item["summary"] for item in cursor}
+    except Exception as e:
+        print(f"  - [Agente KB] Cache delle sintesi non disponibile: {e}")
+        return {}
+
+def _save_cached_document_summary(cache_key: str, title: str, summary: str, cache_collection: str = KB_CACHE_COLLECTION):
+    if db is None:
+        return
+    try:
+        db[cache_collection].update_one(
+            {"_id": cache_key},
+            {"$set": {"title": title, "summary": summary, "model": KB_MODEL}},
+            upsert=True
+        )
+    except Exception as e:
+        print(f"  - [Agente KB] Impossibile salvare la sintesi in cache per '{title}': {e}")
+
+def _summarize_chunk(icp_text: str, title: str, chunk_text: str, part_index: int, total_parts: int) -> str | None:
+    prompt = prompts_kb.create_kb_chunk_prompt(icp_text, title, chunk_text, part_index, total_parts)
+    output = get_llm_response(
+        prompt=prompt,
+        model=KB_MODEL,
+        system_prompt=prompts_kb.SYSTEM_PROMPT,
+        temperature=0.2,
+        max_tokens=800
+    )
+    if output.startswith("Errore"):
+        print(f"  - [Agente KB] Errore sulla parte {part_index}/{total_parts} di '{title}': {output}")
+        return None
+    return output.strip()
+
+def _map_documents(icp_text: str, kb_documents: list, cache_collection: str = KB_CACHE_COLLECTION) -> list[tuple[str, str]] | None:
+    """
+    Fase 'map': sintetizza in parallelo i chunk dei documenti non ancora in cache.
+    Restituisce una lista (titolo, sintesi) nell'ordine dei documenti, o None se un chunk fallisce.
+    """
+    cache_keys = [_document_cache_key(icp_text, doc) for doc in kb_documents]
+    cached = _load_cached_document_summaries(cache_keys, cache_collection)
+    print(f"  - [Agente KB] {len(cached)} documenti su {len(kb_documents)} già sintetizzati in cache.")
+
+    # Un task per ogni chunk dei documenti da elaborare
+    tasks = []
+    for doc_index, (doc, key) in enumerate(zip(kb_documents, cache_keys)):
+        if key in cached:
+            continue
+        title = doc.get("title", "Senza Titolo")
+        chunks = _split_into_chunks(doc.get("content", ""), KB_CHUNK_MAX_TOKENS)
+        for part_index, chunk in enumerate(chunks, start=1):
+            tasks.append((doc_index, title, chunk, part_index, len(chunks)))
+
+    chunk_outputs: dict[int, list[str | None]] = {}
+    if tasks:
+        print(f"  - [Agente KB] Sintesi di {len(tasks)} chunk con {KB_MAP_CONCURRENCY} worker...")
+        with ThreadPoolExecutor(max_workers=max(1, KB_MAP_CONCURRENCY)) as executor:
+            results = list(executor.map(bind_llm_budget(lambda t: _summarize_chunk(icp_text, t[1], t[2], t[3], t[4])), tasks))
+        for (doc_index, *_), output in zip(tasks, results):
+            chunk_outputs.setdefault(doc_index, []).append(output)
+
+    document_summaries = []
+    for doc_index, (doc, key) in enumerate(zip(kb_documents, cache_keys)):
+        title = doc.get("title", "Senza Titolo")
+        if key in cached:
+            summary = cached[key]
+        else:
+            outputs = chunk_outputs.get(doc_index, [])
+            if any(o is None for o in outputs):
+                print(f"  - [Agente KB] Sintesi fallita per il documento '{title}'.")
+                return None
+            summary = "\n".join(o for o in outputs if NO_INSIGHT_MARKER not in o.upper()) or NO_INSIGHT_MARKER
+            _save_cached_document_summary(key, title, summary, cache_collection)
+        document_summaries.append((title, summary))
+    return document_summaries
+
+def _format_partial_insights(document_summaries: list[tuple[str, str]]) -> str:
+    return "\n\n".join(
+        f"--- INSIGHT DAL DOCUMENTO: {title} ---\n{summary}" for title, summary in document_summaries
+    )
+
+def _condense_partial_insights(icp_text: str, document_summaries: list[tuple[str, str]]) -> list[tuple[str, str]] | None:
+    """
+    Se gli insight parziali superano il budget della fase 'reduce', li fonde a gruppi
+    (in parallelo) finché non rientrano in un unico prompt.
+    """
+    while len(document_summaries) > 1 and estimate_tokens(_format_partial_insights(document_summaries)) > KB_SINGLE_PASS_MAX_TOKENS:
+        groups, current = [], []
+        for entry in document_summaries:
+            if current and estimate_tokens(_format_partial_insights(current + [entry])) > KB_CHUNK_MAX_TOKENS:
+                groups.append(current)
+                current = []
+            current.append(entry)
+        groups.append(current)
+        if len(groups) == len(document_summaries):
+            # Ogni insight supera da solo il budget del chunk: non è possibile comprimere oltre
+            break
+        print(f"  - [Agente KB] Compressione di {len(document_summaries)} insight parziali in {len(groups)} gruppi...")
+        tasks = [(f"Gruppo {i}", _format_partial_insights(group), 1, 1) for i, group in enumerate(groups, start=1)]
+        with ThreadPoolExecutor(max_workers=max(1, KB_MAP_CONCURRENCY)) as executor:
+            outputs = list(executor.map(bind_llm_budget(lambda t: _summarize_chunk(icp_text, *t)), tasks))
+        if any(o is None for o in outputs):
+            return None
+        document_summaries = [(title, output) for (title, *_), output in zip(tasks, outputs)]
+    return document_summaries
+
+def summarize_knowledge_base(icp_text: str, kb_documents: list, mode: str | None = None, cache_collection: str = KB_CACHE_COLLECTION) -> str | None:
     """
     Genera una sintesi della KB contestualizzata sull'ICP e ne estrae la parte rilevante.
     
     Args:
         icp_text: Il testo dell'Ideal Candidate Profile.
         kb_documents: Una lista di dizionari (es. [{'title': '...', 'content': '...'}]) dalla KB.
+        mode: "single", "map_reduce" o "auto" (default da KB_SUMMARY_MODE).
+        cache_collection: Collection della cache delle sintesi per documento (per tenant, vedi kb_cache_collection_for).
 
     Returns:
         Il report di sintesi pulito o None in caso di fallimento.
@@ -57,14 +225,41 @@ def summarize_knowledge_base(icp_text: str, kb_documents: list) -> str | None:
         print("  - [Agente KB] Nessun documento della Knowledge Base fornito. Salto la sintesi.")
         return "Nessuna informazione dalla Knowledge Base fornita per questo ruolo."
 
+    # I documenti vuoti non hanno nulla da sintetizzare: non devono costare una chiamata LLM
+    non_empty_documents = [doc for doc in kb_documents if (doc.get("content") or "").strip()]
+    if len(non_empty_documents) < len(kb_documents):
+        print(f"  - [Agente KB] {len(kb_documents) - len(non_empty_documents)} documenti vuoti ignorati.")
+    kb_documents = non_empty_documents
+    if not kb_documents:
+        print("  - [Agente KB] Tutti i documenti della Knowledge Base sono vuoti. Salto la sintesi.")
+        return "Nessuna informazione dalla Knowledge Base fornita per questo ruolo."
+
     # Formatta i documenti in un'unica stringa per il prompt
-    kb_content = "\n\n".join(
-        f"--- INIZIO DOCUMENTO: {doc.get('title', 'Senza Titolo')} ---\n{doc.get('content', '')}\n--- FINE DOCUMENTO ---"
-        for doc in kb_documents
-    )
+    kb_content = "\n\n".join(_format_kb_document(doc) for doc in kb_documents)
+
+    mode = mode or KB_SUMMARY_MODE
+    if mode == "auto":
+        mode = "map_reduce" if estimate_tokens(kb_content) > KB_SINGLE_PASS_MAX_TOKENS else "single"
 
-    print("  - [Agente KB] Creazione del prompt per la sintesi...")
-    synthesis_prompt = prompts_kb.create_kb_synthesis_prompt(icp_text, kb_content)
+    if mode == "map_reduce":
+        print(f"  - [Agente KB] Modalità map-reduce su {len(kb_documents)} documenti...")
+        document_summaries = _map_documents(icp_text, kb_documents, cache_collection)
+        if document_summaries is None:
+            return None
+        relevant = [(title, summary) for title, summary in document_summaries if NO_INSIGHT_MARKER not in summary.upper()]
+        if not relevant:
+            print("  - [Agente KB] Nessun documento contiene insight rilevanti per l'ICP.")
+            return "Nessuna informazione rilevante dalla Knowledge Base per questo ruolo."
+        relevant = _condense_partial_insights(icp_text, relevant)
+        if relevant is None:
+            print("  - [Agente KB] Compressione degli insight parziali fallita.")
+            return None
+        partial_insights = _format_partial_insights(relevant)
+        print(f"  - [Agente KB] Fase 'reduce' su {len(relevant)} blocchi di insight (~{estimate_tokens(partial_insights)} token)...")
+        synthesis_prompt = prompts_kb.create_kb_reduce_prompt(icp_text, partial_insights)
+    else:
+        print("  - [Agente KB] Creazione del prompt per la sintesi...")
+        synthesis_prompt = prompts_kb.create_kb_synthesis_prompt(icp_text, kb_content)
     
     print(f"  - [Agente KB] Invio della richiesta al modello '{KB_MODEL}' per la sintesi...")
     # La chiamata LLM ora restituisce l'output completo, inclusa la parte di ragionamento
@@ -35,4 +35,58 @@ Attenzione: Non produrre ulteriore testo oltre alle due parti sopra citate. Nien
 
 **PROFILO DEL CANDIDATO IDEALE (ICP):**
 {icp_text}
-"""
\ No newline at end of file
+"""
+
+def create_kb_chunk_prompt(icp_text: str, doc_title: str, chunk_text: str, part_index: int, total_parts: int) -> str:
+    """
+    Assembla il prompt della fase 'map': estrae gli spunti rilevanti per l'ICP da una singola porzione di un documento.
+    """
+    return f"""
+Stai analizzando una porzione di un documento aziendale della Knowledge Base (documento "{doc_title}", parte {part_index} di {total_parts}).
+Estrai esclusivamente gli spunti connessi all'ICP riportata di seguito: progetti, attività, processi, strumenti e contesti operativi utili a costruire use-case per la verifica delle competenze.
+---
+**Istruzioni**:
+o	Scrivi un elenco puntato sintetico (massimo 10 punti), senza introduzioni né conclusioni.
+o	Non lasciar trapelare alcun tipo di dato reale e potenzialmente confidenziale dell’azienda.
+o	Se la porzione non contiene nulla di rilevante per l'ICP, rispondi solo con: NESSUN INSIGHT RILEVANTE.
+o	Non usare emoji.
+---
+**PORZIONE DI DOCUMENTO:**
+{chunk_text}
+
+**PROFILO DEL CANDIDATO IDEALE (ICP):**
+{icp_text}
+"""
+
+
+def create_kb_reduce_prompt(icp_text: str, partial_insights: str) -> str:
+    """
+    Assembla il prompt della fase 'reduce': fonde gli insight parziali dei documenti nel report finale,
+    mantenendo la stessa struttura di output della sintesi in un unico passaggio.
+    """
+    return f"""
+Data l'ICP riportata di seguito, fondi gli insight parziali estratti dai singoli documenti della Knowledge Base in un unico report autoconsistente, che verrà usato da un esperto esaminatore per costruire le giuste domande.
+---
+**Istruzioni**:
+o	Elimina le ripetizioni e raggruppa gli spunti affini provenienti da documenti diversi.
+o	Mantieni solo gli insight effettivamente connessi all'ICP.
+o	Non lasciar trapelare alcun tipo di dato reale e potenzialmente confidenziale dell’azienda.
+o	Non usare emoji.
+o	Usa la struttura di output riportata di seguito.
+---
+
+**Struttura dell’output**
+
+Ragionamento
+Utilizza questa sezione per pianificare la costruzione del report a partire dagli insight parziali
+
+Knowledge Base Insight
+In questa sezione è contenuto il report che, con brevi paragrafi, sintetizza i progetti e le attività estratte dalla documentazione verticale, da cui prendere spunto e senza l’utilizzo di dati particolarmente sensibili.
+Attenzione: Non produrre ulteriore testo oltre alle due parti sopra citate. Niente introduzioni o frasi conclusive ulteriori agli output richiesti
+---
+**INSIGHT PARZIALI PER DOCUMENTO:**
+{partial_insights}
+
+**PROFILO DEL CANDIDATO IDEALE (ICP):**
+{icp_text}
+"""
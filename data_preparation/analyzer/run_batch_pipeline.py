@@ -0,0 +1,59 @@
+# data_preparation/analyzer/run_batch_pipeline.py
+
+import sys
+import os
+import argparse
+from typing import Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from .run_production_pipeline import run_generation_dag
+
+from interviewer.llm_service import batch_llm_budget
+from services.job_service import update_job_item, finish_job
+
+
+def run_batch_generation_pipeline(
+    position_ids: list[str],
+    reasoning_steps: int,
+    collection_name: str = "positions_data",
+    max_workers: Optional[int] = None,
+    job_id: Optional[str] = None,
+) -> dict:
+    """
+    Genera i dati di più posizioni in un'unica esecuzione, condividendo il pool di worker
+    e il budget LLM dei job batch. Le posizioni che falliscono non interrompono le altre.
+
+    Se viene passato un 'job_id', lo stato di ogni posizione viene aggiornato sul job
+    corrispondente (vedi services.job_service).
+    """
+    # Rimuove i duplicati preservando l'ordine di arrivo
+    position_ids = list(dict.fromkeys(position_ids))
+    print(f"--- [PIPELINE 'BATCH'] Avvio per {len(position_ids)} posizioni ---")
+
+    def on_status(position_id: str, status: str, detail: Optional[str]):
+        update_job_item(job_id, position_id, status, detail)
+
+    with batch_llm_budget():
+        results = run_generation_dag(position_ids, reasoning_steps, collection_name, max_workers=max_workers, on_status=on_status)
+
+    completed = [pid for pid, res in results.items() if res["status"] == "completed"]
+    failed = {pid: res["failed_step"] for pid, res in results.items() if res["status"] != "completed"}
+    print(f"\n--- [PIPELINE 'BATCH'] Completate: {len(completed)}/{len(position_ids)} ---")
+    for pid, failed_step in failed.items():
+        print(f"  - '{pid}' fallita allo step '{failed_step}'")
+
+    finish_job(job_id, summary={"completed": completed, "failed": failed})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Esegue la pipeline di generazione per più posizioni.")
+    parser.add_argument("position_ids", nargs="+", help="ID delle posizioni su MongoDB")
+    parser.add_argument("--reasoning-steps", type=int, default=4)
+    parser.add_argument("--collection", default="positions_data")
+    parser.add_argument("--workers", type=int, default=None, help="Step eseguiti in parallelo (default: DATA_PREP_MAX_WORKERS)")
+    args = parser.parse_args()
+
+    batch_results = run_batch_generation_pipeline(args.position_ids, args.reasoning_steps, args.collection, args.workers)
+    sys.exit(0 if all(res["status"] == "completed" for res in batch_results.values()) else 1)
@@ -3,109 +3,271 @@
 import sys
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, NamedTuple, Optional
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from .icp_generator.icp_creator import generate_and_extract_icp
 from .case_guide_generator.guide_creator import generate_case_guide
-from .kb_summarizer.kb_processor import summarize_knowledge_base
+from .kb_summarizer.kb_processor import summarize_knowledge_base, kb_cache_collection_for
 from .final_generator.case_creator import generate_final_cases
 from .final_generator.criteria_creator import generate_final_criteria
 from ..corrector.evaluation_criteria_generator.criteria_generator import generate_evaluation_criteria
 
+from interviewer.llm_service import bind_llm_budget
 from services.data_manager import db
+from services.position_cache import invalidate_position, with_updated_at
+from corrector.cv_score_cache import cv_score_cache_collection_for, invalidate_cv_score_cache
+from corrector.skill_index import build_skill_index
 
-def run_full_generation_pipeline(position_id: str, reasoning_steps: int, collection_name: str = "positions_data") -> bool:
+# Numero di step (di qualsiasi posizione) eseguiti in parallelo dallo scheduler
+DATA_PREP_MAX_WORKERS = int(os.getenv("DATA_PREP_MAX_WORKERS", "4"))
+
+
+class PipelineStep(NamedTuple):
+    """Un nodo del DAG di generazione: dipendenze e funzione che produce i campi da salvare."""
+    name: str
+    depends_on: tuple
+    run: Callable[[dict], Optional[dict]]
+
+
+def _load_position_inputs(position_id: str, positions_collection) -> Optional[dict]:
     """
-    Orchestra l'intera pipeline di generazione dei dati per una nuova posizione.
+    STEP 0: recupera i dati iniziali della posizione e costruisce il contesto condiviso dagli step.
     """
-    print(f"--- [PIPELINE 'PRODUCTION'] Avvio per la posizione: {position_id} ---")
-
-    # --- STEP 0: RECUPERO DELLA JOB DESCRIPTION ---
-    print(f"\n[STEP 0/6] Recupero dati iniziali da MongoDB...")
+    print(f"\n[STEP 0/6] Recupero dati iniziali da MongoDB per '{position_id}'...")
     try:
-        if db is None: raise ConnectionError("Connessione a MongoDB non disponibile.")
-        positions_collection = db[collection_name]
         position_document = positions_collection.find_one({"_id": position_id})
 
         if not position_document:
             print(f"  - ERRORE: Documento non trovato per '{position_id}'.")
-            return False
+            return None
 
         jd_text = position_document.get("job_description")
-        kb_docs = position_document.get("knowledge_base", [])
-        seniority_level = position_document.get("seniority_level", "Mid-Level")
-        hr_special_needs = position_document.get("hr_special_needs", "")
-
         if not jd_text:
             print(f"  - ERRORE: Campo 'job_description' non trovato per '{position_id}'.")
-            return False
+            return None
+
         print("  - Dati iniziali (JD, KB, Seniority, HR Needs) recuperati con successo.")
+        return {
+            "position_id": position_id,
+            "job_description": jd_text,
+            "knowledge_base": position_document.get("knowledge_base", []),
+            "seniority_level": position_document.get("seniority_level", "Mid-Level"),
+            "hr_special_needs": position_document.get("hr_special_needs", ""),
+        }
     except Exception as e:
         print(f"  - ERRORE durante il recupero dei dati iniziali da MongoDB: {e}")
-        return False
+        return None
+
+
+def _cases_json_str(ctx: dict) -> str:
+    # Stessa serializzazione compatta di model_dump_json()
+    return json.dumps(ctx["all_cases"], ensure_ascii=False, separators=(",", ":"))
+
 
-    # --- STEP 1: GENERAZIONE ICP ---
-    print(f"\n[STEP 1/6] Generazione dell'Ideal Candidate Profile (ICP)...")
-    icp_text = generate_and_extract_icp(job_description_text=jd_text, hr_special_needs=hr_special_needs)
+def _step_icp(ctx: dict) -> Optional[dict]:
+    print(f"\n[STEP 1/6] Generazione dell'Ideal Candidate Profile (ICP) per '{ctx['position_id']}'...")
+    icp_text = generate_and_extract_icp(job_description_text=ctx["job_description"], hr_special_needs=ctx["hr_special_needs"])
     if not icp_text:
-        print("  - Fallimento nella generazione dell'ICP. Pipeline interrotta.")
-        return False
-    positions_collection.update_one({"_id": position_id}, {"$set": {"icp": icp_text}})
-    print(f"  - ICP salvato con successo per '{position_id}'.")
-
-    # --- STEP 2: GENERAZIONE GUIDA AL CASO ---
-    print(f"\n[STEP 2/6] Generazione della Guida alla Creazione dei Casi...")
-    case_guide_text = generate_case_guide(icp_text=icp_text, seniority_level=seniority_level, hr_special_needs=hr_special_needs)
+        print("  - Fallimento nella generazione dell'ICP.")
+        return None
+    return {"icp": icp_text}
+
+
+def _step_case_guide(ctx: dict) -> Optional[dict]:
+    print(f"\n[STEP 2/6] Generazione della Guida alla Creazione dei Casi per '{ctx['position_id']}'...")
+    case_guide_text = generate_case_guide(icp_text=ctx["icp"], seniority_level=ctx["seniority_level"], hr_special_needs=ctx["hr_special_needs"])
     if not case_guide_text:
-        print("  - Fallimento nella generazione della Guida. Pipeline interrotta.")
-        return False
-    positions_collection.update_one({"_id": position_id}, {"$set": {"case_guide": case_guide_text}})
-    print(f"  - Guida salvata con successo per '{position_id}'.")
-
-    # --- STEP 3: SINTESI KNOWLEDGE BASE ---
-    print(f"\n[STEP 3/6] Sintesi della Knowledge Base...")
-    kb_summary = summarize_knowledge_base(icp_text=icp_text, kb_documents=kb_docs)
+        print("  - Fallimento nella generazione della Guida.")
+        return None
+    return {"case_guide": case_guide_text}
+
+
+def _step_kb_summary(ctx: dict) -> Optional[dict]:
+    print(f"\n[STEP 3/6] Sintesi della Knowledge Base per '{ctx['position_id']}'...")
+    kb_summary = summarize_knowledge_base(
+        icp_text=ctx["icp"], kb_documents=ctx["knowledge_base"], cache_collection=ctx["kb_cache_collection"]
+    )
     if not kb_summary:
-        print("  - Fallimento nella sintesi della KB. Pipeline interrotta.")
-        return False
-    positions_collection.update_one({"_id": position_id}, {"$set": {"kb_summary": kb_summary}})
-    print(f"  - Sintesi KB salvata con successo per '{position_id}'.")
-
-    # --- STEP 4: GENERAZIONE DEI CASI ---
-    print(f"\n[STEP 4/6] Generazione finale dei casi strutturati...")
-    case_collection = generate_final_cases(icp_text, case_guide_text, kb_summary, seniority_level, reasoning_steps, hr_special_needs)
+        print("  - Fallimento nella sintesi della KB.")
+        return None
+    return {"kb_summary": kb_summary}
+
+
+def _step_cases(ctx: dict) -> Optional[dict]:
+    print(f"\n[STEP 4/6] Generazione finale dei casi strutturati per '{ctx['position_id']}'...")
+    case_collection = generate_final_cases(
+        ctx["icp"], ctx["case_guide"], ctx["kb_summary"], ctx["seniority_level"], ctx["reasoning_steps"], ctx["hr_special_needs"]
+    )
     if not case_collection:
-        print("  - Fallimento nella generazione dei Casi. Pipeline interrotta.")
-        return False
-    positions_collection.update_one({"_id": position_id}, {"$set": {"all_cases": case_collection.model_dump()}})
-    print(f"  - Casi salvati con successo per '{position_id}'.")
-
-    # --- STEP 5: GENERAZIONE DEI CRITERI PER IL CHATBOT ---
-    print(f"\n[STEP 5/6] Generazione dei criteri per il chatbot...")
-    cases_json_str = case_collection.model_dump_json()
-    criteria_collection = generate_final_criteria(icp_text, cases_json_str, seniority_level, hr_special_needs)
+        print("  - Fallimento nella generazione dei Casi.")
+        return None
+    return {"all_cases": case_collection.model_dump()}
+
+
+def _step_criteria(ctx: dict) -> Optional[dict]:
+    print(f"\n[STEP 5/6] Generazione dei criteri per il chatbot per '{ctx['position_id']}'...")
+    criteria_collection = generate_final_criteria(ctx["icp"], _cases_json_str(ctx), ctx["seniority_level"], ctx["hr_special_needs"])
     if not criteria_collection:
-        print("  - Fallimento nella generazione dei Criteri. Pipeline interrotta.")
-        return False
-    positions_collection.update_one({"_id": position_id}, {"$set": {"all_criteria": criteria_collection.model_dump()}})
-    print(f"  - Criteri per il chatbot salvati con successo per '{position_id}'.")
-
-    # --- STEP 6: GENERAZIONE DEI CRITERI DI VALUTAZIONE FINALE ---
-    print(f"\n[STEP 6/6] Generazione dei Criteri di ValUTazione Finale...")
-    eval_criteria_collection = generate_evaluation_criteria(icp_text, cases_json_str, seniority_level, hr_special_needs)
+        print("  - Fallimento nella generazione dei Criteri.")
+        return None
+    return {"all_criteria": criteria_collection.model_dump()}
+
+
+def _step_evaluation_criteria(ctx: dict) -> Optional[dict]:
+    print(f"\n[STEP 6/6] Generazione dei Criteri di Valutazione Finale per '{ctx['position_id']}'...")
+    eval_criteria_collection = generate_evaluation_criteria(ctx["icp"], _cases_json_str(ctx), ctx["seniority_level"], ctx["hr_special_needs"])
     if not eval_criteria_collection:
-        print("  - Fallimento nella generazione dei Criteri di Valutazione. Pipeline interrotta.")
-        return False
-    positions_collection.update_one({"_id": position_id}, {"$set": {"evaluation_criteria": eval_criteria_collection.model_dump()}})
-    print(f"  - Criteri di valutazione finale salvati con successo per '{position_id}'.")
+        print("  - Fallimento nella generazione dei Criteri di Valutazione.")
+        return None
+    evaluation_criteria = eval_criteria_collection.model_dump()
+    # Indice skill -> requirement usato dallo scoring, calcolato una volta per rubrica
+    return {"evaluation_criteria": evaluation_criteria, "skill_index": build_skill_index(evaluation_criteria, ctx["all_cases"])}
+
+
+# DAG della pipeline: guida e sintesi KB dipendono solo dall'ICP, i due set di criteri solo dai casi
+PIPELINE_STEPS = [
+    PipelineStep("icp", (), _step_icp),
+    PipelineStep("case_guide", ("icp",), _step_case_guide),
+    PipelineStep("kb_summary", ("icp",), _step_kb_summary),
+    PipelineStep("all_cases", ("case_guide", "kb_summary"), _step_cases),
+    PipelineStep("all_criteria", ("all_cases",), _step_criteria),
+    PipelineStep("evaluation_criteria", ("all_cases",), _step_evaluation_criteria),
+]
+
 
-    print("\n--- [PIPELINE 'PRODUCTION'] Tutti i dati per la posizione sono stati generati e salvati su MongoDB. ---")
-    return True
+def run_generation_dag(
+    position_ids: list[str],
+    reasoning_steps: int,
+    collection_name: str = "positions_data",
+    max_workers: Optional[int] = None,
+    on_status: Optional[Callable[[str, str, Optional[str]], None]] = None,
+) -> dict:
+    """
+    Esegue la pipeline di generazione per una o più posizioni su un pool di worker condiviso.
+
+    Ogni step viene sottomesso appena le sue dipendenze sono completate, per cui gli step
+    indipendenti (della stessa posizione o di posizioni diverse) procedono in parallelo; il
+    budget di chiamate LLM attivo nel chiamante (vedi llm_service.batch_llm_budget) vale
+    anche per gli step. Il fallimento di una
+    posizione interrompe solo i suoi step successivi.
+
+    'on_status(position_id, status, detail)' viene invocato a ogni cambio di stato
+    ('running', 'completed', 'failed').
+
+    Restituisce {position_id: {"status": ..., "completed_steps": [...], "failed_step": ...}}.
+    """
+    def notify(position_id: str, status: str, detail: Optional[str] = None):
+        if on_status:
+            try:
+                on_status(position_id, status, detail)
+            except Exception as e:
+                print(f"  - ATTENZIONE: callback di stato fallita per '{position_id}': {e}")
+
+    results = {
+        position_id: {"status": "pending", "completed_steps": [], "failed_step": None}
+        for position_id in position_ids
+    }
+    if db is None:
+        print("  - ERRORE: Connessione a MongoDB non disponibile.")
+        for position_id in position_ids:
+            results[position_id]["status"] = "failed"
+            notify(position_id, "failed", "database unavailable")
+        return results
+
+    positions_collection = db[collection_name]
+    contexts = {}
+    for position_id in results:
+        ctx = _load_position_inputs(position_id, positions_collection)
+        if ctx is None:
+            results[position_id]["status"] = "failed"
+            results[position_id]["failed_step"] = "load_inputs"
+            notify(position_id, "failed", "load_inputs")
+            continue
+        ctx["reasoning_steps"] = reasoning_steps
+        ctx["kb_cache_collection"] = kb_cache_collection_for(collection_name)
+        contexts[position_id] = ctx
+        results[position_id]["status"] = "running"
+        notify(position_id, "running")
+
+    submitted = {position_id: set() for position_id in contexts}
+    futures = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or DATA_PREP_MAX_WORKERS) as executor:
+
+        def schedule_ready_steps(position_id: str):
+            completed = results[position_id]["completed_steps"]
+            for step in PIPELINE_STEPS:
+                if step.name in submitted[position_id]:
+                    continue
+                if all(dep in completed for dep in step.depends_on):
+                    submitted[position_id].add(step.name)
+                    futures[executor.submit(bind_llm_budget(step.run), contexts[position_id])] = (position_id, step)
+
+        for position_id in contexts:
+            schedule_ready_steps(position_id)
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                position_id, step = futures.pop(future)
+                result = results[position_id]
+                if result["status"] == "failed":
+                    continue
+
+                try:
+                    fields = future.result()
+                except Exception as e:
+                    print(f"  - ERRORE nello step '{step.name}' per '{position_id}': {e}")
+                    fields = None
+
+                if fields:
+                    try:
+                        positions_collection.update_one({"_id": position_id}, {"$set": with_updated_at(fields)})
+                        invalidate_position(position_id, collection_name)
+                    except Exception as e:
+                        print(f"  - ERRORE nel salvataggio dello step '{step.name}' per '{position_id}': {e}")
+                        fields = None
+
+                if not fields:
+                    result["status"] = "failed"
+                    result["failed_step"] = step.name
+                    print(f"  - Pipeline interrotta per '{position_id}' allo step '{step.name}'.")
+                    notify(position_id, "failed", step.name)
+                    continue
+
+                # Il contesto viene aggiornato solo dal thread coordinatore, dopo il salvataggio
+                contexts[position_id].update(fields)
+                if "evaluation_criteria" in fields:
+                    # I punteggi CV in cache sono legati alla rubrica precedente
+                    invalidate_cv_score_cache(position_id, cv_score_cache_collection_for(collection_name))
+                result["completed_steps"].append(step.name)
+                print(f"  - Step '{step.name}' salvato con successo per '{position_id}'.")
+
+                if len(result["completed_steps"]) == len(PIPELINE_STEPS):
+                    result["status"] = "completed"
+                    print(f"\n--- [PIPELINE 'PRODUCTION'] Posizione '{position_id}' completata e salvata su MongoDB. ---")
+                    notify(position_id, "completed")
+                else:
+                    schedule_ready_steps(position_id)
+
+    return results
+
+
+def run_full_generation_pipeline(position_id: str, reasoning_steps: int, collection_name: str = "positions_data") -> bool:
+    """
+    Orchestra l'intera pipeline di generazione dei dati per una nuova posizione.
+    """
+    print(f"--- [PIPELINE 'PRODUCTION'] Avvio per la posizione: {position_id} ---")
+    results = run_generation_dag([position_id], reasoning_steps, collection_name)
+    return results[position_id]["status"] == "completed"
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         test_position_id = sys.argv[1]
-        run_full_generation_pipeline(test_position_id)
+        test_reasoning_steps = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+        run_full_generation_pipeline(test_position_id, test_reasoning_steps)
     else:
-        print("Uso: python -m data_preparation.analyzer.run_production_pipeline \"<position_id_da_mongodb>\"")
\ No newline at end of file
+        print("Uso: python -m data_preparation.analyzer.run_production_pipeline \"<position_id_da_mongodb>\" [reasoning_steps]")
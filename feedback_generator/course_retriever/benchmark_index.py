@@ -0,0 +1,105 @@
+# feedback_generator/course_retriever/benchmark_index.py
+"""
+Benchmark dei tipi di indice FAISS per il catalogo corsi (vedi index_factory).
+
+Per ogni tipo misura tempo di costruzione, dimensione serializzata, latenza per query
+(una query alla volta, come nella pipeline) e recall@k rispetto alla ricerca esatta
+flat_ip, che è il riferimento. Le query sono embedding del catalogo perturbati con rumore
+gaussiano, così da non coincidere con i vettori indicizzati.
+
+Sorgenti degli embedding:
+- quelli salvati dal RAG Service in RAG_INDEX_DIR (default);
+- --synthetic N: N vettori casuali, per stimare il comportamento su cataloghi grandi.
+
+Esempi:
+    python -m feedback_generator.course_retriever.benchmark_index
+    python -m feedback_generator.course_retriever.benchmark_index --synthetic 100000 --types flat_ip,ivf_flat,hnsw,ivf_pq
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from . import index_factory
+from .index_factory import INDEX_TYPES, build_index, normalize
+from .index_store import IndexStore
+from .rag_service import EMBEDDING_MODEL_NAME
+
+
+def _load_embeddings(args) -> np.ndarray:
+    if args.synthetic:
+        rng = np.random.default_rng(args.seed)
+        # Vettori raggruppati attorno a centri casuali: più simili a embedding reali del rumore uniforme
+        centers = rng.standard_normal((max(1, args.synthetic // 100), args.dimension)).astype(np.float32)
+        assignments = rng.integers(0, len(centers), args.synthetic)
+        return centers[assignments] + 0.5 * rng.standard_normal((args.synthetic, args.dimension)).astype(np.float32)
+    meta, embeddings = IndexStore(EMBEDDING_MODEL_NAME).load_embeddings()
+    if meta is None:
+        raise SystemExit("Nessun embedding salvato: avvia il RAG Service una volta oppure usa --synthetic N.")
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def _queries(embeddings: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed + 1)
+    picked = embeddings[rng.integers(0, len(embeddings), count)]
+    scale = noise * float(np.linalg.norm(embeddings, axis=1).mean()) / np.sqrt(embeddings.shape[1])
+    return picked + scale * rng.standard_normal(picked.shape).astype(np.float32)
+
+
+def benchmark(embeddings: np.ndarray, queries: np.ndarray, index_types: list, k: int) -> list:
+    reference = build_index(embeddings, "flat_ip")
+    _, expected = reference.search(normalize(queries), k)
+
+    results = []
+    for index_type in index_types:
+        effective = index_factory.effective_index_type(index_type, len(embeddings))
+        start = time.perf_counter()
+        index = build_index(embeddings, index_type)
+        build_seconds = time.perf_counter() - start
+
+        prepared = normalize(queries) if index_factory.uses_cosine(effective) else np.ascontiguousarray(queries, dtype=np.float32)
+        latencies = []
+        found = np.empty((len(queries), k), dtype=np.int64)
+        for q in range(len(prepared)):
+            start = time.perf_counter()
+            _, indices = index.search(prepared[q:q + 1], k)
+            latencies.append(time.perf_counter() - start)
+            found[q] = indices[0]
+
+        hits = sum(len(set(f) & set(e)) for f, e in zip(found, expected))
+        results.append({
+            "type": index_type if effective == index_type else f"{index_type}->{effective}",
+            "build_s": build_seconds,
+            "size_mb": len(faiss.serialize_index(index)) / (1024 * 1024),
+            "avg_ms": 1000 * float(np.mean(latencies)),
+            "p95_ms": 1000 * float(np.percentile(latencies, 95)),
+            "recall": hits / (len(queries) * k),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Confronta i tipi di indice FAISS per la ricerca dei corsi.")
+    parser.add_argument("--types", default=",".join(INDEX_TYPES), help=f"Tipi da confrontare (tra: {', '.join(INDEX_TYPES)})")
+    parser.add_argument("--synthetic", type=int, default=0, help="Usa N embedding casuali invece di quelli salvati")
+    parser.add_argument("--dimension", type=int, default=384, help="Dimensione degli embedding sintetici (MiniLM: 384)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--noise", type=float, default=0.3, help="Rumore relativo aggiunto alle query")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    index_types = [t.strip() for t in args.types.split(",") if t.strip()]
+    unknown = [t for t in index_types if t not in INDEX_TYPES]
+    if unknown:
+        raise SystemExit(f"Tipi di indice non validi: {unknown}")
+
+    embeddings = _load_embeddings(args)
+    queries = _queries(embeddings, args.queries, args.noise, args.seed)
+    print(f"Corsi: {len(embeddings)}, dimensione: {embeddings.shape[1]}, query: {len(queries)}, k: {args.k}")
+    print(f"Riferimento: flat_ip (esatto). Parametri: nprobe={index_factory.RAG_IVF_NPROBE}, "
+          f"efSearch={index_factory.RAG_HNSW_EF_SEARCH}, M={index_factory.RAG_HNSW_M}, pq={index_factory.RAG_PQ_M}x{index_factory.RAG_PQ_NBITS}")
+    print(f"\n{'indice':<20}{'build s':>9}{'MB':>9}{'ms/query':>10}{'p95 ms':>9}{'recall@k':>10}")
+    for r in benchmark(embeddings, queries, index_types, args.k):
+        print(f"{r['type']:<20}{r['build_s']:>9.2f}{r['size_mb']:>9.1f}{r['avg_ms']:>10.3f}{r['p95_ms']:>9.3f}{r['recall']:>10.1%}")
@@ -0,0 +1,119 @@
+# feedback_generator/course_retriever/index_factory.py
+"""
+Tipi di indice FAISS per il catalogo corsi, scelti con RAG_INDEX_TYPE.
+
+- flat_l2: ricerca esatta in distanza L2 su embedding non normalizzati (comportamento storico);
+- flat_ip: ricerca esatta per similarità coseno (prodotto scalare su vettori normalizzati);
+- ivf_flat: partizionamento in RAG_IVF_NLIST celle, ne visita RAG_IVF_NPROBE per query;
+- hnsw: grafo HNSW (RAG_HNSW_M, RAG_HNSW_EF_CONSTRUCTION, RAG_HNSW_EF_SEARCH), nessun training;
+- ivf_pq: IVF con vettori compressi in RAG_PQ_M sottovettori da RAG_PQ_NBITS bit (poca memoria).
+
+Tutti i tipi tranne flat_l2 usano il coseno. I tipi che richiedono training ripiegano su
+flat_ip quando il catalogo è troppo piccolo per addestrarli. Per scegliere il tipo per
+deployment: python -m feedback_generator.course_retriever.benchmark_index
+"""
+import math
+import os
+
+import faiss
+import numpy as np
+
+
+INDEX_TYPES = ("flat_l2", "flat_ip", "ivf_flat", "hnsw", "ivf_pq")
+RAG_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "flat_ip").lower()
+# 0 = automatico (~4 * sqrt(numero di corsi))
+RAG_IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", "0"))
+RAG_IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "16"))
+RAG_HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+RAG_HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "80"))
+RAG_HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+RAG_PQ_M = int(os.getenv("RAG_PQ_M", "16"))
+RAG_PQ_NBITS = int(os.getenv("RAG_PQ_NBITS", "8"))
+
+# Punti di training per centroide sotto i quali FAISS addestra male (e avvisa)
+_MIN_POINTS_PER_CENTROID = 39
+
+
+def uses_cosine(index_type: str) -> bool:
+    return index_type != "flat_l2"
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Copia float32 contigua dei vettori normalizzati a norma unitaria"""
+    vectors = np.array(vectors, dtype=np.float32, copy=True, order="C")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _nlist(count: int) -> int:
+    return RAG_IVF_NLIST or max(1, int(4 * math.sqrt(count)))
+
+
+def _pq_m(dimension: int) -> int:
+    """Numero di sottovettori PQ: RAG_PQ_M se divide la dimensione, altrimenti il divisore più vicino"""
+    divisors = [m for m in range(1, dimension + 1) if dimension % m == 0]
+    return min(divisors, key=lambda m: abs(m - RAG_PQ_M))
+
+
+def effective_index_type(index_type: str, count: int) -> str:
+    """Tipo realmente costruibile per un catalogo di 'count' vettori"""
+    if index_type not in INDEX_TYPES:
+        print(f"  - Avviso: RAG_INDEX_TYPE '{index_type}' non valido, uso flat_ip.")
+        return "flat_ip"
+    if index_type == "ivf_flat" and count < _nlist(count) * _MIN_POINTS_PER_CENTROID:
+        return "flat_ip"
+    if index_type == "ivf_pq" and count < max(_nlist(count), 2 ** RAG_PQ_NBITS) * _MIN_POINTS_PER_CENTROID:
+        return "flat_ip"
+    return index_type
+
+
+def index_spec(index_type: str, count: int) -> str:
+    """Tipo e parametri di costruzione, usati nel nome del file dell'indice salvato"""
+    index_type = effective_index_type(index_type, count)
+    if index_type == "ivf_flat":
+        return f"ivf_flat-{_nlist(count)}"
+    if index_type == "hnsw":
+        return f"hnsw-{RAG_HNSW_M}-{RAG_HNSW_EF_CONSTRUCTION}"
+    if index_type == "ivf_pq":
+        return f"ivf_pq-{_nlist(count)}-{RAG_PQ_M}x{RAG_PQ_NBITS}"
+    return index_type
+
+
+def build_index(embeddings: np.ndarray, index_type: str = RAG_INDEX_TYPE):
+    """Costruisce (e addestra, se serve) l'indice del tipo richiesto sugli embedding grezzi"""
+    count, dimension = embeddings.shape
+    index_type = effective_index_type(index_type, count)
+    vectors = normalize(embeddings) if uses_cosine(index_type) else np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    if index_type == "flat_l2":
+        index = faiss.IndexFlatL2(dimension)
+    elif index_type == "flat_ip":
+        index = faiss.IndexFlatIP(dimension)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, RAG_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = RAG_HNSW_EF_CONSTRUCTION
+    else:
+        quantizer = faiss.IndexFlatIP(dimension)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, _nlist(count), faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dimension, _nlist(count), _pq_m(dimension), RAG_PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+
+    index.add(vectors)
+    configure_search(index)
+    return index
+
+
+def configure_search(index):
+    """Parametri di ricerca (non sempre salvati con l'indice): da applicare anche dopo read_index"""
+    if hasattr(index, "nprobe"):
+        index.nprobe = min(RAG_IVF_NPROBE, index.nlist)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = RAG_HNSW_EF_SEARCH
+    return index
+
+
+def is_similarity(index) -> bool:
+    """True se l'indice restituisce similarità (più alto = più vicino) invece di distanze"""
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
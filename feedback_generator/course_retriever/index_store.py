@@ -0,0 +1,198 @@
+# feedback_generator/course_retriever/index_store.py
+"""
+Persistenza dell'indice FAISS dei corsi e dei relativi embedding.
+
+Per ogni modello di embedding vengono salvati in RAG_INDEX_DIR/<modello>/:
+- index_<catalog_version>_<tipo indice>.faiss: l'indice (vedi index_factory), riletto con
+  faiss.read_index in mmap;
+- embeddings.npy + meta.json: gli embedding per corso con id e hash del testo, usati
+  per ricalcolare solo i corsi aggiunti o modificati quando il catalogo cambia.
+
+La versione del catalogo è l'hash degli (id, hash del testo) dei corsi: un avvio con
+catalogo invariato carica l'indice da file senza ricalcolare alcun embedding.
+Con RAG_INDEX_SHARED=true i file vengono pubblicati anche nello store degli artifact
+(services.artifact_store, es. GridFS) e registrati in una collection di manifest, così
+le nuove istanze li scaricano invece di ricostruirli.
+"""
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+
+import faiss
+import numpy as np
+
+from services.data_manager import db
+
+
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", os.path.join("data", "rag_index"))
+RAG_INDEX_MMAP = os.getenv("RAG_INDEX_MMAP", "true").lower() in ("1", "true", "yes")
+RAG_INDEX_SHARED = os.getenv("RAG_INDEX_SHARED", "false").lower() in ("1", "true", "yes")
+RAG_INDEX_MANIFEST_COLLECTION = "rag_index_manifest"
+
+
+def course_text(course: dict) -> str:
+    return f"{course.get('Course Name', '')}. {course.get('Description', '')}"
+
+
+def course_key(course: dict) -> str:
+    return str(course.get("_id"))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def catalog_version(keys: list, hashes: list) -> str:
+    digest = hashlib.sha256("\n".join(f"{k}:{h}" for k, h in zip(keys, hashes)).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _write_atomic(path: str, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class IndexStore:
+    def __init__(self, model_name: str, base_dir: str = RAG_INDEX_DIR):
+        self.model_name = model_name
+        self.dir = os.path.join(base_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+
+    def _index_path(self, version: str) -> str:
+        return os.path.join(self.dir, f"index_{version}.faiss")
+
+    @property
+    def _embeddings_path(self) -> str:
+        return os.path.join(self.dir, "embeddings.npy")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.dir, "meta.json")
+
+    # --- Lettura ---
+
+    def load_index(self, version: str):
+        """Indice della versione richiesta (catalogo + tipo, da file locale o store condiviso), None se assente"""
+        path = self._index_path(version)
+        if not os.path.exists(path) and not self._fetch_shared(version):
+            return None
+        try:
+            if RAG_INDEX_MMAP:
+                try:
+                    return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                except Exception as e:
+                    print(f"  - Avviso: mmap non supportato per l'indice ({e}), lettura completa.")
+            return faiss.read_index(path)
+        except Exception as e:
+            print(f"  - Avviso: indice salvato non leggibile ({e}), verrà ricostruito.")
+            return None
+
+    def load_embeddings(self) -> tuple[dict | None, np.ndarray | None]:
+        """Ultimi embedding salvati per questo modello e i relativi metadati (id e hash per riga)"""
+        if not os.path.exists(self._meta_path):
+            self._fetch_shared(None)
+        try:
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            embeddings = np.load(self._embeddings_path, mmap_mode="r")
+        except FileNotFoundError:
+            return None, None
+        except Exception as e:
+            print(f"  - Avviso: embedding salvati non leggibili ({e}).")
+            return None, None
+        if meta.get("model") != self.model_name or len(meta.get("keys", [])) != embeddings.shape[0]:
+            return None, None
+        return meta, embeddings
+
+    # --- Scrittura ---
+
+    def save(self, version: str, index, embeddings: np.ndarray, keys: list, hashes: list):
+        """Salva indice, embedding e metadati (scritture atomiche); pubblica nello store condiviso se attivo"""
+        try:
+            os.makedirs(self.dir, exist_ok=True)
+            meta = {
+                "model": self.model_name,
+                "catalog_version": version,
+                "dimension": int(embeddings.shape[1]),
+                "keys": keys,
+                "hashes": hashes,
+                "built_at": datetime.utcnow().isoformat(),
+            }
+            _write_atomic(self._index_path(version), lambda p: faiss.write_index(index, p))
+            _write_atomic(self._embeddings_path, lambda p: self._save_npy(p, embeddings))
+            _write_atomic(self._meta_path, lambda p: self._save_json(p, meta))
+            for name in os.listdir(self.dir):
+                if name.startswith("index_") and name.endswith(".faiss") and name != os.path.basename(self._index_path(version)):
+                    os.remove(os.path.join(self.dir, name))
+            print(f"  - Indice salvato in {self.dir} (versione catalogo {version}).")
+        except Exception as e:
+            print(f"  - Avviso: impossibile salvare l'indice su disco: {e}")
+            return
+        if RAG_INDEX_SHARED:
+            self._publish_shared(version)
+
+    @staticmethod
+    def _save_npy(path: str, embeddings: np.ndarray):
+        with open(path, "wb") as f:
+            np.save(f, embeddings)
+
+    @staticmethod
+    def _save_json(path: str, data: dict):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    # --- Store condiviso (artifact store + manifest su MongoDB) ---
+
+    def _publish_shared(self, version: str):
+        from services.artifact_store import save_artifact
+        if db is None:
+            return
+        try:
+            refs = {}
+            for field, path in (("index_ref", self._index_path(version)), ("embeddings_ref", self._embeddings_path), ("meta_ref", self._meta_path)):
+                with open(path, "rb") as f:
+                    refs[field] = save_artifact("rag_index", os.path.basename(path), f.read())
+                if not refs[field]:
+                    return
+            db[RAG_INDEX_MANIFEST_COLLECTION].update_one(
+                {"_id": self.model_name},
+                {"$set": {"catalog_version": version, "updated_at": datetime.utcnow().isoformat(), **refs}},
+                upsert=True,
+            )
+            print(f"  - Indice pubblicato nello store condiviso (versione catalogo {version}).")
+        except Exception as e:
+            print(f"  - Avviso: pubblicazione dell'indice nello store condiviso fallita: {e}")
+
+    def _fetch_shared(self, version: str | None) -> bool:
+        """Scarica dallo store condiviso i file dell'ultima build (solo se della versione richiesta, se indicata)"""
+        if not RAG_INDEX_SHARED or db is None:
+            return False
+        from services.artifact_store import open_artifact
+        try:
+            manifest = db[RAG_INDEX_MANIFEST_COLLECTION].find_one({"_id": self.model_name})
+            if not manifest or (version and manifest.get("catalog_version") != version):
+                return False
+            os.makedirs(self.dir, exist_ok=True)
+            targets = (
+                (manifest["index_ref"], self._index_path(manifest["catalog_version"])),
+                (manifest["embeddings_ref"], self._embeddings_path),
+                (manifest["meta_ref"], self._meta_path),
+            )
+            for ref, path in targets:
+                artifact = open_artifact(ref)
+                if artifact is None:
+                    return False
+
+                def write(tmp_path, artifact=artifact):
+                    with open(tmp_path, "wb") as f:
+                        for chunk in artifact.iter_bytes():
+                            f.write(chunk)
+
+                _write_atomic(path, write)
+            print(f"  - Indice scaricato dallo store condiviso (versione catalogo {manifest['catalog_version']}).")
+            return True
+        except Exception as e:
+            print(f"  - Avviso: indice non recuperabile dallo store condiviso: {e}")
+            return False
@@ -1,15 +1,45 @@
-import faiss
+import os
+import threading
+import time
+from datetime import datetime
+
 import numpy as np
-import streamlit as st 
-from sentence_transformers import SentenceTransformer
 # Importiamo l'oggetto 'db' dal nostro servizio dati centralizzato
 from services.data_manager import db
+from .index_store import IndexStore, course_text, course_key, content_hash, catalog_version
+from .index_factory import RAG_INDEX_TYPE, build_index, configure_search, index_spec, is_similarity, normalize
 
 # --- Configurazione ---
 # Il modello di embedding rimane lo stesso, locale e performante
 EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
 # Il nome della collection da cui leggere i corsi su MongoDB
 COURSES_COLLECTION_NAME = "courses"
+# Se attivo (default), il servizio viene costruito in background all'avvio dell'API (vedi warmup_rag_service)
+RAG_WARMUP = os.getenv("RAG_WARMUP", "true").lower() in ("1", "true", "yes")
+# Intervallo minimo tra due ricaricamenti richiesti via API (vedi start_rag_reload)
+RAG_RELOAD_MIN_INTERVAL_SECONDS = float(os.getenv("RAG_RELOAD_MIN_INTERVAL_SECONDS", "300"))
+
+# Singleton di processo: modello e indice vengono costruiti una sola volta, indipendentemente
+# dal framework (FastAPI o Streamlit) e dal thread che li richiede per primo.
+_embedding_model = None
+_model_lock = threading.Lock()
+_rag_service = None
+_service_lock = threading.Lock()
+# Stato dell'ultimo ricaricamento in background
+_reload_lock = threading.Lock()
+_reload_state = {"running": False, "started_at": None, "finished_at": None, "error": None}
+_last_reload_started = 0.0
+
+
+def _get_embedding_model():
+    global _embedding_model
+    if _embedding_model is None:
+        with _model_lock:
+            if _embedding_model is None:
+                from sentence_transformers import SentenceTransformer
+                print(f"  - Caricamento modello di embedding: {EMBEDDING_MODEL_NAME}")
+                _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _embedding_model
 
 class RAGService:
     """
@@ -17,14 +47,22 @@ class RAGService:
     crea un indice vettoriale in memoria con FAISS e permette di cercare corsi simili.
     """
     # La logica interna della classe rimane la stessa, cambiamo solo da dove carica i dati.
-    def __init__(self):
+    def __init__(self, model=None):
         print("Inizializzazione del RAG Service...")
-        self.model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        started = time.perf_counter()
+        # Il modello è condiviso a livello di processo: un reload ricostruisce solo l'indice
+        self.model = model or _get_embedding_model()
+        self.index_store = IndexStore(EMBEDDING_MODEL_NAME)
+        self.catalog_version = None
+        self.index_type = RAG_INDEX_TYPE
+        self.index_key = None
         # --- MODIFICA CHIAVE: Carichiamo i dati da MongoDB ---
         self.courses_data = self._load_courses_from_mongo()
         # Il resto del processo di indicizzazione rimane invariato
         self.index, self.course_map = self._build_index()
-        print("RAG Service inizializzato con successo.")
+        self.built_at = datetime.utcnow().isoformat()
+        self.build_seconds = round(time.perf_counter() - started, 2)
+        print(f"RAG Service inizializzato con successo in {self.build_seconds}s.")
 
     def _load_courses_from_mongo(self) -> list:
         """
@@ -40,7 +78,8 @@ class RAGService:
             print(f"  - Recupero corsi dalla collection '{COURSES_COLLECTION_NAME}' su MongoDB...")
             
             # find({}) recupera tutti i documenti. list(...) li converte in una lista di dizionari Python.
-            courses = list(collection.find({}))
+            # Ordinati per _id: la versione del catalogo non dipende dall'ordine di lettura
+            courses = list(collection.find({}).sort("_id", 1))
             
             if not courses:
                 print(f"  - ATTENZIONE: Nessun corso trovato nella collection '{COURSES_COLLECTION_NAME}'.")
@@ -52,36 +91,185 @@ class RAGService:
             return []
 
     def _build_index(self):
-        """Costruisce l'indice FAISS in memoria. Questa funzione non cambia."""
+        """
+        Carica l'indice salvato per la versione corrente del catalogo; se manca lo ricostruisce
+        ricalcolando solo gli embedding dei corsi nuovi o modificati, e lo salva.
+        """
         if not self.courses_data:
             return None, None
-        descriptions = [f"{course.get('Course Name', '')}. {course.get('Description', '')}" for course in self.courses_data]
-        print(f"  - Creazione embeddings per {len(descriptions)} corsi...")
-        embeddings = self.model.encode(descriptions, convert_to_tensor=False)
-        d = embeddings.shape[1]
-        index = faiss.IndexFlatL2(d)
-        index.add(np.array(embeddings, dtype=np.float32))
+        descriptions = [course_text(course) for course in self.courses_data]
+        keys = [course_key(course) for course in self.courses_data]
+        hashes = [content_hash(text) for text in descriptions]
+        self.catalog_version = catalog_version(keys, hashes)
         course_map = {i: course for i, course in enumerate(self.courses_data)}
-        print("  - Indice FAISS costruito in memoria.")
+
+        # Un file per versione del catalogo e tipo/parametri dell'indice
+        self.index_key = f"{self.catalog_version}_{index_spec(self.index_type, len(descriptions))}"
+
+        index = self.index_store.load_index(self.index_key)
+        if index is not None and index.ntotal == len(descriptions):
+            print(f"  - Indice FAISS caricato da file ({self.index_key}).")
+            return configure_search(index), course_map
+
+        embeddings = self._embed_incremental(descriptions, keys, hashes)
+        index = build_index(embeddings, self.index_type)
+        print(f"  - Indice FAISS costruito in memoria ({self.index_key}).")
+        self.index_store.save(self.index_key, index, embeddings, keys, hashes)
         return index, course_map
 
+    def _embed_incremental(self, descriptions: list, keys: list, hashes: list) -> np.ndarray:
+        """Embedding di tutti i corsi, riusando quelli salvati dei corsi con id e testo invariati"""
+        cached_meta, cached = self.index_store.load_embeddings()
+        cached_rows = {}
+        if cached_meta:
+            cached_rows = {(k, h): i for i, (k, h) in enumerate(zip(cached_meta["keys"], cached_meta["hashes"]))}
+
+        rows = [cached_rows.get((k, h)) for k, h in zip(keys, hashes)]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        print(f"  - Embeddings: {len(rows) - len(missing)} riusati, {len(missing)} da calcolare, "
+              f"{len(cached_rows) - (len(rows) - len(missing))} obsoleti (corsi rimossi o modificati).")
+
+        new_embeddings = None
+        if missing:
+            new_embeddings = np.asarray(self.model.encode([descriptions[i] for i in missing], convert_to_tensor=False), dtype=np.float32)
+        d = new_embeddings.shape[1] if new_embeddings is not None else cached.shape[1]
+        embeddings = np.empty((len(descriptions), d), dtype=np.float32)
+        for i, row in enumerate(rows):
+            if row is not None:
+                embeddings[i] = cached[row]
+        if missing:
+            embeddings[missing] = new_embeddings
+        return embeddings
+
     def search(self, query: str, k: int = 8) -> list:
-        """Esegue una ricerca di similarità sull'indice FAISS. Questa funzione non cambia."""
+        """Esegue una ricerca di similarità sull'indice FAISS."""
+        return self.search_many([query], k=k, deduplicate=False)[0]
+
+    def search_many(self, queries: list, k: int = 8, deduplicate: bool = True) -> list:
+        """
+        Ricerca di più query con un solo encode in batch e una sola index.search.
+        Restituisce una lista di risultati per query, nello stesso ordine.
+        Con 'deduplicate' ogni corso viene assegnato a una sola query, quella a cui è più
+        vicino; le altre ricevono i candidati successivi, fino a k corsi ciascuna.
+        """
+        if not queries:
+            return []
         if not self.index:
             print("Ricerca saltata: l'indice FAISS non è stato inizializzato.")
-            return []
-        query_embedding = self.model.encode([query])
-        distances, indices = self.index.search(np.array(query_embedding, dtype=np.float32), k)
-        results = [self.course_map[i] for i in indices[0]]
+            return [[] for _ in queries]
+        query_embeddings = np.asarray(self.model.encode(list(queries), convert_to_tensor=False), dtype=np.float32)
+        similarity = is_similarity(self.index)
+        if similarity:
+            query_embeddings = normalize(query_embeddings)
+        # Con la deduplica servono candidati di riserva per le query che perdono dei corsi
+        k_search = min(k * len(queries), self.index.ntotal) if deduplicate else k
+        distances, indices = self.index.search(query_embeddings, k_search)
+
+        if not deduplicate:
+            # FAISS restituisce -1 quando k supera il numero di corsi indicizzati
+            return [[self.course_map[i] for i in row if i in self.course_map] for row in indices]
+
+        # Con il coseno FAISS restituisce similarità: si ordinano per -similarità
+        candidates = sorted(
+            (-distance if similarity else distance, q, i)
+            for q, (row_distances, row_indices) in enumerate(zip(distances, indices))
+            for distance, i in zip(row_distances, row_indices)
+            if i in self.course_map
+        )
+        assigned = set()
+        results = [[] for _ in queries]
+        # Candidati in ordine di distanza crescente: i risultati di ogni query restano ordinati
+        for _, q, i in candidates:
+            if i not in assigned and len(results[q]) < k:
+                assigned.add(i)
+                results[q].append(self.course_map[i])
         return results
 
-@st.cache_resource
-def get_rag_service():
+    def status(self) -> dict:
+        return {
+            "loaded": True,
+            "courses": len(self.courses_data),
+            "indexed": self.index is not None,
+            "model": EMBEDDING_MODEL_NAME,
+            "catalog_version": self.catalog_version,
+            "index": self.index_key.split("_", 1)[1] if self.index_key else None,
+            "built_at": self.built_at,
+            "build_seconds": self.build_seconds,
+        }
+
+
+def get_rag_service() -> RAGService:
     """
-    Funzione factory cachata che crea e restituisce l'istanza di RAGService.
-    Questa è la funzione che viene chiamata dall'esterno, garantendo che il servizio
-    venga inizializzato una sola volta per sessione dell'app.
+    Restituisce l'istanza di RAGService del processo, creandola alla prima chiamata.
+    Thread-safe: richieste concorrenti attendono la stessa costruzione invece di duplicarla.
     """
-    print("Tentativo di ottenere l'istanza di RAGService...")
-    service = RAGService()
-    return service
\ No newline at end of file
+    global _rag_service
+    if _rag_service is None:
+        with _service_lock:
+            if _rag_service is None:
+                _rag_service = RAGService()
+    return _rag_service
+
+
+def reload_rag_service() -> RAGService:
+    """
+    Ricarica i corsi da MongoDB e ricostruisce l'indice, riusando il modello già caricato.
+    Il nuovo servizio sostituisce il precedente solo quando è pronto: le ricerche in corso
+    continuano sul vecchio indice.
+    """
+    global _rag_service
+    with _service_lock:
+        _rag_service = RAGService()
+    return _rag_service
+
+
+def warmup_rag_service(force: bool = False):
+    """Costruisce il servizio in un thread in background (se RAG_WARMUP o force); non blocca l'avvio"""
+    if not (RAG_WARMUP or force):
+        return
+
+    def _warmup():
+        try:
+            get_rag_service()
+        except Exception as e:
+            print(f"Avviso: warmup del RAG Service fallito: {e}")
+
+    threading.Thread(target=_warmup, name="rag-warmup", daemon=True).start()
+
+
+def start_rag_reload() -> tuple[bool, str | None]:
+    """
+    Avvia reload_rag_service in un thread in background. Restituisce (avviato, motivo del
+    rifiuto, in inglese perché restituito dall'API): non parte se un ricaricamento è già in
+    corso o se l'ultimo è iniziato da meno di RAG_RELOAD_MIN_INTERVAL_SECONDS.
+    """
+    global _last_reload_started
+    with _reload_lock:
+        if _reload_state["running"]:
+            return False, "A course index reload is already running"
+        wait = RAG_RELOAD_MIN_INTERVAL_SECONDS - (time.monotonic() - _last_reload_started)
+        if _last_reload_started and wait > 0:
+            return False, f"Course index reloaded recently, retry in {wait:.0f}s"
+        _last_reload_started = time.monotonic()
+        _reload_state.update({"running": True, "started_at": datetime.utcnow().isoformat(), "finished_at": None, "error": None})
+
+    def _reload():
+        error = None
+        try:
+            reload_rag_service()
+        except Exception as e:
+            print(f"Errore nel ricaricamento del RAG Service: {e}")
+            error = str(e)
+        with _reload_lock:
+            _reload_state.update({"running": False, "finished_at": datetime.utcnow().isoformat(), "error": error})
+
+    threading.Thread(target=_reload, name="rag-reload", daemon=True).start()
+    return True, None
+
+
+def rag_service_status() -> dict:
+    service = _rag_service
+    status = service.status() if service is not None else {"loaded": False}
+    with _reload_lock:
+        status["reload"] = dict(_reload_state)
+    return status
\ No newline at end of file
@@ -13,13 +13,16 @@ import base64
 from io import BytesIO
 import re
 
-def create_feedback_pdf(report_content: FinalReportContent, output_path: str, **kwargs):
+def create_feedback_pdf(report_content: FinalReportContent, **kwargs) -> bytes | None:
     """
-    Crea un file PDF completo, con tutte le sezioni, i grafici Base64
+    Crea il PDF completo, con tutte le sezioni, i grafici Base64
     e la formattazione corretta dei titoli.
+    Il documento viene generato in memoria: restituisce i byte del PDF (None in caso di errore),
+    il salvataggio è a carico del chiamante (services.artifact_store).
     """
-    print(f"Creazione del file PDF completo: {output_path}...")
-    doc = SimpleDocTemplate(output_path, rightMargin=inch, leftMargin=inch, topMargin=inch, bottomMargin=inch)
+    print(f"Creazione del PDF completo per {report_content.candidate_name}...")
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, rightMargin=inch, leftMargin=inch, topMargin=inch, bottomMargin=inch)
     
     # Definizione degli stili
     styles = getSampleStyleSheet()
@@ -124,6 +127,9 @@ def create_feedback_pdf(report_content: FinalReportContent, output_path: str, **
     # --- Costruzione Finale del PDF ---
     try:
         doc.build(story)
-        print(f"PDF creato con successo in '{output_path}'")
     except Exception as e:
-        print(f"Errore durante la creazione del PDF: {e}")
\ No newline at end of file
+        print(f"Errore durante la creazione del PDF: {e}")
+        return None
+    pdf_bytes = buffer.getvalue()
+    print(f"PDF creato con successo ({len(pdf_bytes) // 1024} KB)")
+    return pdf_bytes
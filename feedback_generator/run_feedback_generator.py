@@ -63,13 +63,16 @@ def run_feedback_pipeline(session_id: str) -> str | None:
     from .course_retriever.rag_service import get_rag_service
     rag_service = get_rag_service()
     
-    enriched_skill_families = []
+    queries = []
     for family in gap_analysis.skill_families:
         family_name, gap_names = family.skill_family_gap, [g.skill_gap for g in family.skill_gaps]
-        query = get_llm_response(create_query_refinement_prompt(family_name, gap_names), "gpt-4o-mini", "Sei un esperto di formazione.", temperature=0.1)
-        
-        retrieved_courses = rag_service.search(query, k=8)
+        queries.append(get_llm_response(create_query_refinement_prompt(family_name, gap_names), "gpt-4o-mini", "Sei un esperto di formazione.", temperature=0.1))
 
+    # Un solo encode e una sola ricerca per tutte le famiglie, senza corsi ripetuti
+    courses_by_family = rag_service.search_many(queries, k=8)
+
+    enriched_skill_families = []
+    for family, retrieved_courses in zip(gap_analysis.skill_families, courses_by_family):
         family_dict = family.model_dump()
         family_dict["suggested_courses"] = retrieved_courses 
         enriched_skill_families.append(family_dict)
@@ -151,24 +154,16 @@ def run_feedback_pipeline(session_id: str) -> str | None:
     
     # STEP 5: Generazione PDF. La chiamata è la stessa, ma il contenuto è diverso.
     print("\n[STEP 5/5] Generazione del file PDF...")
-    temp_dir = "temp_pdf"
-    os.makedirs(temp_dir, exist_ok=True)
-    temp_pdf_path = os.path.join(temp_dir, f"{session_id}.pdf")
-    create_feedback_pdf(
+    pdf_bytes = create_feedback_pdf(
         report_content=final_report_content,
-        output_path=temp_pdf_path,
         # Passiamo i dati che la funzione si aspetta ora:
         market_benchmark_text=qualitative_text,
         market_chart_categories_base64=chart_cat_b64,
         market_skills_list=market_skills_list 
     )
     
-    pdf_path = ""
-    if os.path.exists(temp_pdf_path):
-        with open(temp_pdf_path, "rb") as f:
-            pdf_bytes = f.read()
-        pdf_path = save_pdf_report(pdf_bytes, session_id)
-        os.remove(temp_pdf_path)
+    # Il PDF è generato in memoria e scritto una sola volta dallo store degli artifact
+    pdf_path = save_pdf_report(pdf_bytes, session_id) if pdf_bytes else ""
         
     print("--- [PIPELINE] Generazione Feedback completata. ---")
     return pdf_path
\ No newline at end of file
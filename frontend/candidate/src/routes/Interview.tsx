@@ -7,6 +7,10 @@ import { InterviewIntro } from '../components/InterviewIntro'
 import { SandboxArea } from '../components/SandboxArea'
 
 const API_BASE = import.meta.env.VITE_API_BASE || 'https://vertigo-ai-backend-tbia7kjh7a-oc.a.run.app'
+// Security events sent per request; keepalive flushes (page hide/unload) also stay under 64 KB
+const SECURITY_FLUSH_MAX_EVENTS = 200
+const SECURITY_KEEPALIVE_MAX_BYTES = 60 * 1024
+const jsonBytes = (value: unknown) => new TextEncoder().encode(JSON.stringify(value)).length
 
 // Text formatting component for better message rendering
 function FormattedMessage({ content }: { content: string }) {
@@ -158,6 +162,55 @@ export function Interview() {
     resetTranscript
   } = useSpeechRecognition('it-IT')
 
+  // Security events are buffered and sent in batches (flush contract: backend services/security_service.py)
+  const securityBuffer = useRef<any[]>([])
+
+  const flushSecurityEvents = async (keepalive = false) => {
+    if (!token || securityBuffer.current.length === 0) return
+    // keepalive requests are limited by the browser to 64 KB of body in flight
+    const maxBytes = keepalive ? SECURITY_KEEPALIVE_MAX_BYTES : Infinity
+    const events: any[] = []
+    let size = jsonBytes({ events: [] })
+    for (const event of securityBuffer.current.slice(0, SECURITY_FLUSH_MAX_EVENTS)) {
+      const eventSize = jsonBytes(event) + 1
+      if (events.length > 0 && size + eventSize > maxBytes) break
+      events.push(event)
+      size += eventSize
+    }
+    securityBuffer.current.splice(0, events.length)
+    try {
+      const res = await fetch(`${API_BASE}/interviews/${token}/security-events`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ events }),
+        keepalive
+      })
+      // Server errors and rate limiting: keep the events for the next flush
+      if (res.status >= 500 || res.status === 429) {
+        securityBuffer.current.unshift(...events)
+      }
+    } catch (err) {
+      console.error('Failed to report security events:', err)
+      securityBuffer.current.unshift(...events)
+    }
+  }
+
+  useEffect(() => {
+    const interval = setInterval(() => flushSecurityEvents(), 5000)
+    const handlePageHide = () => flushSecurityEvents(true)
+    const handleVisibility = () => {
+      if (document.visibilityState === 'hidden') flushSecurityEvents(true)
+    }
+    window.addEventListener('pagehide', handlePageHide)
+    document.addEventListener('visibilitychange', handleVisibility)
+    return () => {
+      clearInterval(interval)
+      window.removeEventListener('pagehide', handlePageHide)
+      document.removeEventListener('visibilitychange', handleVisibility)
+      flushSecurityEvents(true)
+    }
+  }, [token])
+
   // Anti-cheat system
   const antiCheat = useAntiCheat({
     maxTabSwitches: 3,
@@ -166,16 +219,11 @@ export function Interview() {
     maxWindowResizes: 10,
     warningThreshold: 3,
     sessionId: token || '',
-    onCheatingDetected: async (event) => {
-      // Send cheating event to backend
-      try {
-        await fetch(`${API_BASE}/interviews/${token}/security-event`, {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify(event)
-        })
-      } catch (err) {
-        console.error('Failed to report security event:', err)
+    onCheatingDetected: (event) => {
+      // Queue cheating event for the backend; high severity events are sent right away
+      securityBuffer.current.push(event)
+      if (event.severity === 'high' || securityBuffer.current.length >= 20) {
+        flushSecurityEvents()
       }
     }
   })
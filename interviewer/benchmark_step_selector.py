@@ -0,0 +1,109 @@
+# interviewer/benchmark_step_selector.py
+"""
+Benchmark offline delle politiche di selezione del prossimo step.
+
+Per ogni caso simula il percorso del colloquio: a ogni transizione tutte le politiche scelgono
+a partire dallo stesso stato (step già svolti), si confrontano le scelte con la politica di
+riferimento e si misura la latenza. Come 'ultima risposta' del candidato si usa la descrizione
+dello step appena concluso, in assenza di conversazioni reali.
+
+Esempi:
+    python -m interviewer.benchmark_step_selector --cases-file all_cases.json
+    python -m interviewer.benchmark_step_selector --position-id pos_123 --with-llm
+"""
+import argparse
+import json
+import time
+
+from . import step_selector
+from .llm_service import AZURE_DEPLOYMENT_NAME
+from .embeddings import get_embedding_model
+
+
+def _steps_of_case(case: dict) -> dict:
+    return {step["id"]: step for step in case.get("reasoning_steps", [])}
+
+
+def _decide(policy: str, available: list, completed: list, last_answer: str) -> int | None:
+    if policy == "llm":
+        history_text = "\n".join(f"assistant: {s.get('description', '')}\nuser: {s.get('description', '')}" for s in completed)
+        return step_selector.select_llm(available, history_text, AZURE_DEPLOYMENT_NAME)
+    return step_selector.select_next_step_local(policy, available, completed, last_answer)
+
+
+def benchmark_cases(cases: list, policies: list, reference: str) -> dict:
+    stats = {p: {"decisions": 0, "agreements": 0, "seconds": 0.0} for p in policies}
+    for case in cases:
+        steps = _steps_of_case(case)
+        if not steps:
+            continue
+        # Il percorso segue la politica di riferimento, partendo dallo step 0 come nel chatbot
+        current_id = min(steps)
+        completed_ids = set()
+        while True:
+            completed_ids.add(current_id)
+            available = [s for sid, s in steps.items() if sid not in completed_ids]
+            if not available:
+                break
+            completed = [s for sid, s in steps.items() if sid in completed_ids]
+            last_answer = steps[current_id].get("description", "")
+
+            choices = {}
+            for policy in policies:
+                start = time.perf_counter()
+                choices[policy] = _decide(policy, available, completed, last_answer)
+                stats[policy]["seconds"] += time.perf_counter() - start
+                stats[policy]["decisions"] += 1
+            for policy in policies:
+                if choices[policy] == choices[reference]:
+                    stats[policy]["agreements"] += 1
+            current_id = choices[reference]
+    return stats
+
+
+def _load_cases(args) -> list:
+    if args.cases_file:
+        with open(args.cases_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data.get("cases", data) if isinstance(data, dict) else data
+    from services.position_cache import get_position_context
+    position_context = get_position_context(args.position_id, args.collection)
+    if not position_context:
+        raise SystemExit(f"Posizione '{args.position_id}' non trovata in '{args.collection}'.")
+    return position_context.cases
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Confronta le politiche di selezione del prossimo step.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--cases-file", help="JSON con i casi ('all_cases' o lista di casi)")
+    source.add_argument("--position-id", help="Carica i casi della posizione da MongoDB")
+    parser.add_argument("--collection", default="positions_data")
+    parser.add_argument("--with-llm", action="store_true", help="Include la politica 'llm' (chiamate reali al modello)")
+    parser.add_argument("--reference", default=None, help="Politica di riferimento (default: 'llm' se inclusa, altrimenti 'ordered')")
+    parser.add_argument("--no-embedding", action="store_true", help="Esclude la politica 'embedding'")
+    args = parser.parse_args()
+
+    policies = ["ordered", "skill_coverage"]
+    if not args.no_embedding:
+        policies.append("embedding")
+    if args.with_llm:
+        policies.append("llm")
+    reference = args.reference or ("llm" if args.with_llm else "ordered")
+    if reference not in policies:
+        raise SystemExit(f"La politica di riferimento '{reference}' non è tra quelle confrontate: {policies}")
+
+    if "embedding" in policies:
+        # Il caricamento del modello non va conteggiato nella latenza per decisione
+        try:
+            get_embedding_model()
+        except Exception as e:
+            print(f"[ATTENZIONE] Modello di embedding non disponibile ({e}): 'embedding' userà il fallback.")
+
+    results = benchmark_cases(_load_cases(args), policies, reference)
+    print(f"\nRiferimento: {reference}")
+    print(f"{'politica':<16}{'decisioni':>10}{'accordo':>10}{'ms/decisione':>14}")
+    for policy, s in results.items():
+        agreement = s["agreements"] / s["decisions"] if s["decisions"] else 0.0
+        latency_ms = 1000 * s["seconds"] / s["decisions"] if s["decisions"] else 0.0
+        print(f"{policy:<16}{s['decisions']:>10}{agreement:>10.0%}{latency_ms:>14.1f}")
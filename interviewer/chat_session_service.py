@@ -2,31 +2,72 @@ import random
 from typing import Optional, Dict, Any
 
 from services.data_manager import (
-    get_single_position_data_from_db,
+    db,
+    SESSIONS_COLLECTION_NAME,
     save_stage_output,
     get_session_data,
 )
 from services.tenant_data_manager import (
-    get_single_position_data_tenant,
     save_stage_output_tenant,
     get_session_data_tenant,
 )
 from services.tenant_service import get_tenant_collections
+from services.position_cache import get_position_context
 from services.interview_config_service import get_interview_config_or_default
 from .chatbot import SmartCaseStudyChatbot
 
 
 _SESSION_CHATBOTS: dict[str, SmartCaseStudyChatbot] = {}
+# Ultimo stato del chatbot salvato per sessione: ai messaggi successivi si scrivono solo i campi cambiati
+_PERSISTED_STATES: dict[str, dict] = {}
 
 
-def initialize_chatbot_for_session(session_id: str, tenant_id: str = None) -> Optional[Dict[str, Any]]:
+def _save_session_stage(session_id: str, stage_name: str, data_content, tenant_id: str = None):
+    if tenant_id:
+        save_stage_output_tenant(session_id, stage_name, data_content, get_tenant_collections(tenant_id)["sessions"])
+    else:
+        save_stage_output(session_id, stage_name, data_content)
+
+
+def _persist_chatbot_state(session_id: str, bot: SmartCaseStudyChatbot, tenant_id: str = None, full: bool = False):
+    """
+    Salva lo stato del chatbot, così che possa essere ricostruito da qualsiasi istanza del backend.
+    Dopo il primo salvataggio (o con 'full') vengono scritti solo i campi cambiati: in un turno
+    tipico il contatore dei tentativi, mai gli step e il testo del caso.
+    """
+    state = bot.to_dict()
+    previous = None if full else _PERSISTED_STATES.get(session_id)
+    if previous is None:
+        _save_session_stage(session_id, "chatbot_state", state, tenant_id)
+        _PERSISTED_STATES[session_id] = state
+        return
+    changed = {key: value for key, value in state.items() if previous.get(key) != value}
+    if not changed or db is None:
+        return
+    collection_name = get_tenant_collections(tenant_id)["sessions"] if tenant_id else SESSIONS_COLLECTION_NAME
+    try:
+        db[collection_name].update_one(
+            {"_id": session_id},
+            {"$set": {f"stages.chatbot_state.{key}": value for key, value in changed.items()}},
+        )
+        _PERSISTED_STATES[session_id] = state
+    except Exception as e:
+        print(f"Errore durante il salvataggio dello stato del chatbot ({', '.join(changed)}): {e}")
+
+
+def initialize_chatbot_for_session(session_id: str, tenant_id: str = None, prewarm: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Crea il chatbot della sessione su un caso casuale della posizione.
+    Con 'prewarm' genera anche il messaggio di apertura e salva lo stato serializzato,
+    in modo che l'avvio del colloquio da parte del candidato sia una semplice lettura.
+    """
     if tenant_id:
         collections = get_tenant_collections(tenant_id)
         sess = get_session_data_tenant(session_id, collections["sessions"])
         position_id = sess.get("position_id") if sess else None
         if not position_id:
             return None
-        position_data = get_single_position_data_tenant(position_id, collections["positions"])
+        position_context = get_position_context(position_id, collections["positions"])
     else:
         # Fallback to global collections for backward compatibility
         sess = get_session_data(session_id)
@@ -35,13 +76,13 @@ def initialize_chatbot_for_session(session_id: str, tenant_id: str = None) -> Op
         position_id = sess.get("position_id")
         if not position_id:
             return None
-        position_data = get_single_position_data_from_db(position_id)
+        position_context = get_position_context(position_id)
     
-    if not position_data:
+    if not position_context:
         return None
+    position_data = position_context.document
 
     all_cases = (position_data or {}).get("all_cases", {}).get("cases", [])
-    all_criteria = (position_data or {}).get("all_criteria", {}).get("criteria_sets", [])
     if not all_cases:
         return None
 
@@ -50,12 +91,8 @@ def initialize_chatbot_for_session(session_id: str, tenant_id: str = None) -> Op
     if not selected_case_id:
         return None
 
-    selected_criteria_set = next((c for c in all_criteria if c.get("question_id") == selected_case_id), None)
-    steps_dict = {step["id"]: step for step in selected_case.get("reasoning_steps", [])}
-    for criterion in (selected_criteria_set or {}).get("accomplishment_criteria", []):
-        sid = criterion.get("step_id")
-        if sid in steps_dict:
-            steps_dict[sid]["criteria"] = criterion.get("criteria")
+    # Steps con i criteri già uniti (copia privata: il documento in cache è condiviso)
+    steps_dict = position_context.steps_for_case(selected_case_id)
 
     # Recupera configurazione intervista per il tenant
     if tenant_id:
@@ -75,36 +112,58 @@ def initialize_chatbot_for_session(session_id: str, tenant_id: str = None) -> Op
         max_attempts=max_attempts,
         max_questions=max_questions,
     )
+    if prewarm:
+        chatbot.start_interview()
     _SESSION_CHATBOTS[session_id] = chatbot
 
     seniority = position_data.get("seniority_level", "Mid-Level")
-    if tenant_id:
-        collections = get_tenant_collections(tenant_id)
-        save_stage_output_tenant(session_id, "case_id", selected_case_id, collections["sessions"])
-        save_stage_output_tenant(session_id, "seniority_level", seniority, collections["sessions"])
-    else:
-        save_stage_output(session_id, "case_id", selected_case_id)
-        save_stage_output(session_id, "seniority_level", seniority)
-    return {"case_id": selected_case_id, "seniority_level": seniority}
+    _save_session_stage(session_id, "case_id", selected_case_id, tenant_id)
+    _save_session_stage(session_id, "seniority_level", seniority, tenant_id)
+    _persist_chatbot_state(session_id, chatbot, tenant_id, full=True)
+    return {"case_id": selected_case_id, "seniority_level": seniority, "prewarmed": prewarm}
 
 
-def _get_chatbot(session_id: str) -> SmartCaseStudyChatbot | None:
-    return _SESSION_CHATBOTS.get(session_id)
+def _get_chatbot(session_id: str, tenant_id: str = None) -> SmartCaseStudyChatbot | None:
+    """Chatbot in memoria o, se assente (riavvio, altra istanza), ricostruito dallo stato salvato."""
+    bot = _SESSION_CHATBOTS.get(session_id)
+    if bot:
+        return bot
+    if tenant_id:
+        sess = get_session_data_tenant(session_id, get_tenant_collections(tenant_id)["sessions"])
+    else:
+        sess = get_session_data(session_id)
+    stages = (sess or {}).get("stages", {})
+    state = stages.get("chatbot_state")
+    if not state:
+        return None
+    bot = SmartCaseStudyChatbot.from_dict(state, stages.get("conversation"))
+    print(f"[INFO] Chatbot della sessione {session_id} ricostruito dallo stato salvato.")
+    restored = _SESSION_CHATBOTS.setdefault(session_id, bot)
+    if restored is bot:
+        _PERSISTED_STATES[session_id] = state
+    return restored
 
 
 def start_interview_for_session(session_id: str, tenant_id: str = None) -> str:
-    bot = _get_chatbot(session_id)
+    bot = _get_chatbot(session_id, tenant_id)
     if not bot:
-        meta = initialize_chatbot_for_session(session_id, tenant_id)
+        meta = initialize_chatbot_for_session(session_id, tenant_id, prewarm=True)
         if not meta:
             raise ValueError("Chatbot not initialized")
-        bot = _get_chatbot(session_id)
-    message = bot.start_interview()
+        bot = _get_chatbot(session_id, tenant_id)
+    # Messaggio di apertura già generato in fase di prepare: nessuna chiamata LLM
+    if bot.conversation_history:
+        message = bot.conversation_history[0]["content"]
+    else:
+        message = bot.start_interview()
+    if not bot.opening_delivered:
+        bot.opening_delivered = True
+        _persist_chatbot_state(session_id, bot, tenant_id)
     return message
 
 
 def send_message_for_session(session_id: str, text: str, tenant_id: str = None) -> str:
-    bot = _get_chatbot(session_id)
+    bot = _get_chatbot(session_id, tenant_id)
     if not bot:
         raise ValueError("Chatbot not initialized")
     
@@ -113,12 +172,9 @@ def send_message_for_session(session_id: str, text: str, tenant_id: str = None)
     
     reply = bot.process_user_response(text)
     
-    # Persist rolling conversation
-    if tenant_id:
-        collections = get_tenant_collections(tenant_id)
-        save_stage_output_tenant(session_id, "conversation", bot.conversation_history, collections["sessions"])
-    else:
-        save_stage_output(session_id, "conversation", bot.conversation_history)
+    # Persist rolling conversation and chatbot state
+    _save_session_stage(session_id, "conversation", bot.conversation_history, tenant_id)
+    _persist_chatbot_state(session_id, bot, tenant_id)
     
     # If interview just finished, trigger automatic evaluation in background
     if not was_finished and bot.is_finished:
@@ -129,27 +185,17 @@ def send_message_for_session(session_id: str, text: str, tenant_id: str = None)
         def run_evaluation_background():
             try:
                 # Import here to avoid circular imports
-                from corrector.run_final_evaluation import execute_case_evaluation
-                from corrector.skill_relevance_scorer import compute_and_save_skill_relevance
+                from corrector.run_post_interview import run_post_interview_evaluation
                 
                 # Add a small delay to ensure database consistency
                 import time
                 time.sleep(2)  # Wait 2 seconds for database to be consistent
                 
-                # Run evaluation with tenant_id if available
-                if tenant_id:
-                    eval_success = execute_case_evaluation(session_id=session_id, tenant_id=tenant_id)
-                else:
-                    eval_success = execute_case_evaluation(session_id=session_id)
+                # Case evaluation and skill relevance scoring run concurrently
+                eval_success = run_post_interview_evaluation(session_id=session_id, tenant_id=tenant_id)
                     
                 if eval_success:
-                    print(f"Case evaluation completed for session {session_id}")
-                    # Run skill relevance scoring with tenant_id if available
-                    if tenant_id:
-                        compute_and_save_skill_relevance(session_id=session_id, tenant_id=tenant_id)
-                    else:
-                        compute_and_save_skill_relevance(session_id=session_id)
-                    print(f"Skill relevance scoring completed for session {session_id}")
+                    print(f"Case evaluation and skill relevance scoring completed for session {session_id}")
                 else:
                     print(f"Case evaluation failed for session {session_id}")
             except Exception as e:
@@ -164,15 +210,17 @@ def send_message_for_session(session_id: str, text: str, tenant_id: str = None)
 
 
 def get_interview_state(session_id: str, tenant_id: str = None) -> Dict[str, Any]:
-    bot = _get_chatbot(session_id)
+    bot = _get_chatbot(session_id, tenant_id)
     if not bot:
         raise ValueError("Chatbot not initialized")
     remaining = bot.max_questions - bot.questions_asked_count
+    # Before /start the prewarmed opening message is not part of the visible conversation
+    conversation = bot.conversation_history if bot.opening_delivered else []
     return {
         "finished": bot.is_finished,
         "remaining_questions": remaining,
-        "history_len": len(bot.conversation_history),
-        "conversation": bot.conversation_history,  # Include full conversation for frontend
+        "history_len": len(conversation),
+        "conversation": conversation,  # Include full conversation for frontend
     }
 
 
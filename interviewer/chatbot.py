@@ -2,28 +2,197 @@
 from interviewer.llm_service import AZURE_DEPLOYMENT_NAME
 from .llm_service import get_llm_response
 from . import prompts
+from . import step_selector
+from .input_classifier import get_input_classifier, llm_is_question
+from .transcript import ConversationTranscript
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# Memoria a rotazione: gli step conclusi vengono sostituiti nei prompt da una sintesi
+CHATBOT_ROLLING_MEMORY = os.getenv("CHATBOT_ROLLING_MEMORY", "true").lower() in ("1", "true", "yes")
+CHATBOT_SUMMARY_MAX_TOKENS = int(os.getenv("CHATBOT_SUMMARY_MAX_TOKENS", "300"))
+
+# Selezione speculativa: il prossimo step viene scelto in background mentre l'LLM valuta la risposta.
+# Attiva solo con CHATBOT_STEP_SELECTOR=llm: con le politiche locali (default 'skill_coverage')
+# la selezione non fa chiamate di rete e non c'è nulla da anticipare. Costa al massimo una
+# chiamata di selezione in più per step (vedi SmartCaseStudyChatbot._speculate_next_step).
+CHATBOT_SPECULATIVE_SELECTION = os.getenv("CHATBOT_SPECULATIVE_SELECTION", "true").lower() in ("1", "true", "yes")
+
+# Pool condiviso per le sintesi generate in background dopo ogni cambio di step
+_summary_executor = ThreadPoolExecutor(max_workers=int(os.getenv("CHATBOT_SUMMARY_WORKERS", "4")), thread_name_prefix="step-summary")
+_speculation_executor = ThreadPoolExecutor(max_workers=int(os.getenv("CHATBOT_SPECULATION_WORKERS", "4")), thread_name_prefix="step-speculation")
+
 class SmartCaseStudyChatbot:
     # --- CONFIGURAZIONE DEI MODELLI ---
     INTERVIEWER_MODEL = AZURE_DEPLOYMENT_NAME
     CLASSIFICATION_MODEL = AZURE_DEPLOYMENT_NAME 
 
-    def __init__(self, steps: dict, case_title: str, case_text: str, case_id: str, max_attempts: int = 5, max_questions: int = 10):
+    def __init__(self, steps: dict, case_title: str, case_text: str, case_id: str, max_attempts: int = 5, max_questions: int = 10, step_selection_policy: str | None = None):
         self.steps = steps
         self.case_title = case_title
         self.case_text = case_text
         self.case_id = case_id
         self.max_attempts = max_attempts
         self.max_questions = max_questions
+        self.step_selection_policy = step_selection_policy or step_selector.DEFAULT_STEP_SELECTOR
+        if self.step_selection_policy not in step_selector.SELECTOR_POLICIES:
+            print(f"[ATTENZIONE] Politica di selezione '{self.step_selection_policy}' sconosciuta, uso 'skill_coverage'.")
+            self.step_selection_policy = "skill_coverage"
         self.questions_asked_count = 0
         self.current_step_id = None
         self.completed_step_ids = set()
         self.attempts_on_current_step = 0
-        self.conversation_history = []
+        self.transcript = ConversationTranscript()
         self.is_finished = False
+        # Il messaggio di apertura può essere generato in anticipo (prepare) e mostrato solo all'avvio
+        self.opening_delivered = False
+        # Step conclusi: (step_id, inizio, fine) nel transcript e sintesi in preparazione/pronte
+        self.step_segments = []
+        self.step_summaries = {}
+        self._summary_futures = {}
+        # Selezione speculativa del prossimo step: (stato dello step, future) e statistiche d'uso
+        self._speculation = None
+        self._speculated_step_id = None
+        self.speculation_stats = {"hits": 0, "misses": 0}
+
+    @property
+    def conversation_history(self) -> list:
+        """Lista dei messaggi (role/content), condivisa con il transcript."""
+        return self.transcript.messages
+
+    def to_dict(self) -> dict:
+        """
+        Stato serializzabile (MongoDB) del chatbot, senza i messaggi: la conversazione viene
+        salvata a parte nello stage 'conversation'. Gli step sono una lista perché le chiavi
+        dei documenti MongoDB devono essere stringhe.
+        """
+        for step_id, _, _ in self.step_segments:
+            self._step_summary(step_id)
+        opening = self.conversation_history[0]["content"] if self.conversation_history else None
+        return {
+            "steps": list(self.steps.values()),
+            "case_title": self.case_title,
+            "case_text": self.case_text,
+            "case_id": self.case_id,
+            "max_attempts": self.max_attempts,
+            "max_questions": self.max_questions,
+            "step_selection_policy": self.step_selection_policy,
+            "questions_asked_count": self.questions_asked_count,
+            "current_step_id": self.current_step_id,
+            "completed_step_ids": sorted(self.completed_step_ids),
+            "attempts_on_current_step": self.attempts_on_current_step,
+            "is_finished": self.is_finished,
+            "opening_message": opening,
+            "opening_delivered": self.opening_delivered,
+            "step_start_index": self.transcript.step_start_index,
+            "step_segments": [list(segment) for segment in self.step_segments],
+            "step_summaries": [{"step_id": sid, "summary": text} for sid, text in self.step_summaries.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict, messages: list | None = None) -> "SmartCaseStudyChatbot":
+        """Ricostruisce il chatbot da to_dict() e dalla conversazione salvata."""
+        bot = cls(
+            steps={step["id"]: step for step in state.get("steps", [])},
+            case_title=state.get("case_title", ""),
+            case_text=state.get("case_text", ""),
+            case_id=state.get("case_id"),
+            max_attempts=state.get("max_attempts", 5),
+            max_questions=state.get("max_questions", 10),
+            step_selection_policy=state.get("step_selection_policy"),
+        )
+        bot.questions_asked_count = state.get("questions_asked_count", 0)
+        bot.current_step_id = state.get("current_step_id")
+        bot.completed_step_ids = set(state.get("completed_step_ids", []))
+        bot.attempts_on_current_step = state.get("attempts_on_current_step", 0)
+        bot.is_finished = state.get("is_finished", False)
+        bot.opening_delivered = state.get("opening_delivered", True)
+        if messages:
+            bot.transcript.messages.extend(messages)
+        elif state.get("opening_message"):
+            bot.transcript.append("assistant", state["opening_message"])
+        bot.transcript.step_start_index = state.get("step_start_index", 0)
+        bot.step_segments = [tuple(segment) for segment in state.get("step_segments", [])]
+        bot.step_summaries = {item["step_id"]: item["summary"] for item in state.get("step_summaries", [])}
+        # Le sintesi non ancora pronte al momento del salvataggio vengono rigenerate
+        if CHATBOT_ROLLING_MEMORY:
+            for step_id, start, end in bot.step_segments:
+                if step_id not in bot.step_summaries and end > start:
+                    outcome = "completato" if step_id in bot.completed_step_ids else "concluso"
+                    bot._summary_futures[step_id] = _summary_executor.submit(
+                        bot._summarize_step, step_id, outcome, bot.transcript.range_text(start, end)
+                    )
+        return bot
+
+    def _close_step_segment(self, step_id: int, outcome: str):
+        """Chiude il segmento dello step corrente e ne avvia la sintesi in background."""
+        start, end = self.transcript.mark_step_start()
+        self.step_segments.append((step_id, start, end))
+        if CHATBOT_ROLLING_MEMORY and end > start:
+            self._summary_futures[step_id] = _summary_executor.submit(
+                self._summarize_step, step_id, outcome, self.transcript.range_text(start, end)
+            )
+
+    def _summarize_step(self, step_id: int, outcome: str, step_transcript: str) -> str | None:
+        step_info = self.steps.get(step_id, {})
+        skills_str = ", ".join([s.get('skill_name', '') for s in step_info.get('skills_to_test', []) if s.get('skill_name')])
+        prompt = prompts.create_step_summary_prompt(
+            f"{step_info.get('title', 'N/D')} ({outcome})",
+            skills_str,
+            step_transcript
+        )
+        summary = get_llm_response(
+            prompt=prompt,
+            model=self.INTERVIEWER_MODEL,
+            system_prompt="Sei un assistente che sintetizza colloqui in modo fedele e conciso.",
+            temperature=0.0,
+            max_tokens=CHATBOT_SUMMARY_MAX_TOKENS
+        )
+        if not summary or summary.startswith("Errore"):
+            print(f"[ATTENZIONE] Sintesi dello step {step_id} non disponibile, verrà usata la conversazione completa.")
+            return None
+        return summary.strip()
+
+    def _step_summary(self, step_id: int) -> str | None:
+        """Sintesi dello step se pronta; non attende mai il completamento della chiamata."""
+        if step_id in self.step_summaries:
+            return self.step_summaries[step_id]
+        future = self._summary_futures.get(step_id)
+        if future is None or not future.done():
+            return None
+        try:
+            summary = future.result()
+        except Exception as e:
+            print(f"[ATTENZIONE] Errore nella sintesi dello step {step_id}: {e}")
+            summary = None
+        self._summary_futures.pop(step_id, None)
+        if summary:
+            self.step_summaries[step_id] = summary
+        return summary
+
+    def _memory_history_text(self) -> str:
+        """
+        Storico da inserire nei prompt: sintesi degli step conclusi + conversazione integrale
+        dello step corrente. Gli step la cui sintesi non è ancora pronta restano in forma integrale.
+        """
+        if not CHATBOT_ROLLING_MEMORY or not self.step_segments:
+            return self.transcript.text
+        sections = []
+        for step_id, start, end in self.step_segments:
+            if end <= start:
+                continue
+            title = self.steps.get(step_id, {}).get('title', 'N/D')
+            summary = self._step_summary(step_id)
+            if summary:
+                sections.append(f"Step '{title}' (sintesi):\n{summary}")
+            else:
+                sections.append(f"Step '{title}' (conversazione):\n{self.transcript.range_text(start, end)}")
+        return (
+            "[SINTESI DEGLI STEP PRECEDENTI]\n" + "\n\n".join(sections)
+            + "\n\n[CONVERSAZIONE DELLO STEP CORRENTE]\n" + self.transcript.since_step_start()
+        )
 
     def _save_conversation_history(self):
         output_dir = "output"
@@ -54,25 +223,21 @@ class SmartCaseStudyChatbot:
             system_prompt=prompts.SYSTEM_PROMPT,
             temperature=0.7
         )
-        self.conversation_history.append({"role": "assistant", "content": initial_message})
+        self.transcript.append("assistant", initial_message)
         return initial_message
 
     def _is_user_input_a_question(self, user_input: str) -> bool:
-        prompt = prompts.create_input_classification_prompt(user_input)
-        response = get_llm_response(
-            prompt=prompt,
-            model=self.CLASSIFICATION_MODEL, 
-            system_prompt="Sei un classificatore di testo estremamente preciso e letterale. Il tuo unico scopo è restituire una delle due opzioni fornite.",
-            temperature=0.0,
-            max_tokens=10
-        )
-        return "DOMANDA_SUL_CASO" in response.upper()
+        """Classificatore locale; l'LLM viene interrogato solo se la confidenza è bassa."""
+        return get_input_classifier().classify(user_input, self._llm_is_user_input_a_question)
+
+    def _llm_is_user_input_a_question(self, user_input: str) -> bool:
+        return llm_is_question(user_input, self.CLASSIFICATION_MODEL)
 
     def _answer_candidate_question(self, user_question: str) -> str:
         self.questions_asked_count += 1
         remaining_q = self.max_questions - self.questions_asked_count
         current_step_info = self.steps[self.current_step_id]
-        history_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in self.conversation_history])
+        history_text = self._memory_history_text()
         answer_prompt = prompts.create_answer_to_candidate_question_prompt(
             case_text=self.case_text,
             current_step_description=current_step_info.get('description', ''),
@@ -90,7 +255,7 @@ class SmartCaseStudyChatbot:
     def process_user_response(self, user_input: str) -> str:
         if self.is_finished:
             return "Il colloquio è terminato. Grazie per la tua partecipazione! Riceverai l'esito appena avremo valutato il tuo esercizio"
-        self.conversation_history.append({"role": "user", "content": user_input})
+        self.transcript.append("user", user_input)
         if self._is_user_input_a_question(user_input):
             if self.questions_asked_count < self.max_questions:
                 response = self._answer_candidate_question(user_input)
@@ -98,6 +263,8 @@ class SmartCaseStudyChatbot:
                 response = "Hai esaurito le domande a tua disposizione. Per favore, procedi ora con la tua analisi."
         else:
             self.attempts_on_current_step += 1
+            # La scelta del prossimo step procede in parallelo alla valutazione dello step corrente
+            self._speculate_next_step()
             is_step_accomplished = self._evaluate_step_completion()
             if is_step_accomplished:
                 self.completed_step_ids.add(self.current_step_id)
@@ -108,12 +275,12 @@ class SmartCaseStudyChatbot:
                     response = self._conclude_step_and_transition()
                 else:
                     response = self._provide_guidance()
-        self.conversation_history.append({"role": "assistant", "content": response})
+        self.transcript.append("assistant", response)
         return response
 
     def _evaluate_step_completion(self) -> bool:
         current_step = self.steps[self.current_step_id]
-        history_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in self.conversation_history[-8:]])
+        history_text = self.transcript.last_k(8)
 
         # Contesto + Criterio + Skill da verificare
         step_full_context = f"Titolo: {current_step.get('title', 'N/D')}\nDescrizione: {current_step.get('description', 'N/D')}"
@@ -135,49 +302,94 @@ class SmartCaseStudyChatbot:
         )
         return "TRUE" in evaluation.upper()
 
-    def _select_next_step(self) -> int | None:
-        available_steps = [step for id, step in self.steps.items() if id not in self.completed_step_ids]
+    def _speculation_key(self) -> tuple:
+        """
+        Stato da cui dipende la scelta del prossimo step alla chiusura dello step corrente:
+        step corrente, step conclusi e lunghezza del transcript su cui la scelta è stata fatta.
+        """
+        return (self.current_step_id, frozenset(self.completed_step_ids | {self.current_step_id}), len(self.transcript))
+
+    def _speculate_next_step(self):
+        """
+        Avvia in background la scelta del prossimo step, assumendo che lo step corrente venga
+        chiuso (completato o per tentativi esauriti), mentre l'LLM valuta l'ultima risposta del
+        candidato. La scelta vede lo stesso transcript della selezione sincrona: se nel frattempo
+        cambia (nuovi messaggi o step), il risultato viene scartato.
+        Serve solo alla politica 'llm' (CHATBOT_STEP_SELECTOR=llm): le politiche locali, incluso
+        il default 'skill_coverage', non fanno chiamate di rete e non usano la speculazione.
+
+        Quando i tentativi sono esauriti lo step si chiude di sicuro e la scelta anticipata
+        sostituisce quella sincrona. Negli altri turni la chiusura dipende dalla valutazione:
+        si anticipa una sola volta per step, così le chiamate di selezione sprecate sono al
+        massimo una per step.
+        """
+        if not CHATBOT_SPECULATIVE_SELECTION or self.is_finished or self.step_selection_policy != "llm":
+            return
+        closes_for_sure = self.attempts_on_current_step >= self.max_attempts
+        if not closes_for_sure and self._speculated_step_id == self.current_step_id:
+            return
+        key = self._speculation_key()
+        if self._speculation and self._speculation[0] == key:
+            return
+        self._speculated_step_id = self.current_step_id
+        if self._speculation:
+            self._speculation[1].cancel()
+        history_text = self._memory_history_text()
+        future = _speculation_executor.submit(self._select_next_step, key[1], history_text)
+        self._speculation = (key, future)
+
+    def _next_step_after_current(self) -> int | None:
+        """Prossimo step dopo la chiusura di quello corrente, usando la speculazione se ancora valida."""
+        speculation, self._speculation = self._speculation, None
+        if speculation and speculation[0] == self._speculation_key():
+            try:
+                next_step_id = speculation[1].result()
+                self.speculation_stats["hits"] += 1
+                return next_step_id
+            except Exception as e:
+                print(f"[ATTENZIONE] Selezione speculativa del prossimo step fallita: {e}")
+        elif speculation:
+            # Scelta fatta su uno stato superato: scartata
+            speculation[1].cancel()
+        if CHATBOT_SPECULATIVE_SELECTION and self.step_selection_policy == "llm":
+            self.speculation_stats["misses"] += 1
+        return self._select_next_step()
+
+    def _select_next_step(self, completed_ids: frozenset | None = None, history_text: str | None = None) -> int | None:
+        completed_ids = self.completed_step_ids if completed_ids is None else completed_ids
+        available_steps = [step for id, step in self.steps.items() if id not in completed_ids]
         if not available_steps: 
             return None
-        history_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in self.conversation_history])
-        # Includi anche le skill per ogni step tra le opzioni
-        def _skills(step):
-            return ", ".join([s.get('skill_name', '') for s in step.get('skills_to_test', []) if s.get('skill_name')]) or "N/D"
-        options_text = "\n".join([f"ID: {s['id']}, Titolo: {s['title']}, Skill: {_skills(s)}" for s in available_steps])
-        prompt = prompts.create_next_step_selection_prompt(options_text, history_text)
-        try:
-            next_id_str = get_llm_response(
-                prompt=prompt, model=self.INTERVIEWER_MODEL,
-                system_prompt="Sei un assistente logico.",
-                temperature=0.1, max_tokens=5
-            )
-            next_id = int(''.join(filter(str.isdigit, next_id_str)))
-            valid_ids = [s['id'] for s in available_steps]
-            return next_id if next_id in valid_ids else available_steps[0]['id']
-        except (ValueError, IndexError): 
-            return available_steps[0]['id']
+        if self.step_selection_policy != "llm":
+            completed_steps = [step for id, step in self.steps.items() if id in completed_ids]
+            last_answer = next((m['content'] for m in reversed(self.conversation_history) if m['role'] == 'user'), "")
+            return step_selector.select_next_step_local(self.step_selection_policy, available_steps, completed_steps, last_answer)
+        if history_text is None:
+            history_text = self._memory_history_text()
+        return step_selector.select_llm(available_steps, history_text, self.INTERVIEWER_MODEL)
 
     def _transition_to_next_step(self):
-        next_step_id = self._select_next_step()
+        next_step_id = self._next_step_after_current()
         if next_step_id is None:
             self.is_finished = True
             self._save_conversation_history()
             return prompts.SUCCESSFUL_FINISH_MESSAGE
         current_step_info = self.steps[self.current_step_id]
         next_step_info = self.steps[next_step_id]
-        history_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in self.conversation_history])
+        history_text = self._memory_history_text()
         prompt = prompts.create_successful_transition_prompt(
             current_step_info.get('title', ''),
             next_step_info.get('title', ''),
             next_step_info.get('description', ''),
             history_text
         )
+        self._close_step_segment(self.current_step_id, "completato")
         self.current_step_id = next_step_id
         self.attempts_on_current_step = 0
         return get_llm_response(prompt=prompt, model=self.INTERVIEWER_MODEL, system_prompt=prompts.SYSTEM_PROMPT)
 
     def _conclude_step_and_transition(self):
-        next_step_id = self._select_next_step()
+        next_step_id = self._next_step_after_current()
         if next_step_id is None:
             self.is_finished = True
             self._save_conversation_history()
@@ -187,7 +399,7 @@ class SmartCaseStudyChatbot:
         next_step_info = self.steps[next_step_id]
 
         skills_str = ", ".join([s.get('skill_name', '') for s in current_step_info.get('skills_to_test', [])])
-        history_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in self.conversation_history])
+        history_text = self._memory_history_text()
 
         prompt = prompts.create_failed_transition_prompt(
             current_step_info.get('title', ''),
@@ -197,13 +409,14 @@ class SmartCaseStudyChatbot:
             next_step_info.get('description', ''),
             history_text
         )
+        self._close_step_segment(self.current_step_id, "concluso per tentativi esauriti")
         self.current_step_id = next_step_id
         self.attempts_on_current_step = 0
         return get_llm_response(prompt=prompt, model=self.INTERVIEWER_MODEL, system_prompt=prompts.SYSTEM_PROMPT)
 
     def _provide_guidance(self):
         current_step_info = self.steps[self.current_step_id]
-        history_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in self.conversation_history])
+        history_text = self._memory_history_text()
 
         skills_str = ", ".join([s.get('skill_name', '') for s in current_step_info.get('skills_to_test', [])])
 
@@ -0,0 +1,38 @@
+# interviewer/embeddings.py
+"""Modello di embedding locale condiviso dai componenti del chatbot (caricato alla prima richiesta)."""
+import os
+import threading
+
+INTERVIEWER_EMBEDDING_MODEL = os.getenv("INTERVIEWER_EMBEDDING_MODEL", "paraphrase-multilingual-mpnet-base-v2")
+# Caricamento del modello all'avvio dell'API, così il primo turno di colloquio non lo attende
+INTERVIEWER_EMBEDDING_WARMUP = os.getenv("INTERVIEWER_EMBEDDING_WARMUP", "true").lower() in ("1", "true", "yes")
+
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+
+def get_embedding_model():
+    """Restituisce il modello sentence-transformers; solleva un'eccezione se non disponibile."""
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_model_lock:
+            if _embedding_model is None:
+                from sentence_transformers import SentenceTransformer
+                print(f"[INFO] Caricamento modello di embedding del chatbot: {INTERVIEWER_EMBEDDING_MODEL}")
+                _embedding_model = SentenceTransformer(INTERVIEWER_EMBEDDING_MODEL)
+    return _embedding_model
+
+
+def warmup_embedding_model(force: bool = False):
+    """Carica il modello in un thread in background (se INTERVIEWER_EMBEDDING_WARMUP o force); non blocca l'avvio"""
+    if not (INTERVIEWER_EMBEDDING_WARMUP or force):
+        return
+
+    def _warmup():
+        try:
+            # Una prima codifica inizializza anche tokenizer e runtime, non solo i pesi
+            get_embedding_model().encode(["warmup"], normalize_embeddings=True)
+        except Exception as e:
+            print(f"[ATTENZIONE] Warmup del modello di embedding del chatbot fallito: {e}")
+
+    threading.Thread(target=_warmup, name="interviewer-embedding-warmup", daemon=True).start()
@@ -0,0 +1,113 @@
+# interviewer/evaluate_input_classifier.py
+"""
+Valutazione del classificatore locale domanda/risposta su conversazioni salvate.
+
+Le etichette vengono ricavate dalla risposta del chatbot al messaggio del candidato: se
+contiene il contatore delle domande ("Hai ancora N domande a disposizione") o l'avviso
+"Hai esaurito le domande", il messaggio era stato trattato come domanda sul caso. Le
+etichette riflettono quindi le decisioni del classificatore LLM in produzione.
+
+Esempi:
+    python -m interviewer.evaluate_input_classifier --limit 500
+    python -m interviewer.evaluate_input_classifier --tenant-id acme --export esempi.json
+    python -m interviewer.evaluate_input_classifier --dataset esempi.json --with-llm
+"""
+import argparse
+import json
+import re
+import time
+
+from .input_classifier import InputClassifier, INPUT_CLASSIFIER_MIN_CONFIDENCE, QUESTION_LABEL, ANSWER_LABEL, llm_is_question
+from .llm_service import AZURE_DEPLOYMENT_NAME
+
+_QUESTION_MARKERS = re.compile(r"Hai ancora \d+ domande a disposizione|Hai esaurito le domande", re.IGNORECASE)
+
+
+def build_labelled_dataset(conversations: list) -> list:
+    """Coppie {text, label} dai messaggi del candidato seguiti da una risposta del chatbot."""
+    dataset = []
+    for conversation in conversations:
+        for message, reply in zip(conversation, conversation[1:]):
+            if message.get("role") != "user" or reply.get("role") != "assistant":
+                continue
+            text = (message.get("content") or "").strip()
+            if not text:
+                continue
+            label = QUESTION_LABEL if _QUESTION_MARKERS.search(reply.get("content") or "") else ANSWER_LABEL
+            dataset.append({"text": text, "label": label})
+    return dataset
+
+
+def load_conversations(tenant_id: str | None = None, limit: int = 0) -> list:
+    from services.data_manager import db, SESSIONS_COLLECTION_NAME
+    from services.tenant_service import get_tenant_collections
+    if db is None:
+        raise SystemExit("Database non disponibile.")
+    collection_name = get_tenant_collections(tenant_id)["sessions"] if tenant_id else SESSIONS_COLLECTION_NAME
+    cursor = db[collection_name].find({"stages.conversation.0": {"$exists": True}}, {"stages.conversation": 1})
+    if limit:
+        cursor = cursor.limit(limit)
+    return [s["stages"]["conversation"] for s in cursor]
+
+
+def evaluate(dataset: list, classifier: InputClassifier, with_llm: bool = False) -> dict:
+    """Accuratezza del classificatore locale, tasso di escalation e (opzionale) accordo con l'LLM."""
+    results = {"examples": len(dataset), "correct": 0, "confident": 0, "confident_correct": 0,
+               "tp": 0, "fp": 0, "fn": 0, "local_seconds": 0.0, "llm_correct": 0, "llm_agreements": 0}
+    for example in dataset:
+        expected = example["label"] == QUESTION_LABEL
+        start = time.perf_counter()
+        predicted, confidence = classifier.classify_local(example["text"])
+        results["local_seconds"] += time.perf_counter() - start
+
+        results["correct"] += int(predicted == expected)
+        results["tp"] += int(predicted and expected)
+        results["fp"] += int(predicted and not expected)
+        results["fn"] += int(expected and not predicted)
+        if confidence >= INPUT_CLASSIFIER_MIN_CONFIDENCE:
+            results["confident"] += 1
+            results["confident_correct"] += int(predicted == expected)
+        if with_llm:
+            llm_prediction = llm_is_question(example["text"], AZURE_DEPLOYMENT_NAME)
+            results["llm_correct"] += int(llm_prediction == expected)
+            results["llm_agreements"] += int(llm_prediction == predicted)
+    return results
+
+
+def _print_report(results: dict, with_llm: bool):
+    n = results["examples"] or 1
+    precision = results["tp"] / ((results["tp"] + results["fp"]) or 1)
+    recall = results["tp"] / ((results["tp"] + results["fn"]) or 1)
+    print(f"\nEsempi valutati: {results['examples']}")
+    print(f"Accuratezza locale (tutti i messaggi): {results['correct'] / n:.1%}")
+    print(f"Domande - precisione: {precision:.1%}, recall: {recall:.1%}")
+    print(f"Decisi localmente (confidenza >= {INPUT_CLASSIFIER_MIN_CONFIDENCE}): {results['confident'] / n:.1%}, "
+          f"accuratezza {results['confident_correct'] / (results['confident'] or 1):.1%}")
+    print(f"Escalation all'LLM: {(results['examples'] - results['confident']) / n:.1%}")
+    print(f"Latenza media locale: {1000 * results['local_seconds'] / n:.1f} ms")
+    if with_llm:
+        print(f"Accuratezza LLM: {results['llm_correct'] / n:.1%}, accordo locale/LLM: {results['llm_agreements'] / n:.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Valuta il classificatore locale domanda/risposta.")
+    parser.add_argument("--dataset", help="JSON di esempi etichettati (in alternativa alle sessioni su MongoDB)")
+    parser.add_argument("--tenant-id", default=None)
+    parser.add_argument("--limit", type=int, default=0, help="Numero massimo di sessioni da leggere")
+    parser.add_argument("--export", help="Salva il dataset etichettato (utilizzabile come INPUT_CLASSIFIER_EXAMPLES)")
+    parser.add_argument("--with-llm", action="store_true", help="Confronta anche con il classificatore LLM (chiamate reali)")
+    args = parser.parse_args()
+
+    if args.dataset:
+        with open(args.dataset, "r", encoding="utf-8") as f:
+            labelled = json.load(f)
+    else:
+        labelled = build_labelled_dataset(load_conversations(args.tenant_id, args.limit))
+
+    if args.export:
+        with open(args.export, "w", encoding="utf-8") as f:
+            json.dump(labelled, f, ensure_ascii=False, indent=2)
+        print(f"Dataset etichettato salvato in {args.export} ({len(labelled)} esempi)")
+
+    # Valuta senza gli esempi esterni, per non misurare il classificatore sui suoi stessi dati
+    _print_report(evaluate(labelled, InputClassifier(examples_path=""), args.with_llm), args.with_llm)
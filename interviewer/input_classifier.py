@@ -0,0 +1,251 @@
+# interviewer/input_classifier.py
+"""
+Classificazione locale dei messaggi del candidato: domanda sul caso o risposta/analisi.
+
+La decisione combina regole lessicali (punto interrogativo, forme interrogative, lunghezza)
+con la similarità, calcolata con il modello di embedding del chatbot, rispetto a esempi di
+domande e di risposte. Gli esempi di base possono essere estesi con un file di esempi
+etichettati (vedi evaluate_input_classifier.py --export). Se la confidenza è sotto soglia
+la decisione passa all'LLM, come prima.
+
+Una frazione delle decisioni locali viene verificata in background con l'LLM per misurare
+l'accordo tra i due classificatori, senza aggiungere latenza al turno.
+"""
+import json
+import math
+import os
+import random
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from .embeddings import get_embedding_model
+from .llm_service import get_llm_response
+from . import prompts
+
+QUESTION_LABEL = "DOMANDA_SUL_CASO"
+ANSWER_LABEL = "RISPOSTA"
+
+# Attiva la classificazione locale (false = sempre LLM, comportamento originale)
+INPUT_CLASSIFIER_LOCAL = os.getenv("INPUT_CLASSIFIER_LOCAL", "true").lower() in ("1", "true", "yes")
+# Confidenza minima per decidere localmente; sotto soglia si interroga l'LLM
+INPUT_CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("INPUT_CLASSIFIER_MIN_CONFIDENCE", "0.75"))
+# Frazione delle decisioni locali verificate in background con l'LLM
+INPUT_CLASSIFIER_AUDIT_RATE = float(os.getenv("INPUT_CLASSIFIER_AUDIT_RATE", "0.05"))
+# Ogni quante classificazioni stampare le metriche
+INPUT_CLASSIFIER_LOG_EVERY = int(os.getenv("INPUT_CLASSIFIER_LOG_EVERY", "50"))
+# File JSON opzionale di esempi etichettati: [{"text": ..., "label": "DOMANDA_SUL_CASO" | "RISPOSTA"}]
+INPUT_CLASSIFIER_EXAMPLES = os.getenv("INPUT_CLASSIFIER_EXAMPLES", "")
+# Pendenza della sigmoide applicata alla differenza di similarità domanda/risposta
+_EMBEDDING_SCALE = 12.0
+
+_QUESTION_PROTOTYPES = [
+    "Posso avere qualche dato in più sul mercato?",
+    "Quali sono i costi fissi dell'azienda?",
+    "Abbiamo informazioni sui competitor?",
+    "Qual è il budget a disposizione del cliente?",
+    "Potresti chiarire cosa si intende per margine in questo caso?",
+    "Ci sono vincoli di tempo per il progetto?",
+    "Mi puoi dire quanti clienti ha l'azienda oggi?",
+    "È disponibile il dettaglio dei ricavi per canale?",
+]
+_ANSWER_PROTOTYPES = [
+    "Secondo me il problema principale è il calo dei margini, quindi analizzerei prima la struttura dei costi.",
+    "Proporrei di segmentare i clienti per valore e di concentrare gli investimenti sui segmenti più profittevoli.",
+    "Il mercato vale circa 200 milioni, con una quota del 10% otteniamo 20 milioni di ricavi.",
+    "Come prima cosa verificherei i dati storici, poi costruirei un modello di previsione.",
+    "Ok, allora ipotizzo una crescita del 5% annuo e procedo con il calcolo.",
+    "Credo che la soluzione migliore sia esternalizzare la logistica per ridurre i costi.",
+    "I rischi principali sono la reazione dei competitor e i tempi di implementazione.",
+    "In sintesi, raccomando di lanciare il prodotto nel nord Italia in una prima fase pilota.",
+]
+
+_INTERROGATIVE_START = re.compile(
+    r"^(posso|possiamo|potrei|potresti|puoi|può|puo|quale|quali|qual|quanto|quanti|quante|quanta|come|cosa|che cosa|"
+    r"chi|dove|quando|perché|perche|ci sono|c'è|c'e|è possibile|e' possibile|avete|abbiamo|hai|sai|esiste|esistono|"
+    r"mi (dai|date|dici|puoi|potresti|sai)|vorrei sapere|vorrei chiedere|avrei una domanda)\b",
+    re.IGNORECASE,
+)
+
+
+def llm_is_question(user_input: str, model: str) -> bool:
+    """Classificazione tramite LLM (una chiamata di rete)."""
+    prompt = prompts.create_input_classification_prompt(user_input)
+    response = get_llm_response(
+        prompt=prompt,
+        model=model,
+        system_prompt="Sei un classificatore di testo estremamente preciso e letterale. Il tuo unico scopo è restituire una delle due opzioni fornite.",
+        temperature=0.0,
+        max_tokens=10
+    )
+    return QUESTION_LABEL in response.upper()
+
+
+def _rule_probability(text: str) -> float:
+    """Probabilità (euristica) che il messaggio sia una domanda sul caso."""
+    words = len(text.split())
+    interrogative = bool(_INTERROGATIVE_START.match(text))
+    if text.endswith("?"):
+        if interrogative:
+            return 0.9
+        # Un '?' finale da solo non basta: anche risposte brevi lo usano ("Quindi circa il 20%?")
+        return 0.65 if words <= 40 else 0.55
+    if "?" in text:
+        return 0.55 if interrogative else 0.4
+    if interrogative:
+        return 0.55
+    return 0.1 if words >= 8 else 0.3
+
+
+class InputClassifier:
+    """Classificatore domanda/risposta con escalation all'LLM e metriche di accordo."""
+
+    def __init__(self, examples_path: str = INPUT_CLASSIFIER_EXAMPLES):
+        self.examples_path = examples_path
+        self._centroids = None
+        self._embeddings_available = True
+        self._init_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._audit_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="input-classifier-audit")
+        self.metrics = {
+            "total": 0, "local": 0, "escalated": 0,
+            "escalated_agreements": 0, "audited": 0, "audit_agreements": 0,
+        }
+
+    def _load_examples(self) -> tuple:
+        questions, answers = list(_QUESTION_PROTOTYPES), list(_ANSWER_PROTOTYPES)
+        if self.examples_path and os.path.exists(self.examples_path):
+            try:
+                with open(self.examples_path, "r", encoding="utf-8") as f:
+                    for example in json.load(f):
+                        target = questions if example.get("label") == QUESTION_LABEL else answers
+                        target.append(example.get("text", ""))
+                print(f"[INFO] Classificatore input: caricati esempi etichettati da {self.examples_path}")
+            except Exception as e:
+                print(f"[ATTENZIONE] Impossibile leggere gli esempi del classificatore ({self.examples_path}): {e}")
+        return [q for q in questions if q], [a for a in answers if a]
+
+    def _get_centroids(self):
+        """Centroidi normalizzati degli esempi di domanda e di risposta (None se embedding non disponibili)."""
+        if self._centroids is None and self._embeddings_available:
+            with self._init_lock:
+                if self._centroids is None and self._embeddings_available:
+                    try:
+                        model = get_embedding_model()
+                        questions, answers = self._load_examples()
+                        centroids = []
+                        for texts in (questions, answers):
+                            centroid = model.encode(texts, normalize_embeddings=True).mean(axis=0)
+                            centroids.append(centroid / (float((centroid @ centroid)) ** 0.5))
+                        self._centroids = tuple(centroids)
+                    except Exception as e:
+                        print(f"[ATTENZIONE] Embedding non disponibili per il classificatore input ({e}): uso solo le regole.")
+                        self._embeddings_available = False
+        return self._centroids
+
+    def _probabilities(self, text: str) -> tuple:
+        """(probabilità dalle regole, probabilità dagli embedding o None se non disponibili)"""
+        p_rules = _rule_probability(text)
+        centroids = self._get_centroids()
+        if centroids is None:
+            return p_rules, None
+        vector = get_embedding_model().encode([text], normalize_embeddings=True)[0]
+        margin = float(vector @ centroids[0]) - float(vector @ centroids[1])
+        return p_rules, 1.0 / (1.0 + math.exp(-_EMBEDDING_SCALE * margin))
+
+    def question_probability(self, text: str) -> float:
+        text = (text or "").strip()
+        if not text:
+            return 0.0
+        p_rules, p_embedding = self._probabilities(text)
+        return p_rules if p_embedding is None else (p_rules + p_embedding) / 2
+
+    def classify_local(self, text: str) -> tuple:
+        """
+        Restituisce (è_domanda, confidenza) senza chiamate di rete.
+        Una domanda consuma il budget di domande del candidato: viene decisa localmente solo
+        se anche gli embedding la indicano come tale, altrimenti la confidenza è nulla e la
+        decisione passa all'LLM.
+        """
+        text = (text or "").strip()
+        if not text:
+            return False, 1.0
+        p_rules, p_embedding = self._probabilities(text)
+        p = p_rules if p_embedding is None else (p_rules + p_embedding) / 2
+        if p >= 0.5 and p_embedding is not None and p_embedding < 0.5:
+            return True, 0.5
+        return p >= 0.5, max(p, 1.0 - p)
+
+    def classify(self, text: str, llm_classify: Callable[[str], bool]) -> bool:
+        """
+        Decide localmente se la confidenza è sufficiente, altrimenti chiede all'LLM
+        ('llm_classify' restituisce True se il messaggio è una domanda sul caso).
+        """
+        if not INPUT_CLASSIFIER_LOCAL:
+            return llm_classify(text)
+        try:
+            is_question, confidence = self.classify_local(text)
+        except Exception as e:
+            print(f"[ATTENZIONE] Classificazione locale fallita ({e}), uso l'LLM.")
+            return llm_classify(text)
+
+        if confidence < INPUT_CLASSIFIER_MIN_CONFIDENCE:
+            llm_is_question = llm_classify(text)
+            self._record(escalated=True, agreement=llm_is_question == is_question)
+            return llm_is_question
+
+        self._record(escalated=False)
+        if INPUT_CLASSIFIER_AUDIT_RATE > 0 and random.random() < INPUT_CLASSIFIER_AUDIT_RATE:
+            self._audit_executor.submit(self._audit, text, is_question, llm_classify)
+        return is_question
+
+    def _audit(self, text: str, local_is_question: bool, llm_classify: Callable[[str], bool]):
+        try:
+            agreement = llm_classify(text) == local_is_question
+        except Exception as e:
+            print(f"[ATTENZIONE] Verifica del classificatore input fallita: {e}")
+            return
+        with self._metrics_lock:
+            self.metrics["audited"] += 1
+            self.metrics["audit_agreements"] += int(agreement)
+
+    def _record(self, escalated: bool, agreement: Optional[bool] = None):
+        with self._metrics_lock:
+            self.metrics["total"] += 1
+            if escalated:
+                self.metrics["escalated"] += 1
+                self.metrics["escalated_agreements"] += int(bool(agreement))
+            else:
+                self.metrics["local"] += 1
+            should_log = INPUT_CLASSIFIER_LOG_EVERY > 0 and self.metrics["total"] % INPUT_CLASSIFIER_LOG_EVERY == 0
+        if should_log:
+            self.log_metrics()
+
+    def metrics_snapshot(self) -> dict:
+        with self._metrics_lock:
+            m = dict(self.metrics)
+        m["local_rate"] = m["local"] / m["total"] if m["total"] else 0.0
+        m["audit_agreement_rate"] = m["audit_agreements"] / m["audited"] if m["audited"] else None
+        m["escalated_agreement_rate"] = m["escalated_agreements"] / m["escalated"] if m["escalated"] else None
+        return m
+
+    def log_metrics(self):
+        m = self.metrics_snapshot()
+        audit = f"{m['audit_agreement_rate']:.0%} su {m['audited']}" if m["audited"] else "n/d"
+        low_conf = f"{m['escalated_agreement_rate']:.0%}" if m["escalated"] else "n/d"
+        print(f"[METRICHE] Classificatore input: {m['total']} messaggi, locali {m['local_rate']:.0%}, "
+              f"escalation {m['escalated']} (accordo a bassa confidenza {low_conf}), accordo verificato con LLM {audit}")
+
+
+_classifier: Optional[InputClassifier] = None
+_classifier_lock = threading.Lock()
+
+
+def get_input_classifier() -> InputClassifier:
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = InputClassifier()
+    return _classifier
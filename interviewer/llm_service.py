@@ -1,7 +1,13 @@
 import os
+import time
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
 from openai import AzureOpenAI
 from dotenv import load_dotenv
-from typing import Optional
+from typing import Callable, Optional
 
 # Carica le variabili dal file .env se presente (per lo sviluppo locale)
 load_dotenv()
@@ -27,6 +33,94 @@ else:
         azure_endpoint=AZURE_ENDPOINT
     )
 
+# Budget (per processo) delle chiamate LLM dei job batch: data-prep di più posizioni,
+# ri-valutazione in blocco e preparazione delle sessioni create in blocco. Le chiamate dei
+# colloqui in corso non passano da questo budget, così un job batch non rallenta un candidato.
+# Concorrenza massima e richieste al minuto (0 = nessun limite).
+LLM_BATCH_MAX_CONCURRENCY = int(os.getenv("LLM_BATCH_MAX_CONCURRENCY", "4"))
+LLM_BATCH_MAX_REQUESTS_PER_MINUTE = int(os.getenv("LLM_BATCH_MAX_REQUESTS_PER_MINUTE", "0"))
+
+class LLMRateGovernor:
+    """
+    Regola l'accesso al servizio LLM per i thread che condividono un budget: limita le
+    chiamate in volo e, se configurato, il numero di richieste avviate nell'ultimo minuto.
+    """
+    def __init__(self, max_concurrency: int, max_requests_per_minute: int = 0):
+        self._semaphore = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._max_rpm = max_requests_per_minute
+        self._lock = threading.Lock()
+        self._request_times = deque()
+
+    def _wait_for_rate_budget(self):
+        if self._max_rpm <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._request_times and now - self._request_times[0] >= 60:
+                    self._request_times.popleft()
+                if len(self._request_times) < self._max_rpm:
+                    self._request_times.append(now)
+                    return
+                wait_seconds = 60 - (now - self._request_times[0])
+            time.sleep(max(wait_seconds, 0.05))
+
+    @contextmanager
+    def slot(self):
+        """Attende il budget di richieste al minuto, poi uno slot libero, e lo rilascia al termine della chiamata."""
+        # L'attesa del rate limit avviene prima di occupare lo slot, per non bloccare chi è già in regola
+        self._wait_for_rate_budget()
+        with self._semaphore:
+            yield
+
+batch_llm_governor = LLMRateGovernor(LLM_BATCH_MAX_CONCURRENCY, LLM_BATCH_MAX_REQUESTS_PER_MINUTE)
+
+# Budget attivo per il contesto corrente (None = chiamata interattiva, nessun limite)
+_active_llm_budget: ContextVar[Optional[LLMRateGovernor]] = ContextVar("active_llm_budget", default=None)
+
+@contextmanager
+def batch_llm_budget():
+    """
+    Sottopone al budget dei job batch le chiamate LLM eseguite nel blocco. I task avviati
+    su altri thread lo ereditano solo se sottomessi tramite bind_llm_budget.
+    """
+    token = _active_llm_budget.set(batch_llm_governor)
+    try:
+        yield
+    finally:
+        _active_llm_budget.reset(token)
+
+def bind_llm_budget(fn: Callable) -> Callable:
+    """
+    Restituisce 'fn' legata al budget LLM del thread chiamante, da usare quando la si
+    sottomette a un executor (i ThreadPoolExecutor non propagano il contesto).
+    """
+    budget = _active_llm_budget.get()
+    if budget is None:
+        return fn
+
+    @functools.wraps(fn)
+    def run_with_budget(*args, **kwargs):
+        token = _active_llm_budget.set(budget)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _active_llm_budget.reset(token)
+    return run_with_budget
+
+def _llm_call_slot():
+    budget = _active_llm_budget.get()
+    return budget.slot() if budget is not None else nullcontext()
+
+def estimate_tokens(text: str) -> int:
+    """
+    Stima approssimativa dei token di un testo (~4 caratteri per token).
+    Serve per il budgeting dei prompt senza dipendere da un tokenizer esterno.
+    """
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
 def get_llm_response(prompt: str, model: str, system_prompt: str, **kwargs) -> str:
     """
     Invia un prompt per una risposta testuale semplice.
@@ -40,11 +134,12 @@ def get_llm_response(prompt: str, model: str, system_prompt: str, **kwargs) -> s
         {"role": "user", "content": prompt}
     ]
     try:
-        response = client.chat.completions.create(
-            model=AZURE_DEPLOYMENT_NAME,  # Usa il deployment name per Azure
-            messages=messages,
-            **kwargs 
-        )
+        with _llm_call_slot():
+            response = client.chat.completions.create(
+                model=AZURE_DEPLOYMENT_NAME,  # Usa il deployment name per Azure
+                messages=messages,
+                **kwargs 
+            )
         return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"Errore nella chiamata LLM testuale: {e}")
@@ -104,7 +199,8 @@ def get_structured_llm_response(
         
     try:
         # Usiamo l'unpacking del dizionario (**) per passare tutti gli argomenti
-        response = client.chat.completions.create(**api_kwargs)
+        with _llm_call_slot():
+            response = client.chat.completions.create(**api_kwargs)
         
         if response.choices and response.choices[0].message.tool_calls:
             arguments = response.choices[0].message.tool_calls[0].function.arguments
@@ -120,5 +120,21 @@ def create_answer_to_candidate_question_prompt(case_text: str, current_step_desc
         "Formula la tua risposta."
     )
 
+def create_step_summary_prompt(step_title: str, skills_to_test: str, step_transcript: str) -> str:
+    """Crea il prompt per sintetizzare uno step concluso (memoria a lungo termine del colloquio)."""
+    return (
+        "Sintetizza la parte di colloquio relativa a uno step appena concluso. La sintesi sostituirà la conversazione originale "
+        "nei prompt successivi, quindi deve conservare tutto ciò che serve per proseguire il colloquio in modo coerente.\n"
+        "Rispondi ESCLUSIVAMENTE con questa struttura, in modo conciso (massimo 150 parole):\n"
+        "- Esito: completato / concluso per tentativi esauriti\n"
+        "- Argomenti e proposte del candidato: ...\n"
+        "- Evidenze sulle skill (uso interno): ...\n"
+        "- Lacune emerse: ...\n"
+        "- Dati e informazioni forniti dall'intervistatore (da mantenere coerenti): ...\n\n"
+        f"Step: '{step_title}'\n"
+        f"Skill target: [{skills_to_test or 'N/D'}]\n\n"
+        f"--- Conversazione dello Step ---\n{step_transcript}"
+    )
+
 SUCCESSFUL_FINISH_MESSAGE = "Ottimo, direi che abbiamo toccato tutti i punti chiave. La tua analisi è stata molto completa. Grazie mille per il tuo tempo, il colloquio è terminato. Adesso procederemo a valutare il tuo esercizio, per poi ritornare da te con un responso."
 FORCED_FINISH_MESSAGE = "Ok, direi che per questo punto possiamo fermarci qui. Grazie comunque per le tue riflessioni. Il colloquio è concluso."
\ No newline at end of file
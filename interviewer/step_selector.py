@@ -0,0 +1,104 @@
+# interviewer/step_selector.py
+"""
+Politiche di selezione del prossimo step del caso.
+
+- ordered: il primo step non ancora svolto, nell'ordine del caso;
+- skill_coverage: lo step che copre più skill non ancora testate (a parità, l'ordine del caso);
+- embedding: lo step semanticamente più vicino all'ultima risposta del candidato;
+- llm: la scelta viene delegata al modello (una chiamata di rete in più a ogni transizione,
+  anticipata in background dalla selezione speculativa del chatbot, CHATBOT_SPECULATIVE_SELECTION).
+
+Le politiche locali non fanno chiamate di rete; 'embedding' carica un modello
+sentence-transformers alla prima richiesta e ripiega su 'skill_coverage' se non disponibile.
+La politica di default è 'skill_coverage' (CHATBOT_STEP_SELECTOR): la selezione speculativa
+si applica quindi solo a chi imposta CHATBOT_STEP_SELECTOR=llm.
+"""
+import os
+
+from .llm_service import get_llm_response
+from .embeddings import get_embedding_model
+from . import prompts
+
+SELECTOR_POLICIES = ("ordered", "skill_coverage", "embedding", "llm")
+DEFAULT_STEP_SELECTOR = os.getenv("CHATBOT_STEP_SELECTOR", "skill_coverage").lower()
+
+_step_embedding_cache = {}
+
+
+def step_skills(step: dict) -> list:
+    return [s.get('skill_name', '') for s in step.get('skills_to_test', []) if s.get('skill_name')]
+
+
+def _normalize(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+def _step_text(step: dict) -> str:
+    return f"{step.get('title', '')}. {step.get('description', '')} Skill: {', '.join(step_skills(step))}"
+
+
+def select_ordered(available_steps: list) -> int | None:
+    return available_steps[0]['id'] if available_steps else None
+
+
+def select_skill_coverage(available_steps: list, completed_steps: list) -> int | None:
+    """Sceglie lo step con più skill non ancora testate negli step già svolti."""
+    if not available_steps:
+        return None
+    tested = {_normalize(name) for step in completed_steps for name in step_skills(step)}
+    best_id, best_score = None, -1
+    for step in available_steps:
+        score = len({_normalize(name) for name in step_skills(step)} - tested)
+        if score > best_score:
+            best_id, best_score = step['id'], score
+    return best_id
+
+
+def select_embedding(available_steps: list, last_answer: str) -> int | None:
+    """Sceglie lo step la cui descrizione è più simile all'ultima risposta del candidato."""
+    if not available_steps:
+        return None
+    if not (last_answer or "").strip():
+        return select_ordered(available_steps)
+    model = get_embedding_model()
+    texts = [_step_text(step) for step in available_steps]
+    missing = [t for t in texts if t not in _step_embedding_cache]
+    if missing:
+        if len(_step_embedding_cache) > 4096:
+            _step_embedding_cache.clear()
+        for text, vector in zip(missing, model.encode(missing, normalize_embeddings=True)):
+            _step_embedding_cache[text] = vector
+    answer_vector = model.encode([last_answer], normalize_embeddings=True)[0]
+    scores = [float(_step_embedding_cache[t] @ answer_vector) for t in texts]
+    return available_steps[scores.index(max(scores))]['id']
+
+
+def select_llm(available_steps: list, history_text: str, model: str) -> int | None:
+    """Selezione tramite LLM (comportamento originale), con fallback sul primo step disponibile."""
+    if not available_steps:
+        return None
+    options_text = "\n".join([f"ID: {s['id']}, Titolo: {s['title']}, Skill: {', '.join(step_skills(s)) or 'N/D'}" for s in available_steps])
+    prompt = prompts.create_next_step_selection_prompt(options_text, history_text)
+    try:
+        next_id_str = get_llm_response(
+            prompt=prompt, model=model,
+            system_prompt="Sei un assistente logico.",
+            temperature=0.1, max_tokens=5
+        )
+        next_id = int(''.join(filter(str.isdigit, next_id_str)))
+        valid_ids = [s['id'] for s in available_steps]
+        return next_id if next_id in valid_ids else available_steps[0]['id']
+    except (ValueError, IndexError):
+        return available_steps[0]['id']
+
+
+def select_next_step_local(policy: str, available_steps: list, completed_steps: list, last_answer: str = "") -> int | None:
+    """Applica una politica locale ('ordered', 'skill_coverage', 'embedding')."""
+    if policy == "ordered":
+        return select_ordered(available_steps)
+    if policy == "embedding":
+        try:
+            return select_embedding(available_steps, last_answer)
+        except Exception as e:
+            print(f"[ATTENZIONE] Selezione per embedding non disponibile ({e}), uso 'skill_coverage'.")
+    return select_skill_coverage(available_steps, completed_steps)
@@ -0,0 +1,64 @@
+# interviewer/transcript.py
+
+class ConversationTranscript:
+    """
+    Buffer della conversazione mantenuto in modo incrementale.
+
+    Ogni messaggio viene formattato una sola volta ("ruolo: contenuto") e il testo completo
+    viene ricostruito solo quando la conversazione cambia, non a ogni prompt. Offre viste a
+    finestra (ultimi k messaggi, messaggi dall'inizio dello step corrente).
+    """
+
+    def __init__(self, messages: list | None = None):
+        self.messages = messages if messages is not None else []
+        self._lines = []
+        self._text_cache = None
+        self._text_cache_len = -1
+        self.step_start_index = 0
+
+    @staticmethod
+    def format_message(message: dict) -> str:
+        return f"{message['role']}: {message['content']}"
+
+    def _sync(self):
+        # Formatta solo i messaggi nuovi (anche se aggiunti direttamente alla lista)
+        if len(self._lines) > len(self.messages):
+            self._lines = []
+        for message in self.messages[len(self._lines):]:
+            self._lines.append(self.format_message(message))
+
+    def append(self, role: str, content: str):
+        self.messages.append({"role": role, "content": content})
+
+    def mark_step_start(self) -> tuple:
+        """
+        Segna l'inizio di un nuovo step: i messaggi successivi formano la vista 'since_step_start'.
+        Restituisce gli indici (start, end) del segmento dello step appena chiuso.
+        """
+        closed_segment = (self.step_start_index, len(self.messages))
+        self.step_start_index = len(self.messages)
+        return closed_segment
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    @property
+    def text(self) -> str:
+        """Testo completo della conversazione, ricalcolato solo se sono arrivati nuovi messaggi."""
+        if self._text_cache_len != len(self.messages):
+            self._sync()
+            self._text_cache = "\n".join(self._lines)
+            self._text_cache_len = len(self.messages)
+        return self._text_cache
+
+    def last_k(self, k: int) -> str:
+        self._sync()
+        return "\n".join(self._lines[-k:]) if k > 0 else ""
+
+    def since_step_start(self) -> str:
+        self._sync()
+        return "\n".join(self._lines[self.step_start_index:])
+
+    def range_text(self, start: int, end: int) -> str:
+        self._sync()
+        return "\n".join(self._lines[start:end])
@@ -3,7 +3,6 @@
 
 import os
 import json
-import fitz  # PyMuPDF
 import numpy as np
 import pandas as pd
 import torch
@@ -14,6 +13,7 @@ from dateutil.parser import parse as universal_date_parser
 from sentence_transformers import SentenceTransformer, util
 from tqdm import tqdm
 from interviewer.llm_service import get_llm_response
+from services.cv_extraction_service import extract_cv_text_from_path
 
 from recruitment_suite.config import settings
 
@@ -109,8 +109,7 @@ class CVNormalizer:
     def _extract_from_cv(self, cv_path: str) -> dict:
         print(f"1. Estrazione testo da '{cv_path}'...")
         try:
-            with fitz.open(cv_path) as doc:
-                full_text = "".join(page.get_text() for page in doc)
+            full_text = extract_cv_text_from_path(cv_path)
             raw = get_llm_response(
                 prompt=f"Testo del CV:\n{full_text}",
                 model=settings.LLM_MODEL,
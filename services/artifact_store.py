@@ -0,0 +1,192 @@
+"""
+Storage of generated session artifacts (feedback PDF reports, ...).
+
+Artifacts are produced in memory and handed to a single writer, selected with
+ARTIFACT_STORE. Storage is content-addressed: an artifact is keyed by the SHA-256 of its
+bytes, so identical artifacts are stored once and the digest doubles as a strong ETag.
+save_artifact returns a reference ("<backend>:<sha256>") that is persisted on the session
+(e.g. stages.feedback_pdf_path) and later resolved with open_artifact / read_artifact.
+
+- "local" (default): files under ARTIFACT_LOCAL_DIR/<sha[:2]>/<sha>. Lost when the
+  container is recycled (e.g. Cloud Run), meant for development.
+- "gridfs": GridFS bucket ARTIFACT_GRIDFS_BUCKET in the application database, the
+  digest is the file _id.
+
+References written by earlier versions (plain file paths) are still readable.
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from services.data_manager import db
+
+
+ARTIFACT_STORE = os.getenv("ARTIFACT_STORE", "local").lower()
+ARTIFACT_LOCAL_DIR = os.getenv("ARTIFACT_LOCAL_DIR", os.path.join("data", "artifacts"))
+ARTIFACT_GRIDFS_BUCKET = os.getenv("ARTIFACT_GRIDFS_BUCKET", "artifacts")
+ARTIFACT_CHUNK_BYTES = int(os.getenv("ARTIFACT_CHUNK_BYTES", str(256 * 1024)))
+
+
+class ArtifactInfo:
+    """A stored artifact, readable in chunks"""
+
+    def __init__(self, length: int, etag: str, content_type: str, opener):
+        self.length = length
+        self.etag = etag
+        self.content_type = content_type
+        self._opener = opener
+
+    def iter_bytes(self, start: int = 0, end: int | None = None, chunk_size: int = ARTIFACT_CHUNK_BYTES):
+        """Yield bytes [start, end] (inclusive, as in HTTP ranges) without loading the whole artifact"""
+        end = self.length - 1 if end is None else end
+        remaining = end - start + 1
+        with self._opener() as f:
+            f.seek(start)
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+class LocalArtifactStore:
+    name = "local"
+
+    def __init__(self, base_dir: str = ARTIFACT_LOCAL_DIR):
+        self.base_dir = base_dir
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.base_dir, digest[:2], digest)
+
+    def save(self, digest: str, data: bytes, content_type: str):
+        path = self._path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename: a concurrent download never sees a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def open(self, digest: str, content_type: str) -> ArtifactInfo | None:
+        path = self._path(digest)
+        if not os.path.exists(path):
+            return None
+        return ArtifactInfo(os.path.getsize(path), f'"{digest}"', content_type, lambda: open(path, "rb"))
+
+
+class GridFSArtifactStore:
+    name = "gridfs"
+
+    def __init__(self, bucket_name: str = ARTIFACT_GRIDFS_BUCKET):
+        import gridfs
+        if db is None:
+            raise RuntimeError("Database not available for GridFS artifact store")
+        self._gridfs = gridfs
+        self.bucket = gridfs.GridFSBucket(db, bucket_name=bucket_name)
+        self.files = db[f"{bucket_name}.files"]
+
+    def save(self, digest: str, data: bytes, content_type: str):
+        if self.files.find_one({"_id": digest}, {"_id": 1}):
+            return
+        try:
+            self.bucket.upload_from_stream_with_id(digest, digest, BytesIO(data), metadata={"content_type": content_type})
+        except Exception as e:
+            # Same content uploaded concurrently by another request/instance
+            if not self.files.find_one({"_id": digest}, {"_id": 1}):
+                raise e
+
+    def open(self, digest: str, content_type: str) -> ArtifactInfo | None:
+        doc = self.files.find_one({"_id": digest}, {"length": 1, "metadata": 1})
+        if not doc:
+            return None
+        content_type = (doc.get("metadata") or {}).get("content_type", content_type)
+        return ArtifactInfo(doc["length"], f'"{digest}"', content_type, lambda: self.bucket.open_download_stream(digest))
+
+
+_STORE_CLASSES = {"local": LocalArtifactStore, "gridfs": GridFSArtifactStore}
+_stores = {}
+
+
+def _get_store(name: str):
+    if name not in _stores:
+        _stores[name] = _STORE_CLASSES[name]()
+    return _stores[name]
+
+
+def get_artifact_store():
+    if ARTIFACT_STORE not in _STORE_CLASSES:
+        print(f"⚠️ Unknown ARTIFACT_STORE '{ARTIFACT_STORE}', using local")
+        return _get_store("local")
+    return _get_store(ARTIFACT_STORE)
+
+
+def save_artifact(session_id: str, name: str, data: bytes, content_type: str = "application/octet-stream") -> str:
+    """Store an artifact; returns its reference, or "" if it could not be saved"""
+    digest = hashlib.sha256(data).hexdigest()
+    try:
+        store = get_artifact_store()
+        store.save(digest, data, content_type)
+        print(f"💾 Artifact '{name}' saved for session {session_id} ({len(data) // 1024} KB, {store.name}:{digest[:12]})")
+        return f"{store.name}:{digest}"
+    except Exception as e:
+        print(f"Error saving artifact '{name}' for session {session_id}: {e}")
+        return ""
+
+
+def _open_legacy_file(path: str, content_type: str) -> ArtifactInfo | None:
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return ArtifactInfo(stat.st_size, f'"{int(stat.st_mtime)}-{stat.st_size}"', content_type, lambda: open(path, "rb"))
+
+
+def open_artifact(ref: str, content_type: str = "application/octet-stream") -> ArtifactInfo | None:
+    """Resolve a reference returned by save_artifact (or a legacy file path); None if missing"""
+    if not ref:
+        return None
+    backend, _, digest = ref.partition(":")
+    try:
+        if backend in _STORE_CLASSES and digest:
+            return _get_store(backend).open(digest, content_type)
+        return _open_legacy_file(ref, content_type)
+    except Exception as e:
+        print(f"Error opening artifact {ref}: {e}")
+        return None
+
+
+def read_artifact(ref: str) -> bytes | None:
+    """Whole content of a stored artifact (prefer open_artifact for downloads), None if missing"""
+    info = open_artifact(ref)
+    return b"".join(info.iter_bytes()) if info else None
+
+
+def parse_range(header: str | None, length: int) -> tuple[int, int] | None:
+    """
+    (start, end) of a single 'bytes=' Range header (RFC 7233). None for no, unsupported or
+    syntactically invalid range, which is ignored (full content). Raises ValueError only
+    for a well-formed range that cannot be satisfied (start past the end, empty suffix).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, separator, end_text = header[len("bytes="):].strip().partition("-")
+    start_text, end_text = start_text.strip(), end_text.strip()
+    if not separator or (start_text and not start_text.isdigit()) or (end_text and not end_text.isdigit()):
+        return None
+    if not start_text:
+        # Suffix range: the last N bytes
+        if not end_text:
+            return None
+        suffix = int(end_text)
+        if suffix == 0:
+            raise ValueError(f"Range not satisfiable: {header}")
+        return (max(length - suffix, 0), length - 1) if length else None
+    start = int(start_text)
+    if end_text and int(end_text) < start:
+        return None
+    if start >= length:
+        raise ValueError(f"Range not satisfiable: {header}")
+    end = min(int(end_text), length - 1) if end_text else length - 1
+    return start, end
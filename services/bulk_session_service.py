@@ -0,0 +1,304 @@
+"""
+Bulk creation of interview sessions from a ZIP of CVs and a CSV of candidates.
+
+The request only validates the upload and creates a job; the work runs in background:
+CV text extraction in parallel, sessions and interview tokens created with insert_many,
+invite emails queued to the outbox, then CV analysis and chatbot preparation under a concurrency
+limit shared by all running batches, with their LLM calls under the batch budget of
+interviewer.llm_service. Progress is tracked per candidate in the job
+(see services.job_service), keyed by session id.
+
+The archive is spooled to a temporary file by the request (deleted when the job ends),
+bounded (BULK_ZIP_MAX_MEMBERS, BULK_ZIP_MAX_UNCOMPRESSED_BYTES) and each CV is decompressed
+only by the task that extracts it, never beyond CV_MAX_FILE_BYTES.
+"""
+import csv
+import io
+import os
+import threading
+import uuid
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from interviewer.llm_service import batch_llm_budget, bind_llm_budget
+from services.cv_extraction_service import CVExtractionUnavailable, extract_cv_text, CV_MAX_FILE_BYTES, CV_EXTRACTION_WORKERS
+from services.email_service import enqueue_interview_link
+from services.job_service import update_job_item, finish_job
+from services.tenant_data_manager import create_new_sessions_tenant
+from services.tenant_service import get_tenant_collections
+from services.token_service import delete_interview_tokens, issue_interview_tokens
+
+
+BULK_SESSION_MAX_CANDIDATES = int(os.getenv("BULK_SESSION_MAX_CANDIDATES", "500"))
+BULK_CSV_MAX_BYTES = int(os.getenv("BULK_CSV_MAX_BYTES", str(5 * 1024 * 1024)))
+# Limits of the uploaded CV archive: compressed size, number of entries, total uncompressed size
+BULK_UPLOAD_MAX_BYTES = int(os.getenv("BULK_UPLOAD_MAX_BYTES", str(200 * 1024 * 1024)))
+BULK_ZIP_MAX_MEMBERS = int(os.getenv("BULK_ZIP_MAX_MEMBERS", "2000"))
+BULK_ZIP_MAX_UNCOMPRESSED_BYTES = int(os.getenv("BULK_ZIP_MAX_UNCOMPRESSED_BYTES", str(1024 * 1024 * 1024)))
+# CV analysis + chatbot preparation running at the same time, across all batches
+BULK_PREPARE_MAX_CONCURRENCY = int(os.getenv("BULK_PREPARE_MAX_CONCURRENCY", "4"))
+
+_prepare_slots = threading.BoundedSemaphore(BULK_PREPARE_MAX_CONCURRENCY)
+
+_NAME_COLUMNS = ("candidate_name", "name", "nome")
+_EMAIL_COLUMNS = ("candidate_email", "email")
+_CV_COLUMNS = ("cv_filename", "cv_file", "cv", "filename", "file")
+
+
+def _pick(row: dict, columns: tuple) -> str:
+    for column in columns:
+        if row.get(column):
+            return row[column].strip()
+    return ""
+
+
+def parse_candidates_csv(content: bytes) -> list[dict]:
+    """Parse the candidates CSV (',' or ';' separated, header required). Raises ValueError if invalid."""
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("Candidates CSV must be UTF-8 encoded")
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+    reader.fieldnames = [(f or "").strip().lower() for f in (reader.fieldnames or [])]
+    if not any(c in reader.fieldnames for c in _CV_COLUMNS):
+        raise ValueError(f"Candidates CSV needs a CV file column (one of: {', '.join(_CV_COLUMNS)})")
+
+    candidates = []
+    for line_number, row in enumerate(reader, start=2):
+        cv_filename = _pick(row, _CV_COLUMNS)
+        if not cv_filename:
+            raise ValueError(f"Missing CV file name at CSV line {line_number}")
+        candidates.append({
+            "candidate_name": _pick(row, _NAME_COLUMNS) or "Candidato",
+            "candidate_email": _pick(row, _EMAIL_COLUMNS) or None,
+            "cv_filename": cv_filename,
+        })
+    if not candidates:
+        raise ValueError("Candidates CSV is empty")
+    if len(candidates) > BULK_SESSION_MAX_CANDIDATES:
+        raise ValueError(f"Too many candidates ({len(candidates)}, max {BULK_SESSION_MAX_CANDIDATES})")
+    return candidates
+
+
+def match_cv_files(candidates: list[dict], zip_path: str) -> list[dict]:
+    """
+    Attach to each candidate the ZIP member of its CV (matched by file name, ignoring folders)
+    and a new session id. Candidates whose CV is missing or too large get an 'error'.
+    Raises ValueError if the archive at 'zip_path' is invalid or exceeds the archive limits.
+    """
+    if os.path.getsize(zip_path) > BULK_UPLOAD_MAX_BYTES:
+        raise ValueError(f"CV archive too large (max {BULK_UPLOAD_MAX_BYTES // (1024 * 1024)} MB)")
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            infos = archive.infolist()
+    except zipfile.BadZipFile:
+        raise ValueError("CV archive is not a valid ZIP file")
+    if len(infos) > BULK_ZIP_MAX_MEMBERS:
+        raise ValueError(f"CV archive has too many entries ({len(infos)}, max {BULK_ZIP_MAX_MEMBERS})")
+    if sum(info.file_size for info in infos) > BULK_ZIP_MAX_UNCOMPRESSED_BYTES:
+        raise ValueError(f"CV archive too large once uncompressed (max {BULK_ZIP_MAX_UNCOMPRESSED_BYTES // (1024 * 1024)} MB)")
+    members = {}
+    for info in infos:
+        if not info.is_dir():
+            members.setdefault(os.path.basename(info.filename).lower(), info)
+
+    for candidate in candidates:
+        candidate["session_id"] = str(uuid.uuid4())
+        info = members.get(os.path.basename(candidate["cv_filename"]).lower())
+        if info is None:
+            candidate["error"] = f"CV '{candidate['cv_filename']}' not found in archive"
+        elif info.file_size > CV_MAX_FILE_BYTES:
+            candidate["error"] = f"CV '{candidate['cv_filename']}' too large"
+        else:
+            candidate["zip_member"] = info.filename
+    return candidates
+
+
+def _detail(candidate: dict, **extra) -> dict:
+    return {
+        "candidate_name": candidate["candidate_name"],
+        "candidate_email": candidate["candidate_email"],
+        "cv_filename": candidate["cv_filename"],
+        **extra,
+    }
+
+
+def _read_member(zip_path: str, member: str) -> bytes:
+    """
+    Decompress one ZIP member, at most CV_MAX_FILE_BYTES (the size in the header is not
+    trusted). Each call opens its own ZipFile: ZipFile is not safe for concurrent reads.
+    Raises ValueError if the member cannot be read or is too large.
+    """
+    try:
+        with zipfile.ZipFile(zip_path) as archive, archive.open(member) as f:
+            content = f.read(CV_MAX_FILE_BYTES + 1)
+    except (RuntimeError, zipfile.BadZipFile, zlib.error, NotImplementedError, KeyError) as e:
+        # RuntimeError: encrypted member; NotImplementedError: unsupported compression
+        raise ValueError(f"CV '{member}' cannot be read from the archive: {e}")
+    if len(content) > CV_MAX_FILE_BYTES:
+        raise ValueError(f"CV '{member}' too large")
+    return content
+
+
+def _prepare_session(session_id: str, tenant_id: str) -> str | None:
+    """CV analysis + chatbot preparation, as POST /sessions/{id}/prepare; returns an error or None"""
+    from analyzer.run_analyzer_tenant import run_cv_analysis_pipeline_tenant
+    from interviewer.chat_session_service import initialize_chatbot_for_session
+
+    with _prepare_slots:
+        if not run_cv_analysis_pipeline_tenant(session_id, tenant_id):
+            return "CV analysis failed"
+        if not initialize_chatbot_for_session(session_id, tenant_id, prewarm=True):
+            return "Chatbot initialization failed"
+    return None
+
+
+def run_bulk_session_creation(
+    job_id: str,
+    tenant_id: str,
+    position_id: str,
+    candidates: list[dict],
+    zip_path: str,
+    frontend_base_url: str = "",
+    prepare: bool = True,
+) -> dict:
+    """
+    Create the sessions of a bulk upload (see module docstring); returns a summary.
+    The archive at 'zip_path' is deleted when the job ends.
+    """
+    print(f"📦 Bulk session creation {job_id}: {len(candidates)} candidates for position {position_id}")
+    summary = {"total": len(candidates), "created": 0, "prepared": 0, "failed": 0, "invites_queued": 0}
+    summary_lock = threading.Lock()
+    status = "failed"
+
+    def fail(candidate, error):
+        with summary_lock:
+            summary["failed"] += 1
+        update_job_item(job_id, candidate["session_id"], "failed", _detail(candidate, error=error))
+
+    try:
+        collections = get_tenant_collections(tenant_id)
+
+        # 1. CV text extraction, in parallel: each task decompresses only its own CV
+        pending = []
+        for candidate in candidates:
+            if candidate.get("error"):
+                fail(candidate, candidate["error"])
+            else:
+                pending.append(candidate)
+
+        def extract(candidate):
+            try:
+                content = _read_member(zip_path, candidate["zip_member"])
+                return extract_cv_text(content, candidate["cv_filename"]), None
+            except (ValueError, CVExtractionUnavailable) as e:
+                return None, str(e)
+
+        with ThreadPoolExecutor(max_workers=CV_EXTRACTION_WORKERS) as executor:
+            extracted = list(executor.map(extract, pending))
+        _remove_archive(zip_path)
+
+        ready = []
+        for candidate, (cv_text, error) in zip(pending, extracted):
+            if error:
+                fail(candidate, error)
+            else:
+                candidate["cv_text"] = cv_text
+                ready.append(candidate)
+
+        # 2. Sessions and tokens, in bulk; tokens of sessions that were not created are deleted
+        ready_ids = [c["session_id"] for c in ready]
+        try:
+            tokens = issue_interview_tokens(ready_ids, collections["interview_links"])
+        except Exception as e:
+            print(f"Error issuing interview tokens for bulk job {job_id}: {e}")
+            _delete_tokens(ready_ids, collections["interview_links"])
+            for candidate in ready:
+                fail(candidate, "Token creation failed")
+            return summary
+
+        try:
+            created_ids = set(create_new_sessions_tenant([{
+                "session_id": c["session_id"],
+                "position_id": position_id,
+                "candidate_name": c["candidate_name"],
+                "candidate_email": c["candidate_email"],
+                "stages": {"uploaded_cv_text": c["cv_text"], "interview_token": tokens[c["session_id"]]},
+            } for c in ready], collections["sessions"]))
+        except Exception as e:
+            print(f"Error creating sessions for bulk job {job_id}: {e}")
+            created_ids = set()
+        _delete_tokens([i for i in ready_ids if i not in created_ids], collections["interview_links"])
+
+        created = []
+        for candidate in ready:
+            candidate.pop("cv_text", None)
+            if candidate["session_id"] not in created_ids:
+                fail(candidate, "Session creation failed")
+                continue
+            summary["created"] += 1
+            token = tokens[candidate["session_id"]]
+            invite_queued = False
+            if candidate["candidate_email"] and frontend_base_url:
+                try:
+                    invite_queued = enqueue_interview_link(candidate["candidate_email"], token, frontend_base_url, candidate["session_id"], tenant_id) is not None
+                except Exception as e:
+                    print(f"Error queueing invite for session {candidate['session_id']}: {e}")
+                summary["invites_queued"] += int(invite_queued)
+            candidate["result"] = {"interview_token": token, "invite_queued": invite_queued}
+            if prepare:
+                update_job_item(job_id, candidate["session_id"], "preparing", _detail(candidate, **candidate["result"]))
+                created.append(candidate)
+            else:
+                update_job_item(job_id, candidate["session_id"], "completed", _detail(candidate, **candidate["result"]))
+
+        # 3. CV analysis and chatbot preparation, under the shared concurrency limit
+        def prepare_one(candidate):
+            try:
+                error = _prepare_session(candidate["session_id"], tenant_id)
+            except Exception as e:
+                error = str(e)
+            if error:
+                fail(candidate, error)
+            else:
+                with summary_lock:
+                    summary["prepared"] += 1
+                update_job_item(job_id, candidate["session_id"], "completed", _detail(candidate, prepared=True, **candidate["result"]))
+
+        if created:
+            with batch_llm_budget(), ThreadPoolExecutor(max_workers=BULK_PREPARE_MAX_CONCURRENCY) as executor:
+                list(executor.map(bind_llm_budget(prepare_one), created))
+
+        status = "completed" if summary["failed"] < summary["total"] else "failed"
+    except Exception as e:
+        print(f"Error in bulk session creation {job_id}: {e}")
+        summary["error"] = str(e)
+    finally:
+        # The job is always closed, also when a step above raised
+        _remove_archive(zip_path)
+        print(f"📦 Bulk session creation {job_id} finished ({status}): {summary}")
+        finish_job(job_id, status, summary)
+    return summary
+
+
+def _remove_archive(zip_path: str):
+    try:
+        os.remove(zip_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Error removing CV archive {zip_path}: {e}")
+
+
+def _delete_tokens(session_ids: list[str], collection_name: str):
+    if not session_ids:
+        return
+    try:
+        delete_interview_tokens(session_ids, collection_name)
+    except Exception as e:
+        print(f"Error deleting {len(session_ids)} unused interview tokens: {e}")
@@ -0,0 +1,200 @@
+"""
+CV text extraction (PDF or UTF-8 text) off the request path.
+
+PDF parsing runs on a bounded process pool, so a large or scanned document never blocks
+the API event loop or holds the GIL. Long documents are split into page ranges parsed in
+parallel. Files above CV_MAX_FILE_BYTES are rejected and pages beyond CV_MAX_PAGES are
+ignored. Timing metrics are kept in-process (see extraction_metrics).
+
+The document is written once to a temporary file and workers open it by path, so page-range
+tasks never pickle the PDF bytes.
+
+Invalid or oversized documents raise ValueError (a client error). A pool that crashed or
+an extraction that timed out raises CVExtractionUnavailable (a server error); a crashed
+process pool is recreated and the extraction retried once before giving up. On timeout the
+worker processes are terminated and the pool recreated, so a pathological PDF cannot keep
+holding a worker (extractions of other requests in flight are retried on the new pool).
+"""
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz  # PyMuPDF
+
+
+CV_EXTRACTION_POOL = os.getenv("CV_EXTRACTION_POOL", "process").lower()  # "process" | "thread"
+CV_EXTRACTION_WORKERS = int(os.getenv("CV_EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+CV_MAX_FILE_BYTES = int(os.getenv("CV_MAX_FILE_BYTES", str(10 * 1024 * 1024)))
+CV_MAX_PAGES = int(os.getenv("CV_MAX_PAGES", "30"))
+# Documents with at least this many pages are parsed in parallel, CV_PAGES_PER_CHUNK pages per task
+CV_PARALLEL_PAGE_THRESHOLD = int(os.getenv("CV_PARALLEL_PAGE_THRESHOLD", "8"))
+CV_PAGES_PER_CHUNK = int(os.getenv("CV_PAGES_PER_CHUNK", "4"))
+CV_EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("CV_EXTRACTION_TIMEOUT_SECONDS", "30"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_metrics_lock = threading.Lock()
+_metrics = {"extractions": 0, "failures": 0, "pool_restarts": 0, "parallel": 0, "pages": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+
+class CVExtractionUnavailable(RuntimeError):
+    """The extraction pool could not process the document (crashed pool or timeout)"""
+
+
+def _count_pages(path: str) -> int:
+    with fitz.open(path, filetype="pdf") as doc:
+        return doc.page_count
+
+
+def _extract_page_range(path: str, start: int, end: int) -> str:
+    """Text of pages [start, end) - runs inside a pool worker"""
+    with fitz.open(path, filetype="pdf") as doc:
+        return "".join(doc[i].get_text() for i in range(start, min(end, doc.page_count)))
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if CV_EXTRACTION_POOL == "process":
+                    # spawn: workers never inherit the API's threads, locks or open sockets
+                    _pool = ProcessPoolExecutor(max_workers=CV_EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+                else:
+                    _pool = ThreadPoolExecutor(max_workers=CV_EXTRACTION_WORKERS, thread_name_prefix="cv-extraction")
+    return _pool
+
+
+def _reset_pool(broken_pool, terminate: bool = False):
+    """
+    Drop a crashed (or stuck) pool so the next _get_pool creates a new one (once, even with
+    concurrent callers). With 'terminate' the worker processes are killed: a worker stuck on
+    a document does not stop when its future times out.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is broken_pool:
+            _pool = None
+            with _metrics_lock:
+                _metrics["pool_restarts"] += 1
+    if terminate and isinstance(broken_pool, ProcessPoolExecutor):
+        # No public API before Python 3.14 (terminate_workers)
+        for process in list((broken_pool._processes or {}).values()):
+            process.terminate()
+    broken_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _record(elapsed_ms: float, pages: int = 0, parallel: bool = False, failed: bool = False):
+    with _metrics_lock:
+        if failed:
+            _metrics["failures"] += 1
+            return
+        _metrics["extractions"] += 1
+        _metrics["pages"] += pages
+        _metrics["parallel"] += int(parallel)
+        _metrics["total_ms"] += elapsed_ms
+        _metrics["max_ms"] = max(_metrics["max_ms"], elapsed_ms)
+
+
+def is_pdf(filename: str | None, content_type: str | None = None) -> bool:
+    return content_type == "application/pdf" or (filename or "").lower().endswith(".pdf")
+
+
+def _extract_on_pool(pool, path: str, deadline: float) -> tuple:
+    """(text, pages, ranges) of the PDF at 'path', parsed on 'pool' within 'deadline' (perf_counter time)"""
+    page_count = pool.submit(_count_pages, path).result(timeout=max(deadline - time.perf_counter(), 0))
+    pages = min(page_count, CV_MAX_PAGES)
+    if page_count > CV_MAX_PAGES:
+        print(f"⚠️ CV has {page_count} pages, extracting only the first {CV_MAX_PAGES}")
+
+    if pages >= CV_PARALLEL_PAGE_THRESHOLD:
+        ranges = [(start, min(start + CV_PAGES_PER_CHUNK, pages)) for start in range(0, pages, CV_PAGES_PER_CHUNK)]
+    else:
+        ranges = [(0, pages)]
+    futures = [pool.submit(_extract_page_range, path, start, end) for start, end in ranges]
+    text = "".join(f.result(timeout=max(deadline - time.perf_counter(), 0)) for f in futures)
+    return text, pages, ranges
+
+
+def extract_pdf_text(content: bytes) -> str:
+    """
+    Extract the text of a PDF on the extraction pool. Raises ValueError on invalid or
+    oversized documents, CVExtractionUnavailable if the pool crashed or timed out.
+    """
+    if len(content) > CV_MAX_FILE_BYTES:
+        raise ValueError(f"CV file too large ({len(content) // 1024} KB, max {CV_MAX_FILE_BYTES // 1024} KB)")
+
+    started = time.perf_counter()
+    deadline = started + CV_EXTRACTION_TIMEOUT_SECONDS
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as pdf_file:
+        pdf_file.write(content)
+    try:
+        for attempt in range(2):
+            pool = _get_pool()
+            try:
+                text, pages, ranges = _extract_on_pool(pool, pdf_file.name, deadline)
+                break
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory, or terminated after another request's
+                # timeout): restart the pool and retry once
+                _reset_pool(pool)
+                if attempt:
+                    _record(0, failed=True)
+                    raise CVExtractionUnavailable("CV extraction pool crashed")
+                print("⚠️ CV extraction pool crashed, restarting it")
+            except FutureTimeoutError:
+                # The worker keeps parsing after the timeout: kill it so it does not hold a slot
+                _reset_pool(pool, terminate=True)
+                _record(0, failed=True)
+                raise CVExtractionUnavailable(f"CV extraction timed out after {CV_EXTRACTION_TIMEOUT_SECONDS:.0f}s")
+            except Exception as e:
+                _record(0, failed=True)
+                raise ValueError(f"Invalid PDF: {e}")
+    finally:
+        os.unlink(pdf_file.name)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _record(elapsed_ms, pages, parallel=len(ranges) > 1)
+    print(f"📄 CV text extracted: {pages} pages, {len(text)} chars in {elapsed_ms:.0f} ms ({len(ranges)} task(s))")
+    return text
+
+
+def extract_cv_text(content: bytes, filename: str | None = None, content_type: str | None = None) -> str:
+    """
+    Text of an uploaded CV (PDF or UTF-8 text). Raises ValueError if the document cannot be
+    extracted, CVExtractionUnavailable if the extraction pool failed.
+    """
+    if is_pdf(filename, content_type):
+        return extract_pdf_text(content)
+    if len(content) > CV_MAX_FILE_BYTES:
+        raise ValueError(f"CV file too large ({len(content) // 1024} KB, max {CV_MAX_FILE_BYTES // 1024} KB)")
+    try:
+        return content.decode("utf-8")
+    except Exception:
+        raise ValueError("Unsupported CV format; provide PDF or UTF-8 text")
+
+
+def extract_cv_text_from_path(path: str) -> str:
+    with open(path, "rb") as f:
+        return extract_cv_text(f.read(), filename=path)
+
+
+async def extract_cv_text_async(content: bytes, filename: str | None = None, content_type: str | None = None) -> str:
+    """extract_cv_text for async endpoints: waits for the pool without blocking the event loop"""
+    return await asyncio.to_thread(extract_cv_text, content, filename, content_type)
+
+
+def extraction_metrics() -> dict:
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    metrics["avg_ms"] = round(metrics["total_ms"] / metrics["extractions"], 1) if metrics["extractions"] else 0.0
+    metrics["total_ms"] = round(metrics["total_ms"], 1)
+    metrics["max_ms"] = round(metrics["max_ms"], 1)
+    metrics["pool"] = type(_pool).__name__ if _pool is not None else None
+    metrics["workers"] = CV_EXTRACTION_WORKERS
+    return metrics
@@ -49,10 +49,13 @@ def create_or_update_position(position_id: str, payload: dict, collection_name:
         print("DB non disponibile per create_or_update_position")
         return False
     try:
+        # Import locale: position_cache dipende da questo modulo
+        from services.position_cache import invalidate_position, with_updated_at
         collection = db[collection_name]
-        payload = payload.copy()
+        payload = with_updated_at(payload)
         payload["_id"] = position_id
         collection.update_one({"_id": position_id}, {"$set": payload}, upsert=True)
+        invalidate_position(position_id, collection_name)
         print(f"📄 Posizione upserted su MongoDB con ID: {position_id} in collection: {collection_name}")
         return True
     except Exception as e:
@@ -88,17 +91,8 @@ def get_session_data(session_id: str) -> dict | None:
         return None
 
 def save_pdf_report(pdf_bytes: bytes, session_id: str) -> str:
-    output_dir = os.path.join("data", "sessions", session_id)
-    os.makedirs(output_dir, exist_ok=True)
-    file_path = os.path.join(output_dir, "Report_Feedback_Candidato.pdf")
-    try:
-        with open(file_path, "wb") as f:
-            f.write(pdf_bytes)
-        print(f"📄 PDF salvato localmente in: {file_path}")
-        return file_path
-    except Exception as e:
-        print(f"Errore nel salvataggio del PDF: {e}")
-        return ""
+    from services.artifact_store import save_artifact
+    return save_artifact(session_id, "Report_Feedback_Candidato.pdf", pdf_bytes, "application/pdf")
 
 def get_available_positions_from_db():
     if db is None: 
@@ -1,35 +1,324 @@
-import os
-from typing import Optional
+"""
+Interview invitation emails.
 
+Emails are persisted to the tenant's outbox collection (<tenant_id>_email_outbox) and
+delivered by a background sender that claims them in batches from every outbox, sends
+each batch over a single authenticated SMTP connection and retries failures with
+exponential backoff. A batch is claimed with one update_many that stamps it with a claim
+id; before each send the sender checks that it still holds the claim (and renews the
+lease), so an email reclaimed by another instance after the lease expired is not sent twice. The send status of each email (and therefore of each session invite)
+is kept on the outbox document; the body, which carries the interview link, is removed
+once the email is sent or has failed for good.
+
+For local testing any SMTP stand-in works (e.g. `python -m aiosmtpd -n -l localhost:8025`
+with SMTP_PORT=8025, SMTP_STARTTLS=false and no SMTP_USER/SMTP_PASS).
+"""
+import os
+import random
 import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
 from email.mime.text import MIMEText
+from typing import Optional
+
+from services.data_manager import db
+from services.tenant_service import get_tenant_collections
 
 
 SMTP_HOST = os.getenv("SMTP_HOST")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASS = os.getenv("SMTP_PASS")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "20"))
 FROM_EMAIL = os.getenv("FROM_EMAIL", "noreply@vertigo-ai.local")
 
+# Outbox of emails queued without a tenant; tenant outboxes are "<tenant_id>_email_outbox"
+EMAIL_OUTBOX_COLLECTION = "email_outbox"
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+EMAIL_RETRY_MAX_SECONDS = float(os.getenv("EMAIL_RETRY_MAX_SECONDS", "3600"))
+EMAIL_SENDER_POLL_SECONDS = float(os.getenv("EMAIL_SENDER_POLL_SECONDS", "5"))
+# Emails left in 'sending' longer than this (e.g. instance crashed mid-batch) are claimed again
+EMAIL_SENDING_LEASE_SECONDS = int(os.getenv("EMAIL_SENDING_LEASE_SECONDS", "600"))
+# How often the sender lists the database collections to discover new tenant outboxes
+EMAIL_OUTBOX_REFRESH_SECONDS = float(os.getenv("EMAIL_OUTBOX_REFRESH_SECONDS", "300"))
 
-def send_interview_link(to_email: str, token: str, frontend_base_url: str) -> bool:
-    if not (SMTP_HOST and SMTP_USER and SMTP_PASS):
-        return False
-    url = f"{frontend_base_url.rstrip('/')}/interview/{token}"
-    subject = "Il tuo colloquio Vertigo AI"
-    body = f"Ciao,\n\nper iniziare il colloquio clicca qui: {url}\n\nGrazie"
+_sender_thread: Optional[threading.Thread] = None
+_sender_lock = threading.Lock()
+_wake_sender = threading.Event()
+_indexed_outboxes = set()
+_known_outboxes = set()
+_outboxes_lock = threading.Lock()
+_outboxes_listed_at = 0.0
+
+
+def email_outbox_collection_for(tenant_id: str | None) -> str:
+    return get_tenant_collections(tenant_id)["email_outbox"] if tenant_id else EMAIL_OUTBOX_COLLECTION
+
+
+def _outbox_collections(refresh: bool = False) -> list[str]:
+    """
+    All outbox collections (one per tenant, plus the one without tenant). The database is
+    listed at most every EMAIL_OUTBOX_REFRESH_SECONDS; outboxes written by this process are
+    added as soon as an email is queued (see enqueue_interview_link).
+    """
+    global _outboxes_listed_at
+    if refresh or time.monotonic() - _outboxes_listed_at >= EMAIL_OUTBOX_REFRESH_SECONDS:
+        names = [
+            name for name in db.list_collection_names()
+            if name == EMAIL_OUTBOX_COLLECTION or name.endswith(f"_{EMAIL_OUTBOX_COLLECTION}")
+        ]
+        with _outboxes_lock:
+            _known_outboxes.update(names)
+        _outboxes_listed_at = time.monotonic()
+    with _outboxes_lock:
+        return sorted(_known_outboxes)
+
+
+def _ensure_outbox_indexes(collection_name: str):
+    if collection_name in _indexed_outboxes:
+        return
+    try:
+        db[collection_name].create_index([("status", 1), ("next_attempt_at", 1)])
+        db[collection_name].create_index("session_id")
+        db[collection_name].create_index("claim_id")
+        _indexed_outboxes.add(collection_name)
+    except Exception as e:
+        print(f"Error creating email outbox indexes on {collection_name}: {e}")
+
+
+def smtp_configured() -> bool:
+    return bool(SMTP_HOST) and (not SMTP_USER or bool(SMTP_PASS))
+
+
+def _open_smtp_connection() -> smtplib.SMTP:
+    server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS)
+    if SMTP_STARTTLS:
+        server.starttls()
+    if SMTP_USER:
+        server.login(SMTP_USER, SMTP_PASS)
+    return server
+
+
+def _build_message(to_email: str, subject: str, body: str) -> MIMEText:
     msg = MIMEText(body)
     msg["Subject"] = subject
     msg["From"] = FROM_EMAIL
     msg["To"] = to_email
+    return msg
+
+
+def _interview_link_content(token: str, frontend_base_url: str) -> tuple[str, str]:
+    url = f"{frontend_base_url.rstrip('/')}/interview/{token}"
+    subject = "Il tuo colloquio Vertigo AI"
+    body = f"Ciao,\n\nper iniziare il colloquio clicca qui: {url}\n\nGrazie"
+    return subject, body
+
+
+def send_interview_link(to_email: str, token: str, frontend_base_url: str) -> bool:
+    """Send the invitation immediately over a dedicated connection (prefer enqueue_interview_link)"""
+    if not smtp_configured():
+        return False
+    subject, body = _interview_link_content(token, frontend_base_url)
     try:
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASS)
-            server.send_message(msg)
+        with _open_smtp_connection() as server:
+            server.send_message(_build_message(to_email, subject, body))
         return True
-    except Exception:
+    except Exception as e:
+        print(f"⚠️ Error sending interview link to {to_email}: {e}")
         return False
 
 
+def enqueue_interview_link(to_email: str, token: str, frontend_base_url: str, session_id: str | None = None, tenant_id: str | None = None) -> str | None:
+    """Persist the invitation in the tenant outbox and wake the background sender; returns the email id"""
+    if db is None:
+        return None
+    subject, body = _interview_link_content(token, frontend_base_url)
+    now = datetime.utcnow()
+    configured = smtp_configured()
+    email_id = str(uuid.uuid4())
+    collection_name = email_outbox_collection_for(tenant_id)
+    try:
+        if configured:
+            _ensure_outbox_indexes(collection_name)
+        db[collection_name].insert_one({
+            "_id": email_id,
+            "kind": "interview_link",
+            "tenant_id": tenant_id,
+            "session_id": session_id,
+            "to": to_email,
+            "subject": subject,
+            # Not kept when the email will never be sent
+            "body": body if configured else None,
+            "status": "queued" if configured else "skipped",
+            "attempts": 0,
+            "last_error": None if configured else "SMTP not configured",
+            "next_attempt_at": now,
+            "created_at": now,
+            "updated_at": now,
+        })
+    except Exception as e:
+        print(f"Error queuing email for {to_email}: {e}")
+        return None
+    if configured:
+        with _outboxes_lock:
+            _known_outboxes.add(collection_name)
+        start_email_sender()
+        _wake_sender.set()
+    return email_id
+
+
+def get_session_email_status(session_id: str, tenant_id: str | None = None) -> list[dict]:
+    """Outbox entries of a session (most recent first), without the message body"""
+    if db is None:
+        return []
+    query = {"session_id": session_id}
+    if tenant_id:
+        query["tenant_id"] = tenant_id
+    try:
+        return list(db[email_outbox_collection_for(tenant_id)].find(query, {"body": 0}).sort("created_at", -1))
+    except Exception as e:
+        print(f"Error retrieving email status for session {session_id}: {e}")
+        return []
+
+
+def _claim_batch(collection_name: str = EMAIL_OUTBOX_COLLECTION) -> list[dict]:
+    """
+    Move up to EMAIL_BATCH_SIZE due emails of an outbox to 'sending' under a new claim id
+    (safe with several instances: update_many re-applies the 'due' filter, so an email
+    claimed by another instance in the meantime is not taken). Returns the claimed emails.
+    """
+    now = datetime.utcnow()
+    due = {"$or": [
+        {"status": {"$in": ["queued", "retry"]}, "next_attempt_at": {"$lte": now}},
+        {"status": "sending", "claimed_at": {"$lte": now - timedelta(seconds=EMAIL_SENDING_LEASE_SECONDS)}},
+    ]}
+    collection = db[collection_name]
+    candidate_ids = [doc["_id"] for doc in collection.find(due, {"_id": 1}).sort("next_attempt_at", 1).limit(EMAIL_BATCH_SIZE)]
+    if not candidate_ids:
+        return []
+    claim_id = str(uuid.uuid4())
+    collection.update_many(
+        {"$and": [{"_id": {"$in": candidate_ids}}, due]},
+        {"$set": {"status": "sending", "claim_id": claim_id, "claimed_at": now, "updated_at": now}},
+    )
+    return list(collection.find({"claim_id": claim_id}).sort("next_attempt_at", 1))
+
+
+def _still_claimed(doc: dict, collection_name: str = EMAIL_OUTBOX_COLLECTION) -> bool:
+    """
+    Check, right before sending, that the email is still ours and not sent, renewing the
+    lease. False if it was reclaimed by another instance after the lease expired.
+    """
+    now = datetime.utcnow()
+    result = db[collection_name].update_one(
+        {"_id": doc["_id"], "claim_id": doc.get("claim_id"), "status": "sending"},
+        {"$set": {"claimed_at": now, "updated_at": now}},
+    )
+    return result.matched_count == 1
+
+
+def _mark_sent(doc: dict, collection_name: str = EMAIL_OUTBOX_COLLECTION):
+    now = datetime.utcnow()
+    db[collection_name].update_one(
+        {"_id": doc["_id"], "claim_id": doc.get("claim_id")},
+        {
+            "$set": {"status": "sent", "sent_at": now, "updated_at": now, "last_error": None},
+            "$unset": {"body": ""},
+            "$inc": {"attempts": 1},
+        },
+    )
+
+
+def _mark_failed(doc: dict, error: str, permanent: bool = False, collection_name: str = EMAIL_OUTBOX_COLLECTION):
+    attempts = doc.get("attempts", 0) + 1
+    now = datetime.utcnow()
+    update = {"$set": {"status": "failed", "last_error": error, "updated_at": now}, "$inc": {"attempts": 1}}
+    if not permanent and attempts < EMAIL_MAX_ATTEMPTS:
+        delay = min(EMAIL_RETRY_BASE_SECONDS * (2 ** (attempts - 1)), EMAIL_RETRY_MAX_SECONDS)
+        update["$set"].update({"status": "retry", "next_attempt_at": now + timedelta(seconds=delay * random.uniform(0.8, 1.2))})
+    else:
+        update["$unset"] = {"body": ""}
+    db[collection_name].update_one({"_id": doc["_id"], "claim_id": doc.get("claim_id")}, update)
+    print(f"⚠️ Email {doc['_id']} to {doc['to']} {update['$set']['status']} (attempt {attempts}): {error}")
+
+
+def _deliver_batch(batch: list[dict], collection_name: str = EMAIL_OUTBOX_COLLECTION):
+    """Send a batch of an outbox over one SMTP connection, reconnecting once if the server drops it"""
+    server = None
+    try:
+        for index, doc in enumerate(batch):
+            if server is None:
+                try:
+                    server = _open_smtp_connection()
+                except (smtplib.SMTPException, OSError) as e:
+                    # Server unreachable or login refused: retry the rest of the batch later
+                    for pending in batch[index:]:
+                        _mark_failed(pending, f"Connection failed: {e}", collection_name=collection_name)
+                    return
+            if not _still_claimed(doc, collection_name):
+                print(f"⚠️ Email {doc['_id']} was reclaimed by another sender, skipping it")
+                continue
+            try:
+                try:
+                    server.send_message(_build_message(doc["to"], doc["subject"], doc["body"]))
+                except smtplib.SMTPServerDisconnected:
+                    server = _open_smtp_connection()
+                    server.send_message(_build_message(doc["to"], doc["subject"], doc["body"]))
+                _mark_sent(doc, collection_name)
+            except smtplib.SMTPRecipientsRefused as e:
+                # Refused for good only if every refusal is a 5xx (4xx, e.g. greylisting, is retried)
+                permanent = all(code >= 500 for code, _ in e.recipients.values())
+                _mark_failed(doc, f"Recipient refused: {e.recipients}", permanent=permanent, collection_name=collection_name)
+            except smtplib.SMTPResponseException as e:
+                # 5xx: rejected for good; 4xx: temporary, retried later. The connection stays usable.
+                _mark_failed(doc, f"{e.smtp_code} {e.smtp_error!r}", permanent=e.smtp_code >= 500, collection_name=collection_name)
+            except (smtplib.SMTPException, OSError) as e:
+                # Connection-level problem: drop it, the next email opens a new one
+                _mark_failed(doc, str(e), collection_name=collection_name)
+                server = None
+    finally:
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                pass
+
+
+def _sender_loop():
+    print("📧 Email sender started")
+    while True:
+        _wake_sender.clear()
+        processed = 0
+        try:
+            for collection_name in (_outbox_collections() if db is not None else []):
+                batch = _claim_batch(collection_name)
+                if batch:
+                    _deliver_batch(batch, collection_name)
+                    print(f"📧 Processed {len(batch)} queued email(s) from {collection_name}")
+                    processed += len(batch)
+            if processed:
+                continue
+        except Exception as e:
+            print(f"Error in email sender: {e}")
+        _wake_sender.wait(EMAIL_SENDER_POLL_SECONDS)
+
 
+def start_email_sender():
+    """Start the background sender once per process (no-op if SMTP or DB are not configured)"""
+    global _sender_thread
+    if db is None or not smtp_configured():
+        return
+    with _sender_lock:
+        if _sender_thread is None or not _sender_thread.is_alive():
+            try:
+                for collection_name in _outbox_collections(refresh=True):
+                    _ensure_outbox_indexes(collection_name)
+            except Exception as e:
+                print(f"Error listing email outboxes: {e}")
+            _sender_thread = threading.Thread(target=_sender_loop, name="email-sender", daemon=True)
+            _sender_thread.start()
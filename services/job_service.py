@@ -0,0 +1,97 @@
+"""
+Tracking of long-running background jobs (batch data-prep, bulk operations)
+with per-item status stored in MongoDB.
+"""
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from services.data_manager import db
+
+
+JOBS_COLLECTION = "background_jobs"
+
+
+def create_job(kind: str, tenant_id: str | None, item_ids: list[str], params: dict | None = None) -> str | None:
+    """Create a job document with one 'pending' entry per item and return its id"""
+    if db is None:
+        return None
+    job_id = str(uuid.uuid4())
+    now = datetime.utcnow().isoformat()
+    try:
+        db[JOBS_COLLECTION].insert_one({
+            "_id": job_id,
+            "kind": kind,
+            "tenant_id": tenant_id,
+            "params": params or {},
+            "status": "running",
+            "created_at": now,
+            "updated_at": now,
+            "counts": {"total": len(item_ids), "completed": 0, "failed": 0},
+            "items": [{"id": item_id, "status": "pending", "detail": None, "updated_at": now} for item_id in item_ids],
+        })
+        return job_id
+    except Exception as e:
+        print(f"Error creating job '{kind}': {e}")
+        return None
+
+
+def set_job_items(job_id: str | None, item_ids: list[str]):
+    """Replace the job items, for jobs whose items are only known once they start"""
+    if db is None or not job_id:
+        return
+    now = datetime.utcnow().isoformat()
+    try:
+        db[JOBS_COLLECTION].update_one({"_id": job_id}, {"$set": {
+            "items": [{"id": item_id, "status": "pending", "detail": None, "updated_at": now} for item_id in item_ids],
+            "counts": {"total": len(item_ids), "completed": 0, "failed": 0},
+            "updated_at": now,
+        }})
+    except Exception as e:
+        print(f"Error setting items of job {job_id}: {e}")
+
+
+def update_job_item(job_id: str | None, item_id: str, status: str, detail=None):
+    """Update the status of a single item; 'completed' and 'failed' also bump the job counters"""
+    if db is None or not job_id:
+        return
+    now = datetime.utcnow().isoformat()
+    update = {"$set": {
+        "items.$.status": status,
+        "items.$.detail": detail,
+        "items.$.updated_at": now,
+        "updated_at": now,
+    }}
+    if status in ("completed", "failed"):
+        update["$inc"] = {f"counts.{status}": 1}
+    try:
+        db[JOBS_COLLECTION].update_one({"_id": job_id, "items.id": item_id}, update)
+    except Exception as e:
+        print(f"Error updating item '{item_id}' of job {job_id}: {e}")
+
+
+def finish_job(job_id: str | None, status: str = "completed", summary: dict | None = None):
+    """Mark the job as finished, optionally attaching a summary"""
+    if db is None or not job_id:
+        return
+    update = {"status": status, "updated_at": datetime.utcnow().isoformat()}
+    if summary is not None:
+        update["summary"] = summary
+    try:
+        db[JOBS_COLLECTION].update_one({"_id": job_id}, {"$set": update})
+    except Exception as e:
+        print(f"Error finishing job {job_id}: {e}")
+
+
+def get_job(job_id: str, tenant_id: str | None = None) -> Optional[dict]:
+    """Get a job document, scoped to the tenant when provided"""
+    if db is None:
+        return None
+    query = {"_id": job_id}
+    if tenant_id:
+        query["tenant_id"] = tenant_id
+    try:
+        return db[JOBS_COLLECTION].find_one(query)
+    except Exception as e:
+        print(f"Error retrieving job {job_id}: {e}")
+        return None
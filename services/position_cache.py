@@ -0,0 +1,162 @@
+"""
+In-process cache of position documents and of the artifacts derived from them
+(serialized JSON blobs, case lookups, case maps, chatbot steps).
+
+Entries are keyed by (collection, position_id) and validated against the document's
+'updated_at' with a cheap projected query, so a position rewritten by another process
+is reloaded on next access. Writers in this process should stamp 'updated_at' (see
+with_updated_at) and call invalidate_position.
+
+Documents without 'updated_at' (legacy positions, or edited by hand in the database) are
+never cached, and every entry is reloaded after POSITION_CACHE_TTL_SECONDS, so edits that
+do not touch 'updated_at' are picked up too.
+"""
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+from services.data_manager import db
+
+
+POSITION_CACHE_MAX_ENTRIES = int(os.getenv("POSITION_CACHE_MAX_ENTRIES", "64"))
+# Maximum age of a cached entry, whatever its 'updated_at'
+POSITION_CACHE_TTL_SECONDS = float(os.getenv("POSITION_CACHE_TTL_SECONDS", "300"))
+
+_MISSING = object()
+
+
+class PositionContext:
+    """
+    A parsed position document plus lazily computed derived artifacts.
+    The document is shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, document: dict):
+        self.document = document
+        self.position_id = document.get("_id")
+        self.updated_at = document.get("updated_at")
+        self.loaded_at = time.monotonic()
+        self._derived: dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._cases_by_id = {
+            case.get("question_id"): case
+            for case in (document.get("all_cases") or {}).get("cases", [])
+        }
+
+    def derived(self, key: str, factory: Callable[[], Any]) -> Any:
+        """Return the artifact stored under 'key', computing it once with 'factory'"""
+        value = self._derived.get(key, _MISSING)
+        if value is _MISSING:
+            with self._lock:
+                value = self._derived.get(key, _MISSING)
+                if value is _MISSING:
+                    value = factory()
+                    self._derived[key] = value
+        return value
+
+    @property
+    def all_cases_text(self) -> str:
+        return self.derived("all_cases_text", lambda: json.dumps(self.document.get("all_cases")))
+
+    @property
+    def evaluation_criteria_text(self) -> str:
+        return self.derived("evaluation_criteria_text", lambda: json.dumps(self.document.get("evaluation_criteria")))
+
+    @property
+    def cases(self) -> list:
+        return list(self._cases_by_id.values())
+
+    def get_case(self, case_id: str) -> Optional[dict]:
+        return self._cases_by_id.get(case_id)
+
+    def case_map_text(self, case_id: str) -> Optional[str]:
+        """Evaluation map of a case ('[MAPPA DI VALUTAZIONE DEL CASO SVOLTO]' block)"""
+        case = self.get_case(case_id)
+        if not case:
+            return None
+
+        def build():
+            map_lines = ["[MAPPA DI VALUTAZIONE DEL CASO SVOLTO]"]
+            for step in case.get("reasoning_steps", []):
+                skills = ", ".join([s.get("skill_name", "N/A") for s in step.get("skills_to_test", [])])
+                map_lines.append(f"- Step {step.get('id', 'N/A')} ({step.get('title', 'N/A')}): Progettato per testare '{skills}'.")
+            return "\n".join(map_lines)
+
+        return self.derived(f"case_map:{case_id}", build)
+
+    def steps_for_case(self, case_id: str) -> dict:
+        """
+        Steps dict of a case with the chatbot criteria merged in.
+        Returns a fresh copy, since the chatbot keeps and may modify it.
+        """
+        def build():
+            case = self.get_case(case_id) or {}
+            all_criteria = (self.document.get("all_criteria") or {}).get("criteria_sets", [])
+            criteria_set = next((c for c in all_criteria if c.get("question_id") == case_id), None)
+            steps = {step["id"]: copy.deepcopy(step) for step in case.get("reasoning_steps", [])}
+            for criterion in (criteria_set or {}).get("accomplishment_criteria", []):
+                sid = criterion.get("step_id")
+                if sid in steps:
+                    steps[sid]["criteria"] = criterion.get("criteria")
+            return steps
+
+        return copy.deepcopy(self.derived(f"steps:{case_id}", build))
+
+
+_cache: "OrderedDict[tuple, PositionContext]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_position_context(position_id: str, collection_name: str = "positions_data") -> Optional[PositionContext]:
+    """Get the cached context of a position, reloading it if its 'updated_at' changed or it expired"""
+    if db is None or not position_id:
+        return None
+    key = (collection_name, position_id)
+    try:
+        with _cache_lock:
+            cached = _cache.get(key)
+        if cached is not None and time.monotonic() - cached.loaded_at < POSITION_CACHE_TTL_SECONDS:
+            head = db[collection_name].find_one({"_id": position_id}, {"updated_at": 1})
+            if head is None:
+                invalidate_position(position_id, collection_name)
+                return None
+            if head.get("updated_at") == cached.updated_at:
+                with _cache_lock:
+                    if key in _cache:
+                        _cache.move_to_end(key)
+                return cached
+
+        document = db[collection_name].find_one({"_id": position_id})
+        if not document:
+            return None
+        context = PositionContext(document)
+        if context.updated_at is None:
+            # No version to validate against: always read from the database
+            invalidate_position(position_id, collection_name)
+            return context
+        with _cache_lock:
+            _cache[key] = context
+            _cache.move_to_end(key)
+            while len(_cache) > POSITION_CACHE_MAX_ENTRIES:
+                _cache.popitem(last=False)
+        return context
+    except Exception as e:
+        print(f"Error loading position {position_id} from {collection_name}: {e}")
+        return None
+
+
+def invalidate_position(position_id: str, collection_name: str | None = None):
+    """Drop a position from the cache (from every collection if none is given)"""
+    with _cache_lock:
+        for key in [k for k in _cache if k[1] == position_id and (collection_name is None or k[0] == collection_name)]:
+            del _cache[key]
+
+
+def with_updated_at(fields: dict) -> dict:
+    """Return a copy of the $set fields stamped with a new 'updated_at'"""
+    return {**fields, "updated_at": datetime.utcnow()}
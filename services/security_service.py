@@ -0,0 +1,242 @@
+"""
+Ingestion of browser security events (tab switches, copy/paste, ...) and of the
+per-session 'security_summary'.
+
+A batch of events costs two DB operations regardless of its size: one insert_many into
+'security_events_<tenant>' and one atomic $inc of the summary counters on the session
+(no read of the session, so concurrent batches never lose increments).
+
+Client flush contract (POST /interviews/{token}/security-events):
+- buffer events locally and send them as {"events": [...]} with at most
+  SECURITY_EVENTS_MAX_BATCH events per request;
+- flush when the buffer reaches ~20 events, every few seconds while it is not empty,
+  immediately for 'high' severity events, and on page hide/unload (navigator.sendBeacon);
+- each event has 'type', 'timestamp' (ISO string, client time) and 'severity'
+  ('low' | 'medium' | 'high'), optionally 'details';
+- a rejected batch (4xx) must not be retried; on network errors the client may re-send
+  the same batch, events are stored as received (no server-side de-duplication).
+"""
+import os
+import threading
+import uuid
+from datetime import datetime
+
+from services.data_manager import db
+from services.tenant_service import get_tenant_collections
+
+
+SECURITY_EVENTS_MAX_BATCH = int(os.getenv("SECURITY_EVENTS_MAX_BATCH", "200"))
+
+SECURITY_REPORT_MAX_EVENTS = int(os.getenv("SECURITY_REPORT_MAX_EVENTS", "50"))
+
+SEVERITY_WEIGHTS = {"high": 10, "medium": 5, "low": 1}
+REQUIRED_EVENT_FIELDS = ("type", "timestamp", "severity")
+# (min cheating score, level, color), highest first
+RISK_LEVELS = [(50, "HIGH", "#dc3545"), (20, "MEDIUM", "#ffc107"), (5, "LOW", "#28a745"), (0, "MINIMAL", "#6c757d")]
+
+_indexed_collections = set()
+_index_lock = threading.Lock()
+
+
+def _events_collection(tenant_id: str):
+    """Tenant events collection, with the (session_id, timestamp) index created once per process"""
+    name = f"security_events_{tenant_id}"
+    if name not in _indexed_collections:
+        with _index_lock:
+            if name not in _indexed_collections:
+                try:
+                    db[name].create_index([("session_id", 1), ("timestamp", -1)])
+                except Exception as e:
+                    print(f"Error creating index on {name}: {e}")
+                _indexed_collections.add(name)
+    return db[name]
+
+
+def risk_level(cheating_score: int) -> tuple[str, str]:
+    """(level, color) of a cheating score"""
+    for threshold, level, color in RISK_LEVELS:
+        if cheating_score >= threshold:
+            return level, color
+    return RISK_LEVELS[-1][1], RISK_LEVELS[-1][2]
+
+
+def empty_security_summary() -> dict:
+    return {
+        "total_events": 0,
+        "high_severity_events": 0,
+        "medium_severity_events": 0,
+        "low_severity_events": 0,
+        "cheating_score": 0,
+        "events_by_type": {},
+        "last_updated": None,
+    }
+
+
+def _severity(event: dict) -> str:
+    severity = event.get("severity", "low")
+    return severity if severity in SEVERITY_WEIGHTS else "low"
+
+
+def _type_key(event_type: str) -> str:
+    """Event type usable as a MongoDB field name (no '.' and no leading '$')"""
+    return (event_type or "unknown").replace(".", "_").lstrip("$") or "unknown"
+
+
+def validate_events(events: list) -> None:
+    """Raise ValueError if the batch is empty, too large or has malformed events"""
+    if not isinstance(events, list) or not events:
+        raise ValueError("No events provided")
+    if len(events) > SECURITY_EVENTS_MAX_BATCH:
+        raise ValueError(f"Too many events in one batch (max {SECURITY_EVENTS_MAX_BATCH})")
+    for index, event in enumerate(events):
+        if not isinstance(event, dict):
+            raise ValueError(f"Event {index} is not an object")
+        for field in REQUIRED_EVENT_FIELDS:
+            if field not in event:
+                raise ValueError(f"Missing required field: {field}" + (f" (event {index})" if len(events) > 1 else ""))
+
+
+def _summary_increments(events: list) -> dict:
+    inc = {"security_summary.total_events": len(events), "security_summary.cheating_score": 0}
+    for event in events:
+        severity = _severity(event)
+        inc[f"security_summary.{severity}_severity_events"] = inc.get(f"security_summary.{severity}_severity_events", 0) + 1
+        inc["security_summary.cheating_score"] += SEVERITY_WEIGHTS[severity]
+        type_field = f"security_summary.events_by_type.{_type_key(event.get('type'))}"
+        inc[type_field] = inc.get(type_field, 0) + 1
+    return inc
+
+
+def record_security_events(session_id: str, tenant_id: str, events: list) -> list[str]:
+    """
+    Store a validated batch of events and update the session summary atomically.
+    Returns the ids of the stored events.
+    """
+    if db is None:
+        return []
+    now = datetime.utcnow().isoformat()
+    batch_key = uuid.uuid4().hex[:8]
+    documents = []
+    for index, event in enumerate(events):
+        documents.append({
+            "_id": f"{session_id}_{int(datetime.utcnow().timestamp() * 1000)}_{batch_key}{index}",
+            "session_id": session_id,
+            "tenant_id": tenant_id,
+            "event_type": event.get("type"),
+            "timestamp": event.get("timestamp"),
+            "severity": event.get("severity"),
+            "details": event.get("details", ""),
+            "created_at": now,
+        })
+
+    _events_collection(tenant_id).insert_many(documents, ordered=False)
+    db[get_tenant_collections(tenant_id)["sessions"]].update_one(
+        {"_id": session_id},
+        {"$inc": _summary_increments(events), "$set": {"security_summary.last_updated": now}},
+        upsert=False,
+    )
+    print(f"🔒 {len(documents)} security event(s) saved for session {session_id}")
+    return [d["_id"] for d in documents]
+
+
+def get_recent_security_events(session_id: str, tenant_id: str, limit: int = SECURITY_REPORT_MAX_EVENTS) -> list[dict]:
+    """Most recent events of a session (indexed, sorted and limited server-side)"""
+    if db is None:
+        return []
+    return list(_events_collection(tenant_id).find({"session_id": session_id}).sort("timestamp", -1).limit(limit))
+
+
+def _security_counts_pipeline(match: dict) -> list:
+    """Event counts per (session, type, severity): a handful of rows whatever the number of events"""
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"session_id": "$session_id", "event_type": "$event_type", "severity": "$severity"},
+            "count": {"$sum": 1},
+            "last_timestamp": {"$max": "$timestamp"},
+        }},
+    ]
+
+
+def _fold_counts(rows: list) -> dict:
+    """Group the pipeline rows into one summary per session"""
+    summaries = {}
+    for row in rows:
+        key = row["_id"]
+        summary = summaries.setdefault(key.get("session_id"), empty_security_summary())
+        severity = _severity(key)
+        count = row["count"]
+        summary["total_events"] += count
+        summary[f"{severity}_severity_events"] += count
+        summary["cheating_score"] += SEVERITY_WEIGHTS[severity] * count
+        event_type = _type_key(key.get("event_type"))
+        summary["events_by_type"][event_type] = summary["events_by_type"].get(event_type, 0) + count
+        if row.get("last_timestamp") and (summary["last_updated"] is None or row["last_timestamp"] > summary["last_updated"]):
+            summary["last_updated"] = row["last_timestamp"]
+    return summaries
+
+
+def aggregate_security_summaries(tenant_id: str, session_ids: list[str]) -> dict:
+    """Summaries computed from the stored events with $group, keyed by session id"""
+    if db is None or not session_ids:
+        return {}
+    rows = _events_collection(tenant_id).aggregate(_security_counts_pipeline({"session_id": {"$in": session_ids}}))
+    return _fold_counts(list(rows))
+
+
+def get_security_summary(session: dict, tenant_id: str) -> dict:
+    """Stored summary of a session, rebuilt with the aggregation if missing"""
+    stored = session.get("security_summary")
+    if stored and stored.get("total_events"):
+        # Counters are created lazily by $inc: fill the ones never incremented
+        return {**empty_security_summary(), **stored}
+    aggregated = aggregate_security_summaries(tenant_id, [session["_id"]]).get(session["_id"])
+    if aggregated:
+        print(f"🔧 Security summary of session {session['_id']} rebuilt from events")
+    return aggregated or empty_security_summary()
+
+
+def position_security_analytics(position_id: str, tenant_id: str, top_sessions: int = 10) -> dict:
+    """
+    Cross-session security analytics of a position: totals, events by type, risk distribution
+    and the riskiest sessions. Per-session summaries come from the same $group pipeline.
+    """
+    if db is None:
+        return {}
+    sessions = list(db[get_tenant_collections(tenant_id)["sessions"]].find(
+        {"position_id": position_id}, {"candidate_name": 1}
+    ))
+    names = {s["_id"]: s.get("candidate_name") for s in sessions}
+    summaries = aggregate_security_summaries(tenant_id, list(names))
+
+    totals = empty_security_summary()
+    risk_distribution = {level: 0 for _, level, _ in RISK_LEVELS}
+    ranked = []
+    for session_id in names:
+        summary = summaries.get(session_id, empty_security_summary())
+        for field in ("total_events", "high_severity_events", "medium_severity_events", "low_severity_events", "cheating_score"):
+            totals[field] += summary[field]
+        for event_type, count in summary["events_by_type"].items():
+            totals["events_by_type"][event_type] = totals["events_by_type"].get(event_type, 0) + count
+        level, _ = risk_level(summary["cheating_score"])
+        risk_distribution[level] += 1
+        ranked.append({
+            "session_id": session_id,
+            "candidate_name": names[session_id],
+            "risk_level": level,
+            "cheating_score": summary["cheating_score"],
+            "total_events": summary["total_events"],
+            "high_severity_events": summary["high_severity_events"],
+        })
+    ranked.sort(key=lambda item: item["cheating_score"], reverse=True)
+    del totals["last_updated"]
+
+    return {
+        "position_id": position_id,
+        "sessions": len(names),
+        "sessions_with_events": len(summaries),
+        "totals": totals,
+        "average_cheating_score": round(totals["cheating_score"] / len(names), 1) if names else 0,
+        "risk_distribution": risk_distribution,
+        "top_sessions": ranked[:top_sessions],
+    }
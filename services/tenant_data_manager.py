@@ -2,7 +2,9 @@
 Tenant-aware data manager functions
 """
 import os
+from pymongo.errors import BulkWriteError
 from services.data_manager import db
+from services.position_cache import invalidate_position, with_updated_at
 
 
 def create_or_update_position_tenant(position_id: str, payload: dict, collection_name: str) -> bool:
@@ -12,9 +14,10 @@ def create_or_update_position_tenant(position_id: str, payload: dict, collection
         return False
     try:
         collection = db[collection_name]
-        payload = payload.copy()
+        payload = with_updated_at(payload)
         payload["_id"] = position_id
         collection.update_one({"_id": position_id}, {"$set": payload}, upsert=True)
+        invalidate_position(position_id, collection_name)
         print(f"📄 Position upserted in tenant collection: {collection_name} with ID: {position_id}")
         return True
     except Exception as e:
@@ -44,6 +47,35 @@ def create_new_session_tenant(session_id: str, position_id: str, candidate_name:
         return False
 
 
+def create_new_sessions_tenant(sessions: list[dict], collection_name: str) -> list[str]:
+    """
+    Create many sessions with a single insert_many. Each item has session_id, position_id,
+    candidate_name, candidate_email and optionally initial 'stages'. Returns the created ids.
+    """
+    if db is None or not sessions:
+        return []
+    documents = [{
+        "_id": s["session_id"],
+        "position_id": s["position_id"],
+        "candidate_name": s.get("candidate_name") or "Candidato",
+        "candidate_email": s.get("candidate_email"),
+        "status": "initialized",
+        "stages": s.get("stages") or {},
+    } for s in sessions]
+    try:
+        db[collection_name].insert_many(documents, ordered=False)
+        created = [d["_id"] for d in documents]
+    except BulkWriteError as e:
+        failed_indexes = {err.get("index") for err in e.details.get("writeErrors", [])}
+        created = [d["_id"] for i, d in enumerate(documents) if i not in failed_indexes]
+        print(f"Error during bulk session creation: {len(failed_indexes)} sessions not created")
+    except Exception as e:
+        print(f"Error during bulk session creation: {e}")
+        return []
+    print(f"📄 {len(created)} sessions created in tenant collection: {collection_name}")
+    return created
+
+
 def save_stage_output_tenant(session_id: str, stage_name: str, data_content: dict | str, collection_name: str):
     """Save stage output in tenant-specific collection"""
     if db is None:
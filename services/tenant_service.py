@@ -47,7 +47,10 @@ def get_tenant_collections(tenant_id: str) -> dict:
     return {
         "positions": f"{tenant_id}_positions_data",
         "sessions": f"{tenant_id}_sessions",
-        "interview_links": f"{tenant_id}_interview_links"
+        "interview_links": f"{tenant_id}_interview_links",
+        "cv_score_cache": f"{tenant_id}_cv_score_cache",
+        "kb_summary_cache": f"{tenant_id}_kb_summary_cache",
+        "email_outbox": f"{tenant_id}_email_outbox"
     }
 
 def ensure_tenant_collections(tenant_id: str):
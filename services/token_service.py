@@ -16,23 +16,48 @@ def _hash_token(token: str) -> str:
     return hashlib.sha256((pepper + token).encode("utf-8")).hexdigest()
 
 
-def issue_interview_token(session_id: str, collection_name: str = COLLECTION) -> str:
-    if db is None:
-        raise RuntimeError("DB not available")
+def _new_token_document(session_id: str) -> tuple[str, dict]:
     token = secrets.token_urlsafe(24)
-    token_hash = _hash_token(token)
-    expires_at = datetime.utcnow() + timedelta(hours=TTL_HOURS)
-    db[collection_name].insert_one({
-        "token_hash": token_hash,
+    return token, {
+        "token_hash": _hash_token(token),
         "session_id": session_id,
-        "expires_at": expires_at,
+        "expires_at": datetime.utcnow() + timedelta(hours=TTL_HOURS),
         "revoked": False,
         "uses": 0,
         "max_uses": 100,  # allow re-entry across devices before finish
-    })
+    }
+
+
+def issue_interview_token(session_id: str, collection_name: str = COLLECTION) -> str:
+    if db is None:
+        raise RuntimeError("DB not available")
+    token, doc = _new_token_document(session_id)
+    db[collection_name].insert_one(doc)
     return token
 
 
+def issue_interview_tokens(session_ids: list[str], collection_name: str = COLLECTION) -> dict[str, str]:
+    """Issue one token per session with a single insert_many; returns {session_id: token}"""
+    if db is None:
+        raise RuntimeError("DB not available")
+    if not session_ids:
+        return {}
+    tokens, docs = {}, []
+    for session_id in session_ids:
+        token, doc = _new_token_document(session_id)
+        tokens[session_id] = token
+        docs.append(doc)
+    db[collection_name].insert_many(docs, ordered=False)
+    return tokens
+
+
+def delete_interview_tokens(session_ids: list[str], collection_name: str = COLLECTION) -> int:
+    """Delete the tokens of the given sessions (e.g. issued for sessions that were not created)"""
+    if db is None or not session_ids:
+        return 0
+    return db[collection_name].delete_many({"session_id": {"$in": list(session_ids)}}).deleted_count
+
+
 def resolve_token(token: str, collection_name: str = COLLECTION) -> Optional[str]:
     if db is None:
         return None
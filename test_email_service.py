@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Test Email Service
+Verifica che l'outbox degli inviti consegni le email tramite SMTP, ritenti con backoff
+i rifiuti temporanei (4xx), marchi come 'failed' le email che esauriscono i tentativi e
+non invii due volte un'email ripresa da un altro sender a lease scaduto.
+
+Usa MongoDB (MONGODB_URI) con un tenant di test, cancellato alla fine, e un server SMTP
+locale avviato dal test stesso. Senza MONGODB_URI usa mongomock, se installato
+(pip install mongomock), al posto del database.
+"""
+
+import socketserver
+import sys
+import threading
+import uuid
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+# Carica variabili d'ambiente
+load_dotenv('env.azure.production')
+
+# Aggiungi il path per importare i nostri moduli
+sys.path.append('.')
+
+try:
+    from services import email_service
+    from services.data_manager import db
+except ImportError as e:
+    print(f"❌ ERRORE: Impossibile importare email_service: {e}")
+    sys.exit(1)
+
+TENANT_ID = f"test-email-{uuid.uuid4().hex[:8]}"
+OUTBOX = email_service.email_outbox_collection_for(TENANT_ID)
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Server SMTP minimale: registra i messaggi ricevuti, risponde 451 ai destinatari in 'greylisted'"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.received = []
+        self.greylisted = set()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self):
+        self.reply("220 localhost test SMTP")
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode("utf-8", "replace").strip()
+            if not line:
+                return
+            command = line.upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 localhost")
+            elif command.startswith("MAIL FROM"):
+                recipients = []
+                self.reply("250 OK")
+            elif command.startswith("RCPT TO"):
+                address = line.split(":", 1)[1].strip().strip("<>")
+                if address in self.server.greylisted:
+                    self.reply("451 Try again later")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if data_line in (b".\r\n", b""):
+                        break
+                    data.append(data_line)
+                self.server.received.append((recipients, b"".join(data).decode("utf-8", "replace")))
+                self.reply("250 Queued")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+def _configure_smtp(server):
+    """Punta il servizio al server di test, senza TLS né login, e con retry immediati"""
+    email_service.SMTP_HOST = "127.0.0.1"
+    email_service.SMTP_PORT = server.server_address[1]
+    email_service.SMTP_STARTTLS = False
+    email_service.SMTP_USER = None
+    email_service.EMAIL_RETRY_BASE_SECONDS = 0
+    email_service.EMAIL_MAX_ATTEMPTS = 2
+    # Il test consegna le email da sé: il sender in background non deve essere avviato
+    email_service.start_email_sender = lambda: None
+
+
+def _enqueue(to_email: str) -> str:
+    return email_service.enqueue_interview_link(to_email, uuid.uuid4().hex, "https://app.example.test", f"session-{to_email}", TENANT_ID)
+
+
+def _process_outbox():
+    batch = email_service._claim_batch(OUTBOX)
+    email_service._deliver_batch(batch, OUTBOX)
+    return batch
+
+
+def test_delivery(server):
+    """Test consegna: l'email arriva al server SMTP, lo stato diventa 'sent' e il body viene rimosso"""
+    print("🧪 Test consegna email...")
+    email_id = _enqueue("ok@example.test")
+    if not email_id:
+        print("❌ Email non accodata")
+        return False
+    batch = _process_outbox()
+    doc = db[OUTBOX].find_one({"_id": email_id})
+
+    if [d["_id"] for d in batch] != [email_id]:
+        print(f"❌ Batch inatteso: {[d['_id'] for d in batch]}")
+        return False
+    if not any("ok@example.test" in recipients and "/interview/" in body for recipients, body in server.received):
+        print("❌ Il server SMTP non ha ricevuto l'invito")
+        return False
+    if doc["status"] != "sent" or doc["attempts"] != 1 or "body" in doc:
+        print(f"❌ Stato inatteso dopo l'invio: {doc}")
+        return False
+    print("✅ Email consegnata, marcata 'sent', body rimosso")
+    return True
+
+
+def test_retry_and_final_failure(server):
+    """Test 4xx: l'email viene rimessa in coda con backoff, poi marcata 'failed' a tentativi esauriti"""
+    print("\n🔄 Test retry su 4xx e fallimento finale...")
+    server.greylisted.add("grey@example.test")
+    email_id = _enqueue("grey@example.test")
+
+    before = datetime.utcnow()
+    _process_outbox()
+    doc = db[OUTBOX].find_one({"_id": email_id})
+    if doc["status"] != "retry" or doc["attempts"] != 1 or not doc.get("body"):
+        print(f"❌ Dopo il primo 451 l'email doveva essere in 'retry' con il body: {doc}")
+        return False
+    if doc["next_attempt_at"] < before - timedelta(seconds=1):
+        print(f"❌ next_attempt_at non aggiornato: {doc['next_attempt_at']}")
+        return False
+    print(f"✅ Primo 451: in 'retry' (errore: {doc['last_error']})")
+
+    _process_outbox()
+    doc = db[OUTBOX].find_one({"_id": email_id})
+    if doc["status"] != "failed" or doc["attempts"] != 2 or "body" in doc:
+        print(f"❌ A tentativi esauriti l'email doveva essere 'failed' senza body: {doc}")
+        return False
+    if _process_outbox():
+        print("❌ Un'email 'failed' è stata riprovata")
+        return False
+    print("✅ Secondo 451: 'failed', body rimosso, nessun altro tentativo")
+    return True
+
+
+def test_reclaimed_email_not_sent_twice(server):
+    """Test lease scaduto: il sender che ha perso il claim non invia l'email ripresa da un altro"""
+    print("\n🔄 Test email ripresa da un altro sender...")
+    email_id = _enqueue("slow@example.test")
+    stale_batch = email_service._claim_batch(OUTBOX)
+
+    # Il lease del primo sender scade e un secondo sender riprende l'email
+    expired = datetime.utcnow() - timedelta(seconds=email_service.EMAIL_SENDING_LEASE_SECONDS + 1)
+    db[OUTBOX].update_one({"_id": email_id}, {"$set": {"claimed_at": expired}})
+    fresh_batch = email_service._claim_batch(OUTBOX)
+    if [d["_id"] for d in fresh_batch] != [email_id] or fresh_batch[0]["claim_id"] == stale_batch[0]["claim_id"]:
+        print(f"❌ L'email a lease scaduto doveva essere ripresa con un nuovo claim: {fresh_batch}")
+        return False
+
+    received_before = len(server.received)
+    email_service._deliver_batch(stale_batch, OUTBOX)
+    if len(server.received) != received_before:
+        print("❌ Il sender che ha perso il claim ha inviato l'email")
+        return False
+    email_service._deliver_batch(fresh_batch, OUTBOX)
+    doc = db[OUTBOX].find_one({"_id": email_id})
+    if len(server.received) != received_before + 1 or doc["status"] != "sent" or doc["attempts"] != 1:
+        print(f"❌ L'email doveva essere inviata una sola volta: {doc}")
+        return False
+    print("✅ Email inviata una sola volta, dal sender che detiene il claim")
+    return True
+
+
+def test_session_status(server):
+    """Test stato invito per sessione, letto dall'outbox del tenant"""
+    print("\n🔄 Test stato invito della sessione...")
+    emails = email_service.get_session_email_status("session-ok@example.test", TENANT_ID)
+    if not emails or emails[0]["status"] != "sent":
+        print(f"❌ Stato invito inatteso: {emails}")
+        return False
+    print("✅ Stato invito 'sent' letto dall'outbox del tenant")
+    return True
+
+
+def main():
+    """Funzione principale"""
+    print("🚀 Email Service Test Suite")
+    print("=" * 50)
+
+    global db
+    if db is None:
+        try:
+            import mongomock
+        except ImportError:
+            print("❌ ERRORE: MongoDB non disponibile (MONGODB_URI) e mongomock non installato")
+            return 1
+        print("ℹ️ MONGODB_URI non disponibile: uso mongomock")
+        db = email_service.db = mongomock.MongoClient()["test_email_service"]
+
+    server = SMTPStandIn()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _configure_smtp(server)
+
+    tests = [
+        ("Consegna", test_delivery),
+        ("Retry e fallimento", test_retry_and_final_failure),
+        ("Email ripresa a lease scaduto", test_reclaimed_email_not_sent_twice),
+        ("Stato sessione", test_session_status),
+    ]
+    results = []
+    try:
+        for test_name, test_func in tests:
+            try:
+                results.append((test_name, test_func(server)))
+            except Exception as e:
+                print(f"❌ Errore nel test {test_name}: {e}")
+                results.append((test_name, False))
+    finally:
+        server.shutdown()
+        db.drop_collection(OUTBOX)
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\nRisultato: {passed}/{len(results)} test superati")
+    if passed == len(results):
+        print("\n✅ TUTTI I TEST EMAIL SERVICE SUPERATI!")
+        return 0
+    print("\n❌ TEST EMAIL SERVICE FALLITI!")
+    return 1
+
+
+if __name__ == "__main__":
+    exit(main())
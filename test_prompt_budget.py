@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Test Prompt Budget
+Verifica la compattazione del prompt di valutazione finale: conversazione entro il budget
+di token, risposte del candidato mai accorciate né omesse, presentazione del caso sempre
+presente, e criteri di valutazione limitati alle skill testate dal caso svolto.
+"""
+
+import json
+import sys
+
+# Aggiungi il path per importare i nostri moduli
+sys.path.append('.')
+
+try:
+    from corrector.final_evaluator.prompt_budget import (
+        EVAL_COMPACT_ASSISTANT_CHARS,
+        EVAL_MIN_CONVERSATION_TOKENS,
+        EVAL_PROMPT_TOKEN_BUDGET,
+        CASE_TEXT_OMITTED,
+        build_case_scoped_inputs,
+        compact_conversation,
+        conversation_token_budget,
+        fit_conversation_to_budget,
+    )
+    from interviewer.llm_service import estimate_tokens
+except ImportError as e:
+    print(f"❌ ERRORE: Impossibile importare prompt_budget: {e}")
+    sys.exit(1)
+
+
+def _conversation(turns: int) -> list:
+    conversation = [{"role": "assistant", "content": "Presentazione del caso. " * 100}]
+    for i in range(turns):
+        conversation.append({"role": "assistant", "content": f"Domanda {i}: " + "contesto " * 300})
+        conversation.append({"role": "user", "content": f"Risposta {i}: " + "analisi " * 60})
+    return conversation
+
+
+def test_short_conversation_unchanged():
+    """Test: sotto budget la conversazione resta integrale"""
+    print("🧪 Test conversazione sotto budget...")
+    conversation = _conversation(2)
+    text, stats = compact_conversation(conversation, 100000)
+    if stats["truncated"] or stats["omitted"] or text.count("[Candidato]") != 2 or stats["tokens"] != stats["original_tokens"]:
+        print(f"❌ Conversazione modificata: {stats}")
+        return False
+    print("✅ Conversazione integrale")
+    return True
+
+
+def _missing_answers(conversation: list, text: str) -> list:
+    """Risposte del candidato assenti o non integrali nel testo compattato"""
+    return [m["content"][:12] for m in conversation if m["role"] == "user" and f"[Candidato]: {m['content']}" not in text]
+
+
+def test_compaction_within_budget():
+    """Test: sopra budget il testo rientra nel budget riducendo solo l'intervistatore"""
+    print("\n🔄 Test compattazione entro il budget...")
+    conversation = _conversation(30)
+    ok = True
+    for budget in (6000, 10000):
+        text, stats = compact_conversation(conversation, budget)
+        if estimate_tokens(text) > budget or stats["tokens"] != estimate_tokens(text) or stats["over_budget"]:
+            print(f"❌ [budget {budget}] Testo di ~{estimate_tokens(text)} token: {stats}")
+            ok = False
+        if not text.startswith(f"[Intervistatore (Vertigo)]: {conversation[0]['content']}"):
+            print(f"❌ [budget {budget}] Presentazione del caso mancante o accorciata")
+            ok = False
+        missing = _missing_answers(conversation, text)
+        if missing:
+            print(f"❌ [budget {budget}] Risposte del candidato mancanti o accorciate: {missing}")
+            ok = False
+        if stats["truncated"] != 30 or (stats["omitted"] and f"{stats['omitted']} messaggi dell'intervistatore omessi" not in text):
+            print(f"❌ [budget {budget}] Domande non accorciate o omissioni non segnalate: {stats}")
+            ok = False
+        if any(len(line) > EVAL_COMPACT_ASSISTANT_CHARS + 40 for line in text.split("\n\n")[1:] if line.startswith("[Intervistatore")):
+            print(f"❌ [budget {budget}] Domande dell'intervistatore non accorciate")
+            ok = False
+    if ok:
+        print("✅ Conversazione compattata entro il budget")
+    return ok
+
+
+def test_answers_survive_compaction():
+    """Test: ogni risposta del candidato sopravvive alla compattazione, anche oltre il budget"""
+    print("\n🔄 Test risposte del candidato sempre presenti...")
+    conversation = _conversation(30)
+    ok = True
+    for budget in (500, 1500, 3000, 6000):
+        text, stats = compact_conversation(conversation, budget)
+        missing = _missing_answers(conversation, text)
+        if missing:
+            print(f"❌ [budget {budget}] Risposte del candidato mancanti o accorciate: {missing}")
+            ok = False
+        if stats["over_budget"] != (estimate_tokens(text) > budget):
+            print(f"❌ [budget {budget}] Sforamento del budget non segnalato: {stats}")
+            ok = False
+        if stats["over_budget"] and stats["omitted"] != 30:
+            print(f"❌ [budget {budget}] Fuori budget con domande ancora presenti: {stats}")
+            ok = False
+    if ok:
+        print("✅ Tutte le risposte del candidato integre")
+    return ok
+
+
+def test_case_section_dropped_before_answers():
+    """Test: se le risposte non stanno nel budget si omette il testo del caso, non le risposte"""
+    print("\n🔄 Test riduzione della sezione del caso...")
+    conversation = _conversation(30)
+    sections = {"criteria": "criteri", "cases": "x" * (EVAL_PROMPT_TOKEN_BUDGET * 4)}
+    text, reduced, stats = fit_conversation_to_budget(conversation, sections)
+    if reduced["cases"] != CASE_TEXT_OMITTED or not stats.get("case_text_omitted") or reduced["criteria"] != "criteri":
+        print(f"❌ Sezione del caso non ridotta: {stats}")
+        return False
+    if _missing_answers(conversation, text) or stats["over_budget"]:
+        print(f"❌ Risposte mancanti o fuori budget dopo la riduzione: {stats}")
+        return False
+
+    small = {"criteria": "criteri", "cases": "caso breve"}
+    _, kept, stats = fit_conversation_to_budget(_conversation(2), small)
+    if kept != small or stats.get("case_text_omitted"):
+        print("❌ Sezione del caso ridotta senza necessità")
+        return False
+    print("✅ Testo del caso omesso prima di toccare le risposte")
+    return True
+
+
+def test_conversation_budget_floor():
+    """Test: la conversazione ha sempre almeno EVAL_MIN_CONVERSATION_TOKENS"""
+    print("\n🔄 Test budget della conversazione...")
+    small = conversation_token_budget({"caso": "x" * 400})
+    huge = conversation_token_budget({"caso": "x" * (EVAL_PROMPT_TOKEN_BUDGET * 8)})
+    if small != EVAL_PROMPT_TOKEN_BUDGET - estimate_tokens("x" * 400) or huge != EVAL_MIN_CONVERSATION_TOKENS:
+        print(f"❌ Budget inattesi: {small}, {huge}")
+        return False
+    print("✅ Budget residuo e minimo garantito corretti")
+    return True
+
+
+def test_case_scoped_criteria():
+    """Test: solo il caso svolto e i criteri delle skill che testa; rubrica completa se nessuna corrisponde"""
+    print("\n🔄 Test criteri limitati al caso...")
+    criteria = {"evaluation_schema": [
+        {"requirement": "Problem Solving", "criteria": {"evaluation_criteria_1": "a", "evaluation_criteria_2": "b"}},
+        {"requirement": "Financial Modeling", "criteria": {"evaluation_criteria_1": "c", "evaluation_criteria_2": "d"}},
+        {"requirement": "Team Leadership", "criteria": {"evaluation_criteria_1": "e", "evaluation_criteria_2": "f"}},
+    ]}
+    case = {"case_id": "c1", "reasoning_steps": [
+        {"skills_to_test": [{"skill_name": "problem solving"}]},
+        {"skills_to_test": [{"skill_name": "Financial Modeling"}, {"skill_name": "Problem Solving"}]},
+    ]}
+    case_text, criteria_text = build_case_scoped_inputs(case, criteria)
+    scoped = [item["requirement"] for item in json.loads(criteria_text)["evaluation_schema"]]
+    if json.loads(case_text) != {"cases": [case]} or scoped != ["Problem Solving", "Financial Modeling"]:
+        print(f"❌ Criteri inattesi: {scoped}")
+        return False
+
+    unrelated = {"case_id": "c2", "reasoning_steps": [{"skills_to_test": [{"skill_name": "Cucina molecolare"}]}]}
+    _, criteria_text = build_case_scoped_inputs(unrelated, criteria)
+    if json.loads(criteria_text) != criteria:
+        print("❌ Senza corrispondenze attesa la rubrica completa")
+        return False
+    print("✅ Criteri limitati alle skill del caso")
+    return True
+
+
+def main():
+    """Funzione principale"""
+    print("🚀 Prompt Budget Test Suite")
+    print("=" * 50)
+
+    tests = [
+        test_short_conversation_unchanged,
+        test_compaction_within_budget,
+        test_answers_survive_compaction,
+        test_case_section_dropped_before_answers,
+        test_conversation_budget_floor,
+        test_case_scoped_criteria,
+    ]
+    results = [test() for test in tests]
+
+    passed = sum(results)
+    print(f"\nRisultato: {passed}/{len(results)} test superati")
+    if passed == len(results):
+        print("\n✅ TUTTI I TEST PROMPT BUDGET SUPERATI!")
+        return 0
+    print("\n❌ TEST PROMPT BUDGET FALLITI!")
+    return 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test RAG Service
+Verifica la ricerca dei corsi di più query insieme (search_many): con la deduplica ogni
+corso va a una sola query, quella più vicina, e le altre ricevono i candidati successivi.
+
+Gli embedding sono vettori fissi (nessun modello da scaricare) e l'indice FAISS è
+costruito in memoria, senza MongoDB.
+"""
+
+import sys
+
+import numpy as np
+
+# Aggiungi il path per importare i nostri moduli
+sys.path.append('.')
+
+try:
+    from feedback_generator.course_retriever.index_factory import build_index
+    from feedback_generator.course_retriever.rag_service import RAGService
+except ImportError as e:
+    print(f"❌ ERRORE: Impossibile importare rag_service: {e}")
+    sys.exit(1)
+
+
+COURSE_VECTORS = {
+    "Excel avanzato": [1.0, 0.0, 0.0, 0.0],
+    "Excel per l'analisi dati": [0.9, 0.1, 0.0, 0.0],
+    "Public speaking": [0.0, 1.0, 0.0, 0.0],
+    "Negoziazione": [0.0, 0.0, 1.0, 0.0],
+    "Project management": [0.0, 0.0, 0.0, 1.0],
+}
+QUERY_VECTORS = {
+    "fogli di calcolo": [1.0, 0.0, 0.0, 0.0],
+    "analisi dati": [0.95, 0.05, 0.0, 0.0],
+}
+
+
+class FixedEmbeddings:
+    """Modello di embedding con vettori predefiniti per testo"""
+
+    def __init__(self, vectors: dict):
+        self.vectors = vectors
+
+    def encode(self, texts, convert_to_tensor=False):
+        return np.array([self.vectors[text] for text in texts], dtype=np.float32)
+
+
+def _service(index_type: str) -> RAGService:
+    """RAGService sui corsi di test, senza catalogo su MongoDB"""
+    service = RAGService.__new__(RAGService)
+    service.model = FixedEmbeddings(QUERY_VECTORS)
+    service.courses_data = [{"_id": i, "Course Name": name} for i, name in enumerate(COURSE_VECTORS)]
+    service.course_map = dict(enumerate(service.courses_data))
+    service.index = build_index(np.array(list(COURSE_VECTORS.values()), dtype=np.float32), index_type)
+    return service
+
+
+def _names(results: list) -> list:
+    return [[course["Course Name"] for course in courses] for courses in results]
+
+
+def test_deduplicated_search():
+    """Test deduplica: nessun corso in due query, ognuno alla query più vicina, k corsi per query"""
+    print("🧪 Test search_many con deduplica...")
+    ok = True
+    for index_type in ("flat_ip", "flat_l2"):
+        first, second = _names(_service(index_type).search_many(list(QUERY_VECTORS), k=2))
+        if set(first) & set(second):
+            print(f"❌ [{index_type}] Corsi assegnati a più query: {first} / {second}")
+            ok = False
+        if first[0] != "Excel avanzato" or second[0] != "Excel per l'analisi dati":
+            print(f"❌ [{index_type}] Corsi non assegnati alla query più vicina: {first} / {second}")
+            ok = False
+        if len(first) != 2 or len(second) != 2:
+            print(f"❌ [{index_type}] Attesi 2 corsi per query: {first} / {second}")
+            ok = False
+    if ok:
+        print("✅ Ogni corso assegnato a una sola query, la più vicina")
+    return ok
+
+
+def test_search_without_deduplication():
+    """Test senza deduplica: le query vicine condividono i corsi, search() equivale a una sola query"""
+    print("\n🔄 Test search_many senza deduplica e search...")
+    service = _service("flat_ip")
+    first, second = _names(service.search_many(list(QUERY_VECTORS), k=2, deduplicate=False))
+    if first[:2] != ["Excel avanzato", "Excel per l'analisi dati"] or set(first) != set(second):
+        print(f"❌ Risultati inattesi senza deduplica: {first} / {second}")
+        return False
+    if _names([service.search("fogli di calcolo", k=2)]) != [first]:
+        print("❌ search() diverso da search_many() su una sola query")
+        return False
+    print("✅ Senza deduplica le query condividono i corsi più vicini")
+    return True
+
+
+def test_k_larger_than_catalog():
+    """Test k maggiore dei corsi indicizzati: nessun risultato spurio, nessun corso ripetuto"""
+    print("\n🔄 Test k maggiore del catalogo...")
+    service = _service("flat_ip")
+    results = _names(service.search_many(list(QUERY_VECTORS), k=10))
+    flat = [name for names in results for name in names]
+    if len(flat) != len(set(flat)) or set(flat) != set(COURSE_VECTORS):
+        print(f"❌ Risultati inattesi: {results}")
+        return False
+    single = _names([service.search("analisi dati", k=10)])[0]
+    if len(single) != len(COURSE_VECTORS):
+        print(f"❌ search() con k maggiore del catalogo: {single}")
+        return False
+    print("✅ Tutti i corsi restituiti una sola volta")
+    return True
+
+
+def main():
+    """Funzione principale"""
+    print("🚀 RAG Service Test Suite")
+    print("=" * 50)
+
+    tests = [test_deduplicated_search, test_search_without_deduplication, test_k_larger_than_catalog]
+    results = [test() for test in tests]
+
+    passed = sum(results)
+    print(f"\nRisultato: {passed}/{len(results)} test superati")
+    if passed == len(results):
+        print("\n✅ TUTTI I TEST RAG SERVICE SUPERATI!")
+        return 0
+    print("\n❌ TEST RAG SERVICE FALLITI!")
+    return 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Test Security Service
+Verifica che il riepilogo di sicurezza aggiornato a ogni batch ($inc di _summary_increments)
+coincida con quello ricalcolato dagli eventi salvati (righe $group piegate da _fold_counts),
+e la validazione dei batch inviati dal client.
+
+I documenti di MongoDB sono simulati in memoria: nessuna connessione al database.
+"""
+
+import sys
+from collections import Counter
+
+# Aggiungi il path per importare i nostri moduli
+sys.path.append('.')
+
+try:
+    from services.security_service import (
+        SECURITY_EVENTS_MAX_BATCH,
+        _fold_counts,
+        _summary_increments,
+        empty_security_summary,
+        risk_level,
+        validate_events,
+    )
+except ImportError as e:
+    print(f"❌ ERRORE: Impossibile importare security_service: {e}")
+    sys.exit(1)
+
+
+FIRST_BATCH = [
+    {"type": "tab_switch", "timestamp": "2025-01-01T10:00:00", "severity": "medium"},
+    {"type": "tab_switch", "timestamp": "2025-01-01T10:01:00", "severity": "medium"},
+    {"type": "copy.paste", "timestamp": "2025-01-01T10:02:00", "severity": "high"},
+]
+SECOND_BATCH = [
+    {"type": "right_click", "timestamp": "2025-01-01T10:03:00", "severity": "low"},
+    {"type": "$devtools", "timestamp": "2025-01-01T10:04:00", "severity": "critical"},
+]
+
+
+def _apply_inc(session: dict, inc: dict):
+    """Applica un $inc con campi puntati a un documento in memoria, come MongoDB"""
+    for path, value in inc.items():
+        *parents, field = path.split(".")
+        target = session
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[field] = target.get(field, 0) + value
+
+
+def _group_rows(session_id: str, events: list) -> list:
+    """Righe della pipeline $group (session_id, event_type, severity) per gli eventi salvati"""
+    counts = Counter((e["type"], e["severity"]) for e in events)
+    return [{
+        "_id": {"session_id": session_id, "event_type": event_type, "severity": severity},
+        "count": count,
+        "last_timestamp": max(e["timestamp"] for e in events if (e["type"], e["severity"]) == (event_type, severity)),
+    } for (event_type, severity), count in counts.items()]
+
+
+def test_increments_match_aggregation():
+    """Test: i contatori incrementali dopo due batch coincidono con l'aggregazione degli eventi"""
+    print("🧪 Test riepilogo incrementale vs aggregato...")
+    session = {}
+    for batch in (FIRST_BATCH, SECOND_BATCH):
+        _apply_inc(session, _summary_increments(batch))
+    incremental = {**empty_security_summary(), **session["security_summary"]}
+
+    aggregated = _fold_counts(_group_rows("s1", FIRST_BATCH + SECOND_BATCH))["s1"]
+    if aggregated["last_updated"] != "2025-01-01T10:04:00":
+        print(f"❌ last_updated inatteso: {aggregated['last_updated']}")
+        return False
+    incremental.pop("last_updated")
+    aggregated.pop("last_updated")
+    if incremental != aggregated:
+        print(f"❌ Riepiloghi diversi:\n   incrementale: {incremental}\n   aggregato:    {aggregated}")
+        return False
+
+    expected = {"total_events": 5, "high_severity_events": 1, "medium_severity_events": 2, "low_severity_events": 2, "cheating_score": 22}
+    if any(incremental[field] != value for field, value in expected.items()):
+        print(f"❌ Contatori inattesi: {incremental}")
+        return False
+    # Tipi usabili come nomi di campo MongoDB, severità sconosciute contate come 'low'
+    if incremental["events_by_type"] != {"tab_switch": 2, "copy_paste": 1, "right_click": 1, "devtools": 1}:
+        print(f"❌ Conteggi per tipo inattesi: {incremental['events_by_type']}")
+        return False
+    print(f"✅ Riepiloghi coincidenti (punteggio {incremental['cheating_score']}, rischio {risk_level(incremental['cheating_score'])[0]})")
+    return True
+
+
+def test_fold_counts_multiple_sessions():
+    """Test: _fold_counts separa le righe per sessione"""
+    print("\n🔄 Test aggregazione su più sessioni...")
+    summaries = _fold_counts(_group_rows("s1", FIRST_BATCH) + _group_rows("s2", SECOND_BATCH))
+    if set(summaries) != {"s1", "s2"} or summaries["s1"]["total_events"] != 3 or summaries["s2"]["total_events"] != 2:
+        print(f"❌ Riepiloghi per sessione inattesi: {summaries}")
+        return False
+    if summaries["s2"]["cheating_score"] != 2 or summaries["s2"]["last_updated"] != "2025-01-01T10:04:00":
+        print(f"❌ Riepilogo della seconda sessione inatteso: {summaries['s2']}")
+        return False
+    print("✅ Un riepilogo per sessione")
+    return True
+
+
+def test_risk_levels():
+    """Test soglie del livello di rischio"""
+    print("\n🔄 Test livelli di rischio...")
+    expected = {0: "MINIMAL", 4: "MINIMAL", 5: "LOW", 19: "LOW", 20: "MEDIUM", 49: "MEDIUM", 50: "HIGH", 500: "HIGH"}
+    wrong = {score: risk_level(score)[0] for score, level in expected.items() if risk_level(score)[0] != level}
+    if wrong:
+        print(f"❌ Livelli errati: {wrong}")
+        return False
+    print("✅ Soglie corrette")
+    return True
+
+
+def test_validate_events():
+    """Test validazione dei batch: vuoti, troppo grandi o con eventi malformati vengono rifiutati"""
+    print("\n🔄 Test validazione dei batch...")
+    invalid = {
+        "vuoto": [],
+        "non lista": {"type": "x"},
+        "troppo grande": FIRST_BATCH[:1] * (SECURITY_EVENTS_MAX_BATCH + 1),
+        "evento non oggetto": ["tab_switch"],
+        "campo mancante": [{"type": "tab_switch", "timestamp": "2025-01-01T10:00:00"}],
+    }
+    ok = True
+    for name, events in invalid.items():
+        try:
+            validate_events(events)
+            print(f"❌ Batch '{name}' accettato")
+            ok = False
+        except ValueError:
+            pass
+    try:
+        validate_events(FIRST_BATCH + SECOND_BATCH)
+    except ValueError as e:
+        print(f"❌ Batch valido rifiutato: {e}")
+        ok = False
+    if ok:
+        print("✅ Batch invalidi rifiutati, batch valido accettato")
+    return ok
+
+
+def main():
+    """Funzione principale"""
+    print("🚀 Security Service Test Suite")
+    print("=" * 50)
+
+    tests = [test_increments_match_aggregation, test_fold_counts_multiple_sessions, test_risk_levels, test_validate_events]
+    results = [test() for test in tests]
+
+    passed = sum(results)
+    print(f"\nRisultato: {passed}/{len(results)} test superati")
+    if passed == len(results):
+        print("\n✅ TUTTI I TEST SECURITY SERVICE SUPERATI!")
+        return 0
+    print("\n❌ TEST SECURITY SERVICE FALLITI!")
+    return 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test Conversation Transcript
+Verifica che il transcript incrementale del chatbot produca lo stesso testo della
+formattazione completa della conversazione, con le viste a finestra e i segmenti di step.
+"""
+
+import sys
+
+# Aggiungi il path per importare i nostri moduli
+sys.path.append('.')
+
+try:
+    from interviewer.transcript import ConversationTranscript
+except ImportError as e:
+    print(f"❌ ERRORE: Impossibile importare transcript: {e}")
+    sys.exit(1)
+
+
+def _full_text(messages: list) -> str:
+    """Formattazione originale: tutta la conversazione a ogni prompt"""
+    return "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+
+
+def test_incremental_text():
+    """Test testo completo: coincide con la formattazione completa dopo ogni messaggio"""
+    print("🧪 Test testo incrementale...")
+    transcript = ConversationTranscript()
+    for i in range(6):
+        transcript.append("assistant" if i % 2 == 0 else "user", f"messaggio {i}")
+        if transcript.text != _full_text(transcript.messages):
+            print(f"❌ Testo diverso dopo {i + 1} messaggi")
+            return False
+    # Messaggi aggiunti direttamente alla lista condivisa (es. conversation_history.append)
+    transcript.messages.append({"role": "user", "content": "aggiunto alla lista"})
+    if transcript.text != _full_text(transcript.messages) or len(transcript) != 7:
+        print("❌ Messaggi aggiunti alla lista non inclusi nel testo")
+        return False
+    print("✅ Testo incrementale identico alla formattazione completa")
+    return True
+
+
+def test_windows_and_segments():
+    """Test viste a finestra (ultimi k, step corrente) e segmenti degli step chiusi"""
+    print("\n🔄 Test finestre e segmenti di step...")
+    transcript = ConversationTranscript()
+    transcript.append("assistant", "apertura")
+    transcript.append("user", "risposta 1")
+    segment = transcript.mark_step_start()
+    transcript.append("assistant", "step 2")
+    transcript.append("user", "risposta 2")
+
+    checks = [
+        (segment == (0, 2), f"segmento del primo step {segment}"),
+        (transcript.range_text(*segment) == "assistant: apertura\nuser: risposta 1", "testo del segmento"),
+        (transcript.since_step_start() == "assistant: step 2\nuser: risposta 2", "vista dello step corrente"),
+        (transcript.last_k(3) == "user: risposta 1\nassistant: step 2\nuser: risposta 2", "ultimi 3 messaggi"),
+        (transcript.last_k(0) == "", "ultimi 0 messaggi"),
+        (transcript.mark_step_start() == (2, 4), "segmento del secondo step"),
+        (transcript.since_step_start() == "", "step appena iniziato"),
+    ]
+    failed = [name for ok, name in checks if not ok]
+    if failed:
+        print(f"❌ Verifiche fallite: {', '.join(failed)}")
+        return False
+    print("✅ Finestre e segmenti corretti")
+    return True
+
+
+def test_restored_messages():
+    """Test transcript ricostruito da una conversazione salvata"""
+    print("\n🔄 Test transcript da conversazione salvata...")
+    messages = [{"role": "assistant", "content": "apertura"}, {"role": "user", "content": "ciao"}]
+    transcript = ConversationTranscript(messages)
+    transcript.append("assistant", "benvenuto")
+    if transcript.messages is not messages or transcript.text != _full_text(messages) or len(messages) != 3:
+        print("❌ La lista dei messaggi non è condivisa con il transcript")
+        return False
+    print("✅ Messaggi condivisi con la conversazione salvata")
+    return True
+
+
+def main():
+    """Funzione principale"""
+    print("🚀 Conversation Transcript Test Suite")
+    print("=" * 50)
+
+    tests = [test_incremental_text, test_windows_and_segments, test_restored_messages]
+    results = [test() for test in tests]
+
+    passed = sum(results)
+    print(f"\nRisultato: {passed}/{len(results)} test superati")
+    if passed == len(results):
+        print("\n✅ TUTTI I TEST TRANSCRIPT SUPERATI!")
+        return 0
+    print("\n❌ TEST TRANSCRIPT FALLITI!")
+    return 1
+
+
+if __name__ == "__main__":
+    exit(main())